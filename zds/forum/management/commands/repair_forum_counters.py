@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from zds.forum.models import Forum
+
+
+class Command(BaseCommand):
+    help = "Compute again the number of topics and posts and the last message of the forums and topics"
+
+    def handle(self, *args, **kwargs):
+        Forum.objects.repair_counters()
+        self.stdout.write("Repaired forum counters.")
@@ -0,0 +1,66 @@
+# Generated by Django 3.2.15 on 2026-10-17 09:02
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def compute_counters(apps, schema_editor):
+    """
+    Forward migration: computes the counters and last message of the existing forums and topics
+    (same as ``python manage.py repair_forum_counters``).
+    """
+    Forum = apps.get_model("forum", "Forum")
+    Topic = apps.get_model("forum", "Topic")
+    Post = apps.get_model("forum", "Post")
+
+    post_count = Post.objects.filter(topic=OuterRef("pk")).order_by().values("topic").annotate(n=Count("pk"))
+    Topic.objects.update(post_count=Coalesce(Subquery(post_count.values("n")), 0))
+
+    topic_count = Topic.objects.filter(forum=OuterRef("pk")).order_by().values("forum").annotate(n=Count("pk"))
+    post_count = Topic.objects.filter(forum=OuterRef("pk")).order_by().values("forum").annotate(n=Sum("post_count"))
+    last_post = Post.objects.filter(topic__forum=OuterRef("pk")).order_by("-pubdate").values("pk")[:1]
+    Forum.objects.update(
+        topic_count=Coalesce(Subquery(topic_count.values("n")), 0),
+        post_count=Coalesce(Subquery(post_count.values("n")), 0),
+        last_message=Subquery(last_post),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forum", "0023_allow_blank_solved_by_topic_field"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="forum",
+            name="last_message",
+            field=models.ForeignKey(
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="forum.post",
+                verbose_name="Dernier message",
+            ),
+        ),
+        migrations.AddField(
+            model_name="forum",
+            name="post_count",
+            field=models.IntegerField(default=0, editable=False, verbose_name="Nombre de messages"),
+        ),
+        migrations.AddField(
+            model_name="forum",
+            name="topic_count",
+            field=models.IntegerField(default=0, editable=False, verbose_name="Nombre de sujets"),
+        ),
+        migrations.AddField(
+            model_name="topic",
+            name="post_count",
+            field=models.IntegerField(default=0, editable=False, verbose_name="Nombre de messages"),
+        ),
+        migrations.RunPython(compute_counters, migrations.RunPython.noop),
+    ]
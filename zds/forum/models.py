@@ -5,16 +5,18 @@ from math import ceil
 from django.conf import settings
 from django.contrib.auth.models import Group, User, AnonymousUser
 from django.urls import reverse
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.dispatch import receiver
-from django.db.models.signals import pre_delete
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 
 from elasticsearch_dsl.field import Text, Keyword, Integer, Boolean, Float, Date
 
 from zds.forum.managers import TopicManager, ForumManager, PostManager, TopicReadManager
 from zds.forum import signals
-from zds.searchv2.models import AbstractESDjangoIndexable, delete_document_in_elasticsearch, ESIndexManager
+from zds.searchv2.models import AbstractESDjangoIndexable, delete_document_in_elasticsearch, get_es_index_manager
 from zds.utils import get_current_user, old_slugify
+from zds.utils.cache import TOPBAR_FORUMS, bump_cache_version
 from zds.utils.models import Comment, Tag
 
 
@@ -56,23 +58,41 @@ class ForumCategory(models.Model):
     def get_absolute_url(self):
         return reverse("forum:cat-forums-list", kwargs={"slug": self.slug})
 
-    def get_forums(self, user, with_count=False):
+    def get_forums(self, user, with_last_message=False):
         """get all forums that user can access
 
         :param user: the related user
         :type user: User
-        :param with_count: If true will preload thread and post number for each forum of this category
-        :type with_count: bool
+        :param with_last_message: If true will preload the last message of each forum of this category
+        :type with_last_message: bool
         :return: All forums in category, ordered by forum's position in category
         :rtype: list[Forum]
         """
-        forums_pub = Forum.objects.get_public_forums_of_category(self, with_count=with_count)
+        forums_pub = Forum.objects.get_public_forums_of_category(self, with_last_message=with_last_message)
         if user is not None and user.is_authenticated:
-            forums_private = Forum.objects.get_private_forums_of_category(self, user)
+            forums_private = Forum.objects.get_private_forums_of_category(
+                self, user, with_last_message=with_last_message
+            )
             return list(forums_pub | forums_private)
         return forums_pub
 
 
+def save_without_counters(instance, kwargs):
+    """Prevent an update of a model from overwriting its denormalized counters (listed in its ``counter_fields``)
+    with outdated values, since they are only updated in database by the receivers below.
+
+    :param instance: the instance being saved
+    :param kwargs: the keyword arguments of ``save()``, modified in place
+    :type kwargs: dict
+    """
+    if not instance._state.adding and kwargs.get("update_fields") is None:
+        kwargs["update_fields"] = [
+            field.name
+            for field in instance._meta.concrete_fields
+            if not field.primary_key and field.name not in instance.counter_fields
+        ]
+
+
 class Forum(models.Model):
     """
     A Forum, containing Topics. It can be public or restricted to some groups.
@@ -94,6 +114,21 @@ class Forum(models.Model):
     position_in_category = models.IntegerField("Position dans la catégorie", null=True, blank=True, db_index=True)
 
     slug = models.SlugField(max_length=80, unique=True)
+
+    # Denormalized values, updated in the same transaction as the topics and posts (see the receivers below), and
+    # which can be computed again with ``python manage.py repair_forum_counters``.
+    topic_count = models.IntegerField("Nombre de sujets", default=0, editable=False)
+    post_count = models.IntegerField("Nombre de messages", default=0, editable=False)
+    last_message = models.ForeignKey(
+        "Post",
+        null=True,
+        related_name="+",
+        verbose_name="Dernier message",
+        on_delete=models.SET_NULL,
+        editable=False,
+    )
+    counter_fields = ("topic_count", "post_count", "last_message")
+
     _nb_group = None
     objects = ForumManager()
 
@@ -104,37 +139,31 @@ class Forum(models.Model):
         return reverse("forum:topics-list", kwargs={"cat_slug": self.category.slug, "forum_slug": self.slug})
 
     def get_topic_count(self):
-        """Retrieve or aggregate the number of threads in this forum. If this number already exists, it must be stored \
-        in thread_count. Otherwise it will process a SQL query.
-
+        """
         :return: the number of threads in the forum.
         """
-        try:
-            return self.thread_count
-        except AttributeError:
-            return Topic.objects.filter(forum=self).count()
+        return self.topic_count
 
     def get_post_count(self):
-        """Retrieve or aggregate the number of posts in this forum. If this number already exists, it must be stored \
-        in post_count. Otherwise it will process a SQL query.
-
+        """
         :return: the number of posts for a forum.
         """
-        try:
-            return self.post_count
-        except AttributeError:
-            return Post.objects.filter(topic__forum=self).count()
+        return self.post_count
 
     def get_last_message(self):
         """
         :return: the last message on the forum, if there are any.
         """
-        try:
-            last_post = Post.objects.select_related("topic").filter(topic__forum=self).order_by("-pubdate").all()[0]
+        last_post = self.last_message
+        if last_post is not None:
             last_post.topic.forum = self
-            return last_post
-        except IndexError:
-            return None
+        return last_post
+
+    def save(self, *args, **kwargs):
+        """Overridden to keep the denormalized counters"""
+
+        save_without_counters(self, kwargs)
+        return super().save(*args, **kwargs)
 
     def can_read(self, user):
         """
@@ -169,6 +198,15 @@ class Forum(models.Model):
         return self._nb_group > 0
 
 
+@receiver(post_save, sender=Forum)
+@receiver(post_delete, sender=Forum)
+@receiver(m2m_changed, sender=Forum.groups.through)
+@receiver(post_delete, sender=Group)
+def invalidate_authorized_forums(sender, **kwargs):
+    """catch the changes of the forums and of their groups to outdate the cached authorized forums"""
+    Forum.objects.invalidate_authorized_forums()
+
+
 class Topic(AbstractESDjangoIndexable):
     """
     A Topic is a thread of posts.
@@ -216,12 +254,25 @@ class Topic(AbstractESDjangoIndexable):
 
     tags = models.ManyToManyField(Tag, verbose_name="Tags du forum", blank=True, db_index=True)
 
+    # denormalized, as the counters of the forum
+    post_count = models.IntegerField("Nombre de messages", default=0, editable=False)
+    counter_fields = ("post_count",)
+
     objects = TopicManager()
     _first_post = None
+    # last post read by each user and the following one, see ``TopicRead.objects.load_read_states()``
+    _read_states = None
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        topic = super().from_db(db, field_names, values)
+        # the values loaded from the database, to know which fields are changed when the topic is saved
+        topic._loaded_values = dict(zip(field_names, values))
+        return topic
+
     @property
     def is_solved(self):
         return self.solved_by is not None
@@ -256,7 +307,7 @@ class Topic(AbstractESDjangoIndexable):
         """
         :return: the number of posts in the topic.
         """
-        return Post.objects.filter(topic__pk=self.pk).count()
+        return self.post_count
 
     def get_last_post(self):
         """
@@ -313,6 +364,9 @@ class Topic(AbstractESDjangoIndexable):
         Used in "last read post" balloon (base.html line 91).
         :return: the last post the user has read.
         """
+        read_state = self.get_loaded_read_state(get_current_user())
+        if read_state is not None:
+            return read_state[0] or self.first_post()
         try:
             return (
                 TopicRead.objects.select_related()
@@ -351,6 +405,11 @@ class Topic(AbstractESDjangoIndexable):
         :return: the primary key
         :rtype: int
         """
+        read_state = self.get_loaded_read_state(user)
+        if read_state is not None:
+            if read_state[0] is None:
+                raise TopicRead.DoesNotExist
+            return read_state[0].pk, read_state[0].position
         t_read = (
             TopicRead.objects.select_related("post")
             .filter(topic__pk=self.pk, user__pk=user.pk)
@@ -377,6 +436,12 @@ class Topic(AbstractESDjangoIndexable):
             if user is None:
                 user = get_current_user()
 
+            read_state = self.get_loaded_read_state(user)
+            if read_state is not None:
+                if read_state[0] is None:
+                    return self.first_post()
+                return read_state[1] or self.get_last_answer()
+
             last_post = TopicRead.objects.filter(topic__pk=self.pk, user__pk=user.pk).latest("post__position").post
 
             next_post = (
@@ -388,6 +453,17 @@ class Topic(AbstractESDjangoIndexable):
             # if no read : the whole topic is not read so get first message
             return self.first_post()
 
+    def get_loaded_read_state(self, user):
+        """
+        :param user: a user
+        :return: the last post of this topic read by the user (``None`` if they never read it) and the following one, \
+        if they were loaded by ``TopicRead.objects.load_read_states()``, ``None`` otherwise.
+        :rtype: tuple
+        """
+        if self._read_states is None or user is None:
+            return None
+        return self._read_states.get(user.pk)
+
     def antispam(self, user=None):
         """
         Check if the user is allowed to post in a topic according to the `ZDS_APP['forum']['spam_limit_seconds']` value.
@@ -476,14 +552,28 @@ class Topic(AbstractESDjangoIndexable):
     def save(self, *args, **kwargs):
         """Overridden to handle the displacement of the topic to another forum"""
 
+        save_without_counters(self, kwargs)
         try:
             old_self = Topic.objects.get(pk=self.pk)
         except Topic.DoesNotExist:
-            pass
-        else:
-            if old_self.forum.pk != self.forum.pk or old_self.title != self.title:
+            return super().save(*args, **kwargs)
+
+        if old_self.forum_id == self.forum_id:
+            if old_self.title != self.title:
                 Post.objects.filter(topic__pk=self.pk).update(es_flagged=True)
-        return super().save(*args, **kwargs)
+            return super().save(*args, **kwargs)
+
+        with transaction.atomic():
+            Post.objects.filter(topic__pk=self.pk).update(es_flagged=True)
+            result = super().save(*args, **kwargs)
+            Forum.objects.filter(pk=old_self.forum_id).update(
+                topic_count=F("topic_count") - 1, post_count=F("post_count") - old_self.post_count
+            )
+            Forum.objects.filter(pk=self.forum_id).update(
+                topic_count=F("topic_count") + 1, post_count=F("post_count") + old_self.post_count
+            )
+            Forum.objects.refresh_last_message(old_self.forum_id, self.forum_id)
+        return result
 
 
 @receiver(pre_delete, sender=Topic)
@@ -492,6 +582,27 @@ def delete_topic_in_elasticsearch(sender, instance, **kwargs):
     return delete_document_in_elasticsearch(instance)
 
 
+@receiver(post_save, sender=Forum)
+@receiver(post_delete, sender=Forum)
+@receiver(m2m_changed, sender=Forum.groups.through)
+@receiver(post_save, sender=ForumCategory)
+@receiver(post_delete, sender=ForumCategory)
+@receiver(post_delete, sender=Topic)
+@receiver(m2m_changed, sender=Topic.tags.through)
+@receiver(signals.topic_moved, sender=Topic)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_topbar_forums(sender, **kwargs):
+    """catch the changes of the forums and of the tags of their topics to outdate the cached topbar"""
+    bump_cache_version(TOPBAR_FORUMS)
+
+
+@receiver(post_save, sender=Topic)
+def invalidate_topbar_forums_on_new_topic(sender, instance, created, **kwargs):
+    if created:
+        bump_cache_version(TOPBAR_FORUMS)
+
+
 class Post(Comment, AbstractESDjangoIndexable):
     """
     A forum post written by a user.
@@ -577,7 +688,7 @@ class Post(Comment, AbstractESDjangoIndexable):
 
         super().hide_comment_by_user(user, text_hidden)
 
-        index_manager = ESIndexManager(**settings.ES_SEARCH_INDEX)
+        index_manager = get_es_index_manager()
         index_manager.update_single_document(self, {"is_visible": False})
 
 
@@ -587,6 +698,39 @@ def delete_post_in_elasticsearch(sender, instance, **kwargs):
     return delete_document_in_elasticsearch(instance)
 
 
+@receiver(post_save, sender=Topic)
+def increment_topic_count(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Forum.objects.filter(pk=instance.forum_id).update(topic_count=F("topic_count") + 1)
+
+
+@receiver(post_delete, sender=Topic)
+def decrement_topic_count(sender, instance, **kwargs):
+    """the posts of the topic are deleted first, so only the topic itself remains to be discounted"""
+    Forum.objects.filter(pk=instance.forum_id).update(topic_count=F("topic_count") - 1)
+
+
+@receiver(post_save, sender=Post)
+def increment_post_count(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        forum_pk = Topic.objects.filter(pk=instance.topic_id).values_list("forum_id", flat=True).first()
+        Topic.objects.filter(pk=instance.topic_id).update(post_count=F("post_count") + 1)
+        Forum.objects.filter(pk=forum_pk).update(post_count=F("post_count") + 1, last_message=instance)
+        if Post.topic.is_cached(instance):
+            instance.topic.post_count += 1
+
+
+@receiver(post_delete, sender=Post)
+def decrement_post_count(sender, instance, **kwargs):
+    """when the last message of a forum is deleted, its reference is set to ``NULL`` before, so it is looked for
+    again among the remaining posts"""
+    forum_pk = Topic.objects.filter(pk=instance.topic_id).values_list("forum_id", flat=True).first()
+    Topic.objects.filter(pk=instance.topic_id).update(post_count=F("post_count") - 1)
+    Forum.objects.filter(pk=forum_pk).update(post_count=F("post_count") - 1)
+    if Forum.objects.filter(pk=forum_pk, last_message__isnull=True).exists():
+        Forum.objects.refresh_last_message(forum_pk)
+
+
 class TopicRead(models.Model):
     """
     This model tracks the last post read in a topic by a user.
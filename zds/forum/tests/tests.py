@@ -1,8 +1,10 @@
 from datetime import datetime, timedelta
+from io import StringIO
 
 from django.conf import settings
 from django.contrib.auth.models import Group
 from django.core import mail
+from django.core.management import call_command
 from django.urls import reverse
 from django.test import TestCase
 
@@ -1210,6 +1212,82 @@ class ManagerTests(TestCase):
         self.assertTrue(topic.is_read_by_user(self.staff.user, check_auth=False))
         self.assertFalse(topic.is_read_by_user(reader.user, check_auth=False))
 
+    def test_get_authorized_forums_pks(self):
+        staff_group = Group.objects.filter(name="staff").first()
+        public_forums = sorted([self.forum1.pk, self.forum2.pk])
+        self.assertEqual(Forum.objects.get_authorized_forums_pks([]), public_forums)
+        self.assertEqual(Forum.objects.get_authorized_forums_pks([staff_group.pk]), public_forums + [self.forum3.pk])
+
+        # cached:
+        with self.assertNumQueries(0):
+            self.assertEqual(Forum.objects.get_authorized_forums_pks([]), public_forums)
+
+        # invalidated when the groups of a forum change...
+        self.forum2.groups.add(staff_group)
+        self.assertEqual(Forum.objects.get_authorized_forums_pks([]), [self.forum1.pk])
+
+        # ... when a group is deleted...
+        staff_group.delete()
+        self.assertEqual(Forum.objects.get_authorized_forums_pks([]), sorted(public_forums + [self.forum3.pk]))
+
+        # ... and when a forum is created
+        forum4 = ForumFactory(category=self.cat1)
+        self.assertIn(forum4.pk, Forum.objects.get_authorized_forums_pks([]))
+
+    def test_visibility_check_query(self):
+        user = ProfileFactory().user
+        self.assertEqual(Topic.objects.filter(Topic.objects.visibility_check_query(user)).count(), 2)
+        self.assertEqual(Topic.objects.filter(Topic.objects.visibility_check_query(self.staff.user)).count(), 3)
+
+    def test_counters(self):
+        def counters(forum):
+            forum = Forum.objects.get(pk=forum.pk)
+            return forum.get_topic_count(), forum.get_post_count(), forum.get_last_message()
+
+        author = ProfileFactory()
+        topic = TopicFactory(author=author.user, forum=self.forum1)
+        first_post = PostFactory(topic=topic, position=1, author=author.user)
+        last_post = PostFactory(topic=topic, position=2, author=self.staff.user)
+        self.assertEqual(counters(self.forum1), (2, 2, last_post))
+        self.assertEqual(Topic.objects.get(pk=topic.pk).get_post_count(), 2)
+
+        # saving outdated instances does not overwrite the counters
+        self.forum1.save()
+        topic.post_count = 0
+        topic.save()
+        self.assertEqual(counters(self.forum1), (2, 2, last_post))
+        self.assertEqual(Topic.objects.get(pk=topic.pk).get_post_count(), 2)
+
+        # hidden posts are still counted
+        last_post.hide_comment_by_user(self.staff.user, "Spam")
+        self.assertEqual(counters(self.forum1), (2, 2, last_post))
+
+        last_post.delete()
+        self.assertEqual(counters(self.forum1), (2, 1, first_post))
+        self.assertEqual(Topic.objects.get(pk=topic.pk).get_post_count(), 1)
+
+        topic = Topic.objects.get(pk=topic.pk)
+        topic.forum = self.forum2
+        topic.save()
+        self.assertEqual(counters(self.forum1), (1, 0, None))
+        self.assertEqual(counters(self.forum2), (2, 1, first_post))
+
+        topic.delete()
+        self.assertEqual(counters(self.forum2), (1, 0, None))
+
+    def test_repair_counters(self):
+        topic = TopicFactory(author=self.staff.user, forum=self.forum1)
+        post = PostFactory(topic=topic, position=1, author=self.staff.user)
+        Forum.objects.update(topic_count=0, post_count=42, last_message=None)
+        Topic.objects.update(post_count=0)
+
+        call_command("repair_forum_counters", stdout=StringIO())
+        forum = Forum.objects.get(pk=self.forum1.pk)
+        self.assertEqual((forum.get_topic_count(), forum.get_post_count(), forum.get_last_message()), (2, 1, post))
+        self.assertEqual(Topic.objects.get(pk=topic.pk).get_post_count(), 1)
+        forum = Forum.objects.get(pk=self.forum2.pk)
+        self.assertEqual((forum.get_topic_count(), forum.get_post_count(), forum.get_last_message()), (1, 0, None))
+
 
 class TopicReadAndUnreadTests(TestCase):
     def setUp(self):
@@ -1251,6 +1329,41 @@ class TopicReadAndUnreadTests(TestCase):
         topic = Topic.objects.get(pk=self.topic.pk)
         self.assertEqual(post, topic.first_unread_post(self.reader))
 
+    def test_load_read_states(self):
+        forum = self.topic.forum
+        never_read = self.topic
+        never_read_op = PostFactory(topic=never_read, author=self.author, position=1)
+        read = TopicFactory(author=self.author, forum=forum)
+        read_op = PostFactory(topic=read, author=self.author, position=1)
+        TopicRead(topic=read, post=read_op, user=self.reader).save()
+        answered = TopicFactory(author=self.author, forum=forum)
+        answered_op = PostFactory(topic=answered, author=self.author, position=1)
+        TopicRead(topic=answered, post=answered_op, user=self.reader).save()
+        answer = PostFactory(topic=answered, author=self.author, position=2)
+        PostFactory(topic=answered, author=self.author, position=3)
+
+        topics = Topic.objects.filter(pk__in=[never_read.pk, read.pk, answered.pk]).order_by("pk")
+        expected = [
+            (topic.is_read_by_user(self.reader), topic.first_unread_post(self.reader), topic.first_post())
+            for topic in topics
+        ]
+        self.assertEqual(
+            expected, [(False, never_read_op, never_read_op), (True, None, read_op), (False, answer, answered_op)]
+        )
+
+        with self.assertNumQueries(4):
+            topics = TopicRead.objects.load_read_states(topics, self.reader)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [
+                    (topic.is_read_by_user(self.reader), topic.first_unread_post(self.reader), topic.first_post())
+                    for topic in topics
+                ],
+                expected,
+            )
+            self.assertEqual(TopicRead.objects.list_loaded_read_topic_pk(topics, self.reader), [read.pk])
+            self.assertEqual(topics[2].resolve_last_post_pk_and_pos_read_by_user(self.reader), (answered_op.pk, 1))
+
 
 class TestMixins(TestCase):
     def test_double_unread_is_handled(self):
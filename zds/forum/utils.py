@@ -3,6 +3,7 @@ import logging
 from datetime import datetime
 
 from django.contrib import messages
+from django.db import transaction
 from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.views.generic import CreateView
@@ -64,6 +65,7 @@ def get_tag_by_title(title):
     return tags, title.strip()
 
 
+@transaction.atomic
 def create_topic(request, author, forum, title, subtitle, text, tags="", related_publishable_content=None):
     """create topic in forum"""
 
@@ -89,6 +91,7 @@ def create_topic(request, author, forum, title, subtitle, text, tags="", related
     return n_topic
 
 
+@transaction.atomic
 def send_post(
     request,
     topic,
@@ -42,7 +42,7 @@ class CategoriesForumsListView(ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         for category in context.get("categories"):
-            category.forums = category.get_forums(self.request.user, with_count=True)
+            category.forums = category.get_forums(self.request.user, with_last_message=True)
         return context
 
 
@@ -54,7 +54,7 @@ class ForumCategoryForumsDetailView(DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["forums"] = context.get("category").get_forums(self.request.user)
+        context["forums"] = context.get("category").get_forums(self.request.user, with_last_message=True)
         return context
 
 
@@ -77,8 +77,11 @@ class LastTopicsListView(ListView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context["topics"] = TopicRead.objects.load_read_states(context["topics"], self.request.user)
 
-        context.update({"topic_read": TopicRead.objects.list_read_topic_pk(self.request.user, context["topics"])})
+        context.update(
+            {"topic_read": TopicRead.objects.list_loaded_read_topic_pk(context["topics"], self.request.user)}
+        )
 
         return context
 
@@ -118,15 +121,13 @@ class ForumTopicsListView(FilterMixin, ForumEditMixin, ZdSPagingListView, Update
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["topics"] = list(context["topics"].all())
-        sticky = list(
+        context["topics"] = TopicRead.objects.load_read_states(context["topics"].all(), self.request.user)
+        sticky = TopicRead.objects.load_read_states(
             self.filter_queryset(
                 Topic.objects.get_all_topics_of_a_forum(self.object.pk, is_sticky=True), context["filter"]
-            )
+            ),
+            self.request.user,
         )
-        # we need to load it in memory because later we will get the
-        # "already read topic" set out of this list and MySQL does not support that type of subquery
-
         # Add a topic.is_followed attribute
         followed_queryset = TopicAnswerSubscription.objects.get_objects_followed_by(self.request.user.id)
         followed_topics = list(set(followed_queryset) & set(context["topics"] + sticky))
@@ -137,7 +138,9 @@ class ForumTopicsListView(FilterMixin, ForumEditMixin, ZdSPagingListView, Update
             {
                 "forum": self.object,
                 "sticky_topics": sticky,
-                "topic_read": TopicRead.objects.list_read_topic_pk(self.request.user, context["topics"] + sticky),
+                "topic_read": TopicRead.objects.list_loaded_read_topic_pk(
+                    context["topics"] + sticky, self.request.user
+                ),
                 "subscriber_count": NewTopicSubscription.objects.get_subscriptions(self.object).count(),
             }
         )
@@ -523,14 +526,12 @@ class FindTopicByTag(FilterMixin, ForumEditMixin, ZdSPagingListView, SingleObjec
 
     def get_context_data(self, *args, **kwargs):
         context = super().get_context_data(*args, **kwargs)
-        context["topics"] = list(context["topics"].all())
-        # we need to load it in memory because later we will get the
-        # "already read topic" set out of this list and MySQL does not support that type of subquery
+        context["topics"] = TopicRead.objects.load_read_states(context["topics"].all(), self.request.user)
         context.update(
             {
                 "tag": self.object,
                 "subscriber_count": NewTopicSubscription.objects.get_subscriptions(self.object).count(),
-                "topic_read": TopicRead.objects.list_read_topic_pk(self.request.user, context["topics"]),
+                "topic_read": TopicRead.objects.list_loaded_read_topic_pk(context["topics"], self.request.user),
             }
         )
         return context
@@ -0,0 +1,41 @@
+import logging
+import time
+
+from django.core.management import BaseCommand
+
+from zds.member.utils import flush_last_visits
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Save the last visits of the members stored in the cache while the last visit policy is QUEUE"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Do not wait forever for new visits.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of visits saved at once.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=60,
+            help="Number of seconds to wait for new visits once all of them are saved.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            count = flush_last_visits(options["batch_size"])
+            if count:
+                logger.info("Saved the last visit of %s members.", count)
+            elif options["once"]:
+                break
+            else:
+                time.sleep(options["interval"])
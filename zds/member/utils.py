@@ -1,13 +1,19 @@
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from social_django.middleware import SocialAuthExceptionMiddleware
 from django.contrib import messages
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+LAST_VISIT_PREFIX = "last-visit"
+LAST_VISIT_COUNT_KEY = f"{LAST_VISIT_PREFIX}-count"
+LAST_VISIT_FLUSHED_KEY = f"{LAST_VISIT_PREFIX}-flushed"
+
 
 class ZDSCustomizeSocialAuthExceptionMiddleware(SocialAuthExceptionMiddleware):
     """
@@ -49,3 +55,99 @@ def get_anonymous_account() -> User:
     Used for example as a replacement for unregistered users.
     """
     return User.objects.get(username=settings.ZDS_APP["member"]["anonymous_account"])
+
+
+def _get_last_visit_key(profile_pk):
+    return f"{LAST_VISIT_PREFIX}-profile-{profile_pk}"
+
+
+def _get_last_visit_entry_key(index):
+    return f"{LAST_VISIT_PREFIX}-entry-{index}"
+
+
+def get_buffered_last_visit(profile_pk):
+    """
+    :return: the date and IP address of the last visit of a profile, if they are not saved yet, else ``None``
+    :rtype: tuple
+    """
+    return cache.get(_get_last_visit_key(profile_pk))
+
+
+def buffer_last_visit(profile_pk, last_visit, last_ip_address):
+    """
+    Stores the last visit of a profile in the cache, to be saved with the other ones by ``flush_last_visits()``.
+    The profiles to save are indexed by a counter, so that no visit is lost when several processes add one at the
+    same time. The visits expire if they are not saved within ``ZDS_APP["member"]["last_visit_buffer_timeout"]``
+    seconds, for instance if the command is not running.
+    """
+    timeout = settings.ZDS_APP["member"]["last_visit_buffer_timeout"]
+    cache.set(_get_last_visit_key(profile_pk), (last_visit, last_ip_address), timeout=timeout)
+    cache.set(_get_last_visit_entry_key(_next_last_visit_index()), profile_pk, timeout=timeout)
+
+
+def _next_last_visit_index():
+    while True:
+        try:
+            return cache.incr(LAST_VISIT_COUNT_KEY)
+        except ValueError:  # the counter does not exist yet, or was evicted
+            # it starts again from the current time in microseconds, above all the indices given before since far
+            # fewer visits are buffered, so that the visits not saved yet are not overwritten
+            cache.add(LAST_VISIT_COUNT_KEY, int(time.time() * 1_000_000), timeout=None)
+
+
+def _find_next_last_visit_index(start, end):
+    """
+    Finds the first index after ``start`` with an entry, up to ``end``, when the counter restarted after an eviction
+    or when the oldest entries expired, by a binary search since the entries are missing up to this index.
+
+    :return: the index found, or ``end`` if there is no entry
+    :rtype: int
+    """
+    while end - start > 1:
+        middle = (start + end) // 2
+        if cache.get(_get_last_visit_entry_key(middle)) is None:
+            start = middle
+        else:
+            end = middle
+    return end
+
+
+def flush_last_visits(batch_size=1000):
+    """
+    Saves the last visits stored by ``buffer_last_visit()``, from the oldest one, in one ``UPDATE`` query.
+    Only the ``last_visit`` and ``last_ip_address`` fields are updated. The batches whose visits all expired are
+    skipped, as well as the indices left between the old and the new values of the counter after its eviction.
+
+    :param batch_size: maximum number of visits to handle
+    :return: the number of profiles updated
+    :rtype: int
+    """
+    from zds.member.api.views import change_api_profile_updated_at
+    from zds.member.models import Profile
+
+    count = cache.get(LAST_VISIT_COUNT_KEY, 0)
+    flushed = min(cache.get(LAST_VISIT_FLUSHED_KEY, 0), count)
+    profiles = []
+    entry_keys = []
+    while not profiles and flushed < count:
+        last_index = min(count, flushed + batch_size)
+        batch_keys = [_get_last_visit_entry_key(index) for index in range(flushed + 1, last_index + 1)]
+        entries = cache.get_many(batch_keys)
+        entry_keys += batch_keys
+        if not entries and last_index < count:
+            flushed = _find_next_last_visit_index(last_index, count) - 1
+            continue
+        visit_keys = {_get_last_visit_key(pk): pk for pk in entries.values()}
+        profiles = [
+            Profile(pk=visit_keys[key], last_visit=last_visit, last_ip_address=last_ip_address)
+            for key, (last_visit, last_ip_address) in cache.get_many(list(visit_keys)).items()
+        ]
+        flushed = last_index
+
+    if profiles:
+        Profile.objects.bulk_update(profiles, ["last_visit", "last_ip_address"])
+        change_api_profile_updated_at()
+    # the visits are left to expire, since a newer one may have been stored in the meantime
+    cache.delete_many(entry_keys)
+    cache.set(LAST_VISIT_FLUSHED_KEY, flushed, timeout=None)
+    return len(profiles)
@@ -145,7 +145,9 @@ class MemberDetail(DetailView):
         usr = context["usr"]
         profile = usr.profile
         context["profile"] = profile
-        context["topics"] = list(Topic.objects.last_topics_of_a_member(usr, self.request.user))
+        context["topics"] = TopicRead.objects.load_read_states(
+            Topic.objects.last_topics_of_a_member(usr, self.request.user), self.request.user
+        )
         followed_query_set = TopicAnswerSubscription.objects.get_objects_followed_by(self.request.user.id)
         followed_topics = list(set(followed_query_set) & set(context["topics"]))
         for topic in context["topics"]:
@@ -154,7 +156,7 @@ class MemberDetail(DetailView):
         context["opinions"] = PublishedContent.objects.last_opinions_of_a_member_loaded(usr)
         context["tutorials"] = PublishedContent.objects.last_tutorials_of_a_member_loaded(usr)
         context["articles_and_tutorials"] = PublishedContent.objects.last_tutorials_and_articles_of_a_member_loaded(usr)
-        context["topic_read"] = TopicRead.objects.list_read_topic_pk(self.request.user, context["topics"])
+        context["topic_read"] = TopicRead.objects.list_loaded_read_topic_pk(context["topics"], self.request.user)
         context["subscriber_count"] = NewPublicationSubscription.objects.get_subscriptions(self.object).count()
         context["contribution_articles_count"] = (
             ContentContribution.objects.filter(
@@ -1,18 +1,24 @@
 from _datetime import datetime
-from queue import Queue
+from queue import Empty, Full, Queue
+from urllib.parse import urlencode
 
 import requests
 import logging
+import os
+import socket
+import time
 
 from django.conf import settings
-from threading import Thread
+from django.core.cache import cache
+from threading import Lock, Thread
 
 from django.urls import reverse
+from requests.adapters import HTTPAdapter
 
 from zds.member.views import get_client_ip
 
 matomo_token_auth = settings.ZDS_APP["site"]["matomo_token_auth"]
-matomo_api_url = "{}/matomo.php?token_auth={}".format(settings.ZDS_APP["site"]["matomo_url"], matomo_token_auth)
+matomo_api_url = "{}/matomo.php".format(settings.ZDS_APP["site"]["matomo_url"])
 matomo_site_id = settings.ZDS_APP["site"]["matomo_site_id"]
 matomo_api_version = 1
 logger = logging.getLogger(__name__)
@@ -20,39 +26,182 @@ tracked_status_code = [200]
 tracked_methods = ["GET"]
 excluded_paths = ["/contenus", "/mp", "/munin", "/api", "/static", "/media"]
 
+TRACKING_STATS_PREFIX = "matomo-tracking"
+TRACKING_SENT_KEY = f"{TRACKING_STATS_PREFIX}-sent"
+TRACKING_FAILED_KEY = f"{TRACKING_STATS_PREFIX}-failed"
+TRACKING_DROPPED_KEY = f"{TRACKING_STATS_PREFIX}-dropped"
+TRACKING_QUEUE_SIZE_KEY = f"{TRACKING_STATS_PREFIX}-queue-size"
+TRACKING_LATENCY_KEY = f"{TRACKING_STATS_PREFIX}-latency"
+TRACKING_PROCESSES_KEY = f"{TRACKING_STATS_PREFIX}-processes"
 
-def _background_process(queue: Queue):
-    data = queue.get(block=True)
-    while data:
-        params = {
-            "idsite": matomo_site_id,
-            "action_name": data["r_path"],
-            "rec": 1,
-            "apiv": matomo_api_version,
-            "lang": data["client_accept_language"],
-            "ua": data["client_user_agent"],
-            "urlref": data["client_referer"],
-            "url": data["client_url"],
-            "h": data["datetime"].hour,
-            "m": data["datetime"].minute,
-            "s": data["datetime"].second,
-        }
-        if "search" in data:
-            params["search"] = data["search"]
-            params["search_cat"] = data["search_cat"]
-            params["search_count"] = data["search_count"]
+
+def _increment_tracking_counter(key, delta=1):
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:  # the key was evicted in between
+        cache.set(key, delta, timeout=None)
+
+
+def _get_process_key(key, process):
+    return f"{key}-{process}"
+
+
+def _get_process_id():
+    # the pid alone may be the same on several hosts sharing the cache
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def get_matomo_tracking_stats():
+    """
+    :return: number of page views sent to Matomo, not sent because of an error or dropped because a queue was full,
+        the total size of the queues of the processes, and the longest duration (in seconds) of the request of the
+        last batch sent by each process.
+    :rtype: dict
+    """
+    processes = cache.get(TRACKING_PROCESSES_KEY, [])
+    queue_sizes = cache.get_many([_get_process_key(TRACKING_QUEUE_SIZE_KEY, process) for process in processes])
+    latencies = cache.get_many([_get_process_key(TRACKING_LATENCY_KEY, process) for process in processes])
+    return {
+        "sent": cache.get(TRACKING_SENT_KEY, 0),
+        "failed": cache.get(TRACKING_FAILED_KEY, 0),
+        "dropped": cache.get(TRACKING_DROPPED_KEY, 0),
+        "queue_size": sum(queue_sizes.values()),
+        "latency": max(latencies.values(), default=0),
+    }
+
+
+def _get_tracking_params(data):
+    params = {
+        "idsite": matomo_site_id,
+        "action_name": data["r_path"],
+        "rec": 1,
+        "apiv": matomo_api_version,
+        "lang": data["client_accept_language"],
+        "ua": data["client_user_agent"],
+        "urlref": data["client_referer"],
+        "url": data["client_url"],
+        "h": data["datetime"].hour,
+        "m": data["datetime"].minute,
+        "s": data["datetime"].second,
+    }
+    if "search" in data:
+        params["search"] = data["search"]
+        params["search_cat"] = data["search_cat"]
+        params["search_count"] = data["search_count"]
+    if data["address_ip"] != "0.0.0.0":
+        params["cip"] = data["address_ip"]
+    return params
+
+
+class MatomoTracker:
+    """
+    Sends the page views to Matomo from a background thread, with its bulk tracking API, so that a request never
+    waits for Matomo. The page views are sent when ``matomo_batch_size`` of them are waiting, or at least every
+    ``matomo_flush_interval`` seconds. If Matomo is too slow, the queue is bounded and the page views in excess are
+    dropped (and counted) rather than filling the memory.
+    """
+
+    def __init__(self):
+        site_settings = settings.ZDS_APP["site"]
+        self.batch_size = site_settings["matomo_batch_size"]
+        self.flush_interval = site_settings["matomo_flush_interval"]
+        self.timeout = site_settings["matomo_timeout"]
+        self.queue = Queue(maxsize=site_settings["matomo_queue_size"])
+        # the page views dropped since the last batch, counted in the cache by the worker rather than by the requests
+        self.dropped = 0
+        self.dropped_lock = Lock()
+        # a batch is sent at least every flush interval, so the stats of a process expire soon after it stopped
+        self.stats_timeout = 10 * (self.flush_interval + self.timeout)
+        # the connection to Matomo is kept alive between batches
+        self.session = requests.Session()
+        self.session.mount(matomo_api_url, HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=1))
+        self.worker = Thread(target=self._background_process, daemon=True)
+
+    def start(self):
+        self.worker.start()
+
+    def stop(self):
+        try:
+            self.queue.put(False, timeout=1)
+        except Full:
+            pass
+        self.worker.join(timeout=2)
+
+    def track(self, data):
+        try:
+            self.queue.put_nowait(data)
+        except Full:
+            with self.dropped_lock:
+                self.dropped += 1
+
+    def _background_process(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                data = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except Empty:
+                data = None
+            if data is False:
+                self.send(batch)
+                return
+            if data:
+                batch.append(data)
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self.send(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def send(self, batch):
+        """
+        Sends a batch of page views in one request.
+
+        :param batch: the page views, as put in the queue by ``MatomoMiddleware.matomo_track()``
+        :return: ``True`` if Matomo received them
+        :rtype: bool
+        """
+        self._set_process_stat(TRACKING_QUEUE_SIZE_KEY, self.queue.qsize())
+        with self.dropped_lock:
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            _increment_tracking_counter(TRACKING_DROPPED_KEY, dropped)
+        if not batch:
+            return True
+        start = time.monotonic()
         try:
-            if data["address_ip"] != "0.0.0.0":
-                params["cip"] = data["address_ip"]
-            requests.get(
+            response = self.session.post(
                 matomo_api_url,
-                params=params,
+                json={
+                    "requests": ["?" + urlencode(_get_tracking_params(data)) for data in batch],
+                    "token_auth": matomo_token_auth,
+                },
+                timeout=self.timeout,
             )
-            logger.info(f'Matomo tracked this link : {data["client_url"]}')
+            response.raise_for_status()
         except Exception:
-            logger.exception(f'Something went wrong with the tracking of the link {data["client_url"]}')
+            logger.exception(f"Something went wrong with the tracking of {len(batch)} links")
+            _increment_tracking_counter(TRACKING_FAILED_KEY, len(batch))
+            return False
+        finally:
+            self._set_process_stat(TRACKING_LATENCY_KEY, time.monotonic() - start)
+        logger.info(f"Matomo tracked {len(batch)} links")
+        _increment_tracking_counter(TRACKING_SENT_KEY, len(batch))
+        return True
 
-        data = queue.get(block=True)
+    def _set_process_stat(self, key, value):
+        """
+        Stores a stat of the queue of this process, apart from the ones of the other processes, which have their own
+        queue. The process is added to the processes whose stats are gathered, if it is not already there.
+        """
+        process = _get_process_id()
+        cache.set(_get_process_key(key, process), value, timeout=self.stats_timeout)
+        processes = cache.get(TRACKING_PROCESSES_KEY, [])
+        if process not in processes:
+            # forget the processes which stopped
+            alive = cache.get_many([_get_process_key(TRACKING_QUEUE_SIZE_KEY, p) for p in processes])
+            processes = [p for p in processes if _get_process_key(TRACKING_QUEUE_SIZE_KEY, p) in alive]
+            cache.set(TRACKING_PROCESSES_KEY, processes + [process], timeout=None)
 
 
 def _compute_search_category(request):
@@ -67,11 +216,9 @@ def _compute_search_category(request):
 class MatomoMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
-        self.queue = Queue()
         if settings.ZDS_APP["site"]["matomo_tracking_enabled"]:
-            self.worker = Thread(target=_background_process, args=(self.queue,))
-            self.worker.setDaemon(True)
-            self.worker.start()
+            self.tracker = MatomoTracker()
+            self.tracker.start()
 
     def __call__(self, request):
         return self.process_response(request, self.get_response(request))
@@ -93,7 +240,7 @@ class MatomoMiddleware:
             }
             if search_data:
                 tracking_params.update(search_data)
-            self.queue.put(tracking_params)
+            self.tracker.track(tracking_params)
 
     def process_response(self, request, response):
         if response.status_code not in tracked_status_code or request.is_ajax():
@@ -129,5 +276,4 @@ class MatomoMiddleware:
 
     def __del__(self):
         if settings.ZDS_APP["site"]["matomo_tracking_enabled"]:
-            self.queue.put(False)
-            self.worker.join(timeout=2)
+            self.tracker.stop()
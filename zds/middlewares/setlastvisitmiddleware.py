@@ -3,6 +3,7 @@ import datetime
 from django.contrib.auth import logout
 
 from django.conf import settings
+from zds.member.utils import buffer_last_visit, get_buffered_last_visit
 from zds.member.views import get_client_ip
 
 
@@ -24,16 +25,23 @@ class SetLastVisitMiddleware:
 
         if user:
             profile = request.user.profile
-            if profile.last_visit is None:
-                profile.last_visit = datetime.datetime.now()
-                profile.last_ip_address = get_client_ip(request)
-                profile.save()
-            else:
-                duration = datetime.datetime.now() - profile.last_visit
-                if duration.seconds > settings.ZDS_APP["member"]["update_last_visit_interval"]:
-                    profile.last_visit = datetime.datetime.now()
+            queued = settings.ZDS_APP["member"]["last_visit_policy"] == "QUEUE"
+            last_visit = profile.last_visit
+            if queued:
+                # the last visit may not be saved yet
+                buffered = get_buffered_last_visit(profile.pk)
+                if buffered is not None:
+                    last_visit = buffered[0]
+
+            now = datetime.datetime.now()
+            interval = settings.ZDS_APP["member"]["update_last_visit_interval"]
+            if last_visit is None or (now - last_visit).total_seconds() > interval:
+                if queued:
+                    buffer_last_visit(profile.pk, now, get_client_ip(request))
+                else:
+                    profile.last_visit = now
                     profile.last_ip_address = get_client_ip(request)
-                    profile.save()
+                    profile.save(update_fields=["last_visit", "last_ip_address"])
             if not profile.can_read:
                 logout(request)
         return response
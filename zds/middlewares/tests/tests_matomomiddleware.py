@@ -0,0 +1,96 @@
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase
+
+from zds.middlewares.matomomiddleware import MatomoTracker, get_matomo_tracking_stats
+
+
+def _page_view(path):
+    return {
+        "client_user_agent": "Mozilla/5.0",
+        "client_referer": "",
+        "client_accept_language": "fr",
+        "client_url": f"https://zestedesavoir.com{path}",
+        "datetime": datetime.now().time(),
+        "r_path": path,
+        "address_ip": "0.0.0.0",
+    }
+
+
+class MatomoTrackerTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_send_batch(self):
+        tracker = MatomoTracker()
+        tracker.session.post = MagicMock()
+        self.assertTrue(tracker.send([_page_view("/forums/"), _page_view("/membres/")]))
+
+        # all the page views are sent in one request
+        tracker.session.post.assert_called_once()
+        kwargs = tracker.session.post.call_args.kwargs
+        self.assertEqual(settings.ZDS_APP["site"]["matomo_timeout"], kwargs["timeout"])
+        self.assertEqual(2, len(kwargs["json"]["requests"]))
+        params = parse_qs(kwargs["json"]["requests"][1][1:])
+        self.assertEqual(["/membres/"], params["action_name"])
+        self.assertNotIn("cip", params)
+
+        stats = get_matomo_tracking_stats()
+        self.assertEqual(2, stats["sent"])
+        self.assertEqual(0, stats["failed"])
+
+        # errors are counted rather than raised
+        tracker.session.post.side_effect = ConnectionError
+        self.assertFalse(tracker.send([_page_view("/forums/")]))
+        stats = get_matomo_tracking_stats()
+        self.assertEqual(2, stats["sent"])
+        self.assertEqual(1, stats["failed"])
+
+    def test_stats_of_each_process(self):
+        # the same pid on two hosts is another process
+        trackers = {process: MatomoTracker() for process in ("web1-1000", "web1-1001", "web2-1000")}
+        for process, tracker in trackers.items():
+            tracker.session.post = MagicMock()
+            tracker.track(_page_view("/forums/"))
+            with patch("zds.middlewares.matomomiddleware._get_process_id", return_value=process):
+                tracker.send([])
+
+        # the queues of all the processes are counted
+        self.assertEqual(3, get_matomo_tracking_stats()["queue_size"])
+
+        # the stats of the processes which stopped expire
+        cache.delete_many([f"matomo-tracking-queue-size-{process}" for process in trackers])
+        with patch("zds.middlewares.matomomiddleware._get_process_id", return_value="web1-1002"):
+            MatomoTracker().send([])
+        self.assertEqual(0, get_matomo_tracking_stats()["queue_size"])
+        self.assertEqual(["web1-1002"], cache.get("matomo-tracking-processes"))
+
+    def test_bounded_queue(self):
+        with patch.dict(settings.ZDS_APP["site"], {"matomo_queue_size": 2}):
+            tracker = MatomoTracker()
+        for i in range(5):
+            tracker.track(_page_view(f"/forums/{i}/"))
+
+        self.assertEqual(2, tracker.queue.qsize())
+        # the dropped page views are counted in the cache with the next batch
+        self.assertEqual(0, get_matomo_tracking_stats()["dropped"])
+        tracker.session.post = MagicMock()
+        tracker.send([])
+        self.assertEqual(3, get_matomo_tracking_stats()["dropped"])
+
+    def test_flush_on_batch_size_and_stop(self):
+        with patch.dict(settings.ZDS_APP["site"], {"matomo_batch_size": 2, "matomo_flush_interval": 60}):
+            tracker = MatomoTracker()
+        tracker.session.post = MagicMock()
+        for i in range(3):
+            tracker.track(_page_view(f"/forums/{i}/"))
+        tracker.start()
+        tracker.stop()
+
+        # a full batch, then the remaining page view when the tracker stopped
+        self.assertEqual([2, 1], [len(call.kwargs["json"]["requests"]) for call in tracker.session.post.call_args_list])
+        self.assertEqual(3, get_matomo_tracking_stats()["sent"])
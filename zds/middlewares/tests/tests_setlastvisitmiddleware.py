@@ -1,4 +1,7 @@
 from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from django.core.cache import cache
 
 from django.test import TestCase
 from django.urls import reverse
@@ -7,6 +10,7 @@ from django.shortcuts import get_object_or_404
 
 from zds.member.tests.factories import ProfileFactory
 from zds.member.models import Profile
+from zds.member.utils import LAST_VISIT_COUNT_KEY, buffer_last_visit, flush_last_visits, get_buffered_last_visit
 from django.conf import settings
 from copy import deepcopy
 
@@ -46,3 +50,56 @@ class SetLastVisitMiddlewareTest(TestCase):
         # the date of last visit should have been updated
         profile = get_object_or_404(Profile, pk=profile_pk)
         self.assertTrue(datetime.now() - profile.last_visit < timedelta(seconds=5))
+
+    def test_process_response_queued(self):
+        cache.clear()
+        other_user = ProfileFactory()
+        old_visit = datetime.now() - timedelta(seconds=45)
+        Profile.objects.filter(pk__in=[self.user.pk, other_user.pk]).update(last_visit=old_visit)
+
+        with patch.dict(overridden_zds_app["member"], {"last_visit_policy": "QUEUE"}):
+            for profile in [self.user, other_user]:
+                self.client.force_login(profile.user)
+                self.client.get(reverse("homepage"))
+                self.client.get(reverse("homepage"))
+
+        # the date of last visit is not saved by the request
+        self.assertEqual(old_visit, Profile.objects.get(pk=self.user.pk).last_visit)
+
+        # but by one query for all the profiles
+        with self.assertNumQueries(1):
+            self.assertEqual(2, flush_last_visits())
+        for profile in Profile.objects.filter(pk__in=[self.user.pk, other_user.pk]):
+            self.assertTrue(datetime.now() - profile.last_visit < timedelta(seconds=5))
+            self.assertEqual("127.0.0.1", profile.last_ip_address)
+
+        # nothing left to save
+        self.assertEqual(0, flush_last_visits())
+
+        # the saved visits stay in the cache until they expire, in case a newer one was stored in the meantime
+        self.assertIsNotNone(get_buffered_last_visit(self.user.pk))
+
+    def test_flush_after_counter_eviction(self):
+        other_user = ProfileFactory()
+        visit = datetime.now().replace(microsecond=0)
+        cache.set(LAST_VISIT_COUNT_KEY, 0, timeout=None)
+        buffer_last_visit(self.user.pk, visit, "127.0.0.2")
+
+        # the counter starts again after the visits not saved yet, so they are not overwritten
+        cache.delete(LAST_VISIT_COUNT_KEY)
+        buffer_last_visit(other_user.pk, visit, "127.0.0.3")
+        self.assertEqual(1, flush_last_visits())
+        self.assertEqual("127.0.0.2", Profile.objects.get(pk=self.user.pk).last_ip_address)
+
+        # and the indices left in between are skipped
+        self.assertEqual(1, flush_last_visits())
+        self.assertEqual("127.0.0.3", Profile.objects.get(pk=other_user.pk).last_ip_address)
+        self.assertEqual(0, flush_last_visits())
+
+        # the batches whose visits expired are skipped
+        buffer_last_visit(self.user.pk, visit, "127.0.0.4")
+        cache.delete(f"last-visit-profile-{self.user.pk}")
+        buffer_last_visit(other_user.pk, visit, "127.0.0.5")
+        self.assertEqual(1, flush_last_visits(batch_size=1))
+        self.assertEqual("127.0.0.2", Profile.objects.get(pk=self.user.pk).last_ip_address)
+        self.assertEqual("127.0.0.5", Profile.objects.get(pk=other_user.pk).last_ip_address)
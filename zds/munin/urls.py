@@ -1,6 +1,17 @@
 from django.urls import path
 
-from zds.munin.views import total_topics, total_posts, total_mps, total_tutorials, total_articles, total_opinions
+from zds.munin.views import (
+    total_topics,
+    total_posts,
+    total_mps,
+    total_tutorials,
+    total_articles,
+    total_opinions,
+    markdown_render_cache,
+    search_indexing_lag,
+    matomo_tracking,
+    matomo_tracking_latency,
+)
 
 
 urlpatterns = [
@@ -10,4 +21,8 @@ urlpatterns = [
     path("total_tutorials/", total_tutorials, name="total_tutorial"),
     path("total_articles/", total_articles, name="total_articles"),
     path("total_opinions/", total_opinions, name="total_opinions"),
+    path("markdown_render_cache/", markdown_render_cache, name="markdown_render_cache"),
+    path("search_indexing_lag/", search_indexing_lag, name="search_indexing_lag"),
+    path("matomo_tracking/", matomo_tracking, name="matomo_tracking"),
+    path("matomo_tracking_latency/", matomo_tracking_latency, name="matomo_tracking_latency"),
 ]
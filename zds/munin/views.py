@@ -2,6 +2,9 @@ from munin.helpers import muninview
 from zds.forum.models import Topic, Post
 from zds.mp.models import PrivateTopic, PrivatePost
 from zds.tutorialv2.models.database import PublishableContent, ContentReaction
+from zds.middlewares.matomomiddleware import get_matomo_tracking_stats
+from zds.searchv2.models import get_indexing_lag
+from zds.utils.templatetags.emarkdown import get_render_cache_stats
 
 
 @muninview(
@@ -77,3 +80,63 @@ def total_opinions(request):
         ("published", opinions.filter(sha_public__isnull=False).count()),
         ("converted", opinions.filter(converted_to__sha_public__isnull=False).count()),
     ]
+
+
+@muninview(
+    config="""graph_title Markdown rendering cache
+graph_vlabel renderings
+graph_args --base 1000 -l 0
+hits.label Hits
+hits.type DERIVE
+hits.min 0
+misses.label Misses
+misses.type DERIVE
+misses.min 0"""
+)
+def markdown_render_cache(request):
+    stats = get_render_cache_stats()
+    return [("hits", stats["hits"]), ("misses", stats["misses"])]
+
+
+@muninview(
+    config="""graph_title Search indexing lag
+graph_vlabel seconds
+lag.label Lag of the last indexing"""
+)
+def search_indexing_lag(request):
+    indexing_lag = get_indexing_lag()
+    return [("lag", indexing_lag["lag"] if indexing_lag else 0)]
+
+
+@muninview(
+    config="""graph_title Matomo tracking
+graph_vlabel page views
+graph_args --base 1000 -l 0
+sent.label Sent
+sent.type DERIVE
+sent.min 0
+failed.label Failed
+failed.type DERIVE
+failed.min 0
+dropped.label Dropped
+dropped.type DERIVE
+dropped.min 0
+queue.label Waiting in the queues of all the processes"""
+)
+def matomo_tracking(request):
+    stats = get_matomo_tracking_stats()
+    return [
+        ("sent", stats["sent"]),
+        ("failed", stats["failed"]),
+        ("dropped", stats["dropped"]),
+        ("queue", stats["queue_size"]),
+    ]
+
+
+@muninview(
+    config="""graph_title Matomo tracking latency
+graph_vlabel seconds
+latency.label Duration of the slowest last request"""
+)
+def matomo_tracking_latency(request):
+    return [("latency", get_matomo_tracking_stats()["latency"])]
@@ -0,0 +1,47 @@
+import logging
+import time
+
+from django.core.management import BaseCommand
+
+from zds.notification.utils import send_queued_notifications
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Notify the subscribers of the new topics, answers and publications saved while the fan-out policy is QUEUE"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Do not wait forever for new notifications.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of notification jobs handled at once.",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=5,
+            help="Number of attempts before giving up a notification job.",
+        )
+        parser.add_argument(
+            "--retry-delay",
+            type=int,
+            default=60,
+            help="Delay (in seconds) before handling again a notification job which failed, doubled after each failure.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            count = send_queued_notifications(options["batch_size"], options["max_attempts"], options["retry_delay"])
+            if count:
+                logger.info("Sent the notifications of %s jobs.", count)
+            elif options["once"]:
+                break
+            else:
+                time.sleep(5)
@@ -0,0 +1,118 @@
+import logging
+import time
+from datetime import datetime, timedelta
+from smtplib import SMTPException
+
+from django.core.mail import get_connection
+from django.core.management import BaseCommand
+from django.db import connection as db_connection, transaction
+
+from zds.notification.models import QueuedEmail
+
+logger = logging.getLogger(__name__)
+
+# seconds, besides the time needed to send a batch at the maximum rate, after which the emails claimed by a command
+# which was stopped while sending them are sent by another one
+CLAIM_MARGIN = 10 * 60
+
+
+class Command(BaseCommand):
+    help = "Send the emails of notification saved while the email policy is QUEUE"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Do not wait forever for new emails.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of emails sent through the same connection.",
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=10,
+            help="Maximum number of emails sent per second, 0 for no limit.",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=5,
+            help="Number of attempts before giving up an email.",
+        )
+        parser.add_argument(
+            "--retry-delay",
+            type=int,
+            default=60,
+            help="Delay (in seconds) before sending again an email which failed, doubled after each failure.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                count = self.send(options)
+            except (SMTPException, OSError):
+                logger.exception("Could not connect to the mail server.")
+                count = 0
+            if not count:
+                if options["once"]:
+                    break
+                time.sleep(10)
+
+    def send(self, options):
+        emails = self.claim(options)
+        if not emails:
+            return 0
+
+        with get_connection() as connection:
+            for email in emails:
+                start = time.monotonic()
+                try:
+                    connection.send_messages([email.to_message()])
+                except SMTPException:
+                    # the connection is opened again by the next email
+                    connection.close()
+                    self.postpone(email, options)
+                else:
+                    email.delete()
+                if options["rate"]:
+                    time.sleep(max(0, 1 / options["rate"] - (time.monotonic() - start)))
+        return len(emails)
+
+    @staticmethod
+    def claim(options):
+        """
+        Select the next emails to send and postpone them until they are sent, so that the other commands running at
+        the same time skip them.
+        """
+        now = datetime.now()
+        duration = options["batch_size"] / options["rate"] if options["rate"] else 0
+        with transaction.atomic():
+            # the emails being claimed by another command are skipped where the database allows it, else waited for
+            emails = list(
+                QueuedEmail.objects.select_for_update(
+                    skip_locked=db_connection.features.has_select_for_update_skip_locked
+                )
+                .filter(next_attempt__lte=now)
+                .order_by("pk")[: options["batch_size"]]
+            )
+            QueuedEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+                next_attempt=now + timedelta(seconds=duration + CLAIM_MARGIN)
+            )
+        return emails
+
+    @staticmethod
+    def postpone(email, options):
+        email.attempts += 1
+        if email.attempts >= options["max_attempts"]:
+            logger.error(
+                "Failed sending mail to %s, giving up after %s attempts.", email.to, email.attempts, exc_info=True
+            )
+            email.delete()
+        else:
+            logger.warning("Failed sending mail to %s, attempt %s.", email.to, email.attempts, exc_info=True)
+            email.next_attempt = datetime.now() + timedelta(seconds=options["retry_delay"] * 2 ** (email.attempts - 1))
+            email.save()
@@ -0,0 +1,52 @@
+# Generated by Django 3.2.15 on 2026-10-17 10:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("notification", "0017_clean_notifications_new_topic_forums_groups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NotificationJob",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "event",
+                    models.CharField(
+                        choices=[
+                            ("new_topic", "Nouveau sujet"),
+                            ("topic_answer", "Réponse à un sujet"),
+                            ("content_reaction", "Réaction à un contenu"),
+                            ("content_published", "Publication d'un contenu"),
+                        ],
+                        max_length=20,
+                        verbose_name="Événement",
+                    ),
+                ),
+                ("pubdate", models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Date de création")),
+                ("object_id", models.PositiveIntegerField()),
+                (
+                    "content_type",
+                    models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="contenttypes.contenttype"),
+                ),
+                (
+                    "sender",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="+", to=settings.AUTH_USER_MODEL
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Notification en attente",
+                "verbose_name_plural": "Notifications en attente",
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.15 on 2026-10-17 10:15
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("notification", "0018_notificationjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QueuedEmail",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("subject", models.TextField(verbose_name="Sujet")),
+                ("from_email", models.CharField(max_length=255, verbose_name="Expéditeur")),
+                ("to", models.EmailField(max_length=254, verbose_name="Destinataire")),
+                ("body", models.TextField(verbose_name="Texte")),
+                ("html_body", models.TextField(verbose_name="HTML")),
+                ("pubdate", models.DateTimeField(auto_now_add=True, verbose_name="Date de création")),
+                ("attempts", models.PositiveIntegerField(default=0, verbose_name="Nombre d'essais")),
+                (
+                    "next_attempt",
+                    models.DateTimeField(db_index=True, default=datetime.datetime.now, verbose_name="Prochain essai"),
+                ),
+            ],
+            options={
+                "verbose_name": "Courriel en attente",
+                "verbose_name_plural": "Courriels en attente",
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.15 on 2026-10-17 16:40
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("notification", "0019_queuedemail"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notificationjob",
+            name="attempts",
+            field=models.PositiveIntegerField(default=0, verbose_name="Nombre d'essais"),
+        ),
+        migrations.AddField(
+            model_name="notificationjob",
+            name="next_attempt",
+            field=models.DateTimeField(db_index=True, default=datetime.datetime.now, verbose_name="Prochain essai"),
+        ),
+    ]
@@ -1,13 +1,18 @@
 import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
 from smtplib import SMTPException
 
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.core.validators import validate_email, ValidationError
 from django.db import models, IntegrityError, transaction
+from django.db.models import Max
 from django.template.loader import render_to_string
+from django.utils.html import conditional_escape
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 
@@ -88,24 +93,21 @@ class Subscription(models.Model):
         """
         Sends an email notification
         """
+        send_notification_emails([self], [notification])
 
+    def render_email(self, notification):
+        """
+        Renders the email of a notification, with a placeholder instead of the username of the receiver, so that it
+        can be rendered only once for all the receivers of the same notification.
+
+        :return: the subject, the text and the HTML of the email
+        :rtype: tuple
+        """
         assert hasattr(self, "module")
 
         subject = _("{} - {} : {}").format(settings.ZDS_APP["site"]["literal_name"], self.module, notification.title)
-        from_email = _("{} <{}>").format(
-            settings.ZDS_APP["site"]["literal_name"], settings.ZDS_APP["site"]["email_noreply"]
-        )
-
-        receiver = self.user
-
-        # This can happen when a user subscribes via social networks without providing an e-mail address
-        try:
-            validate_email(receiver.email)
-        except ValidationError:
-            return
-
         context = {
-            "username": receiver.username,
+            "username": USERNAME_PLACEHOLDER,
             "title": notification.title,
             "url": settings.ZDS_APP["site"]["url"] + notification.url,
             "author": notification.sender.username,
@@ -117,13 +119,7 @@ class Subscription(models.Model):
         message_txt = render_to_string(
             "email/notification/" + convert_camel_to_underscore(self._meta.object_name) + ".txt", context
         )
-
-        msg = EmailMultiAlternatives(subject, message_txt, from_email, [receiver.email])
-        msg.attach_alternative(message_html, "text/html")
-        try:
-            msg.send()
-        except SMTPException:
-            LOG.error("Failed sending mail for %s", self, exc_info=True)
+        return subject, message_txt, message_html
 
     @staticmethod
     def has_read_permission(request):
@@ -133,6 +129,152 @@ class Subscription(models.Model):
         return Subscription.has_read_permission(request) and self.user == request.user
 
 
+USERNAME_PLACEHOLDER = "ZDS_NOTIFICATION_USERNAME"
+
+
+def send_notification_emails(subscriptions, notifications):
+    """
+    Sends the emails of the notifications of some subscriptions. The email of a notification is rendered once for all
+    its receivers, and the emails are sent through the same connection (at the end of the enclosing
+    ``defer_notification_emails()`` block, if any), or saved to be sent by the ``send_queued_mail`` command if
+    ``ZDS_APP['notification']['email_policy']`` is ``'QUEUE'``.
+
+    :param subscriptions: the subscriptions
+    :param notifications: the notification of each subscription, in the same order
+    """
+    from_email = _("{} <{}>").format(
+        settings.ZDS_APP["site"]["literal_name"], settings.ZDS_APP["site"]["email_noreply"]
+    )
+
+    messages = []
+    rendered = {}
+    for subscription, notification in zip(subscriptions, notifications):
+        receiver = subscription.user
+
+        # This can happen when a user subscribes via social networks without providing an e-mail address
+        try:
+            validate_email(receiver.email)
+        except ValidationError:
+            continue
+
+        key = (subscription._meta.object_name, notification.title, notification.url, notification.sender_id)
+        if key not in rendered:
+            rendered[key] = subscription.render_email(notification)
+        subject, message_txt, message_html = rendered[key]
+
+        # the templates escape the username
+        username = conditional_escape(receiver.username)
+        msg = EmailMultiAlternatives(
+            subject, message_txt.replace(USERNAME_PLACEHOLDER, username), from_email, [receiver.email]
+        )
+        msg.attach_alternative(message_html.replace(USERNAME_PLACEHOLDER, username), "text/html")
+        messages.append(msg)
+
+    if not messages:
+        return
+    if settings.ZDS_APP["notification"]["email_policy"] == "QUEUE":
+        QueuedEmail.objects.bulk_create([QueuedEmail.from_message(msg) for msg in messages])
+        return
+
+    deferred = getattr(_deferred_emails, "messages", None)
+    if deferred is not None:
+        deferred.extend(messages)
+    else:
+        _send_messages(messages)
+
+
+def _send_messages(messages):
+    with get_connection() as connection:
+        for msg in messages:
+            try:
+                connection.send_messages([msg])
+            except SMTPException:
+                LOG.error("Failed sending mail to %s", msg.to, exc_info=True)
+
+
+_deferred_emails = threading.local()
+
+
+@contextmanager
+def defer_notification_emails():
+    """
+    Delays the emails sent by ``send_notification_emails()`` inside the block until it exits without error, so that
+    they are not sent for notifications which are rolled back. It is entered before the transaction saving the
+    notifications, so that the emails are sent once it is committed. Inside another such block, the emails are sent
+    by the outermost one, and those of a failing inner block are dropped.
+    """
+    messages = getattr(_deferred_emails, "messages", None)
+    if messages is not None:
+        start = len(messages)
+        try:
+            yield
+        except BaseException:
+            del messages[start:]
+            raise
+        return
+
+    _deferred_emails.messages = messages = []
+    try:
+        yield
+    finally:
+        _deferred_emails.messages = None
+    _send_messages(messages)
+
+
+def save_notifications(subscriptions, notifications, send_email=True):
+    """
+    Saves in bulk the notifications built by ``send_notifications()`` for each subscription, makes them the last
+    notification of their subscription and sends the emails.
+
+    :param subscriptions: the subscriptions
+    :param notifications: the notification of each subscription, in the same order
+    :param send_email: whether an email must be sent if the subscription by email is active
+    """
+    if not subscriptions:
+        return
+
+    with transaction.atomic():
+        Notification.objects.bulk_update(
+            [notification for notification in notifications if notification.pk is not None],
+            ["content_type", "object_id", "sender", "url", "title", "pubdate", "is_read"],
+        )
+        created = [notification for notification in notifications if notification.pk is None]
+        Notification.objects.bulk_create(created)
+        if any(notification.pk is None for notification in created):
+            # some databases (such as MySQL) do not return the primary keys of the inserted rows
+            notification = created[0]
+            pks = dict(
+                Notification.objects.filter(
+                    subscription__in=[notification.subscription_id for notification in created],
+                    content_type=notification.content_type,
+                    object_id=notification.object_id,
+                )
+                .values("subscription")
+                .annotate(Max("pk"))
+                .values_list("subscription", "pk__max")
+            )
+            for notification in created:
+                notification.pk = pks[notification.subscription_id]
+
+        for subscription, notification in zip(subscriptions, notifications):
+            subscription.last_notification = notification
+        Subscription.objects.bulk_update(subscriptions, ["last_notification"])
+
+    from zds.notification.api.views import change_api_notification_updated_at
+    from zds.utils.header_notifications import invalidate_header_notifications
+
+    change_api_notification_updated_at()
+    invalidate_header_notifications(*[subscription.user_id for subscription in subscriptions])
+
+    if send_email:
+        by_email = [
+            (subscription, notification)
+            for subscription, notification in zip(subscriptions, notifications)
+            if subscription.by_email
+        ]
+        send_notification_emails([item[0] for item in by_email], [item[1] for item in by_email])
+
+
 class SingleNotificationMixin:
     """
     Mixin for the subscription that can only have one active notification at a time
@@ -171,6 +313,62 @@ class SingleNotificationMixin:
                 self.last_notification.content_object = content
                 self.last_notification.save()
 
+    @classmethod
+    def send_notifications(cls, subscriptions, content, sender=None, send_email=True):
+        """
+        Sends the notification about the given content to many subscriptions to the same object at once, as
+        ``send_notification()`` would do for each of them.
+
+        :param subscriptions: the subscriptions, with their ``last_notification`` (use ``select_related``)
+        :param content:  the content the notification is about
+        :param sender: the user whose action triggered the notification
+        :param send_email : whether an email must be sent if the subscription by email is active
+        """
+        subscriptions = list(subscriptions)
+        if not subscriptions:
+            return
+
+        to_notify = []
+        outdated = []
+        for subscription in subscriptions:
+            if subscription.last_notification is None or subscription.last_notification.is_read:
+                to_notify.append(subscription)
+            elif subscription.last_notification.pubdate > content.pubdate:
+                # Update last notification if the new content is older (marking answer as unread)
+                subscription.last_notification.content_object = content
+                outdated.append(subscription.last_notification)
+        Notification.objects.bulk_update(outdated, ["content_type", "object_id"])
+        if not to_notify:
+            return
+
+        existing = {}
+        duplicates = []
+        for notification in Notification.objects.filter(subscription__in=to_notify).order_by("pk"):
+            if notification.subscription_id in existing:
+                duplicates.append(notification.pk)
+            else:
+                existing[notification.subscription_id] = notification
+        if duplicates:
+            LOG.error("Found %s duplicated notifications", len(duplicates))
+            Notification.objects.filter(pk__in=duplicates).delete()
+            LOG.info("Duplicates deleted.")
+
+        # the subscriptions are about the same object, so the notifications have the same URL and title
+        url = to_notify[0].get_notification_url(content)
+        title = to_notify[0].get_notification_title(content)
+        notifications = []
+        for subscription in to_notify:
+            notification = existing.get(subscription.pk, None) or Notification(subscription=subscription)
+            notification.content_object = content
+            notification.sender = sender
+            notification.url = url
+            notification.title = title
+            notification.pubdate = content.pubdate
+            notification.is_read = False
+            notifications.append(notification)
+
+        save_notifications(to_notify, notifications, send_email)
+
     def build_notification(self, content, sender):
         # If there isn't a notification yet or the last one is read, we generate a new one.
         try:
@@ -192,7 +390,10 @@ class SingleNotificationMixin:
         no need for more precision
         """
         if self.last_notification is not None:
+            from zds.utils.header_notifications import invalidate_header_notifications
+
             Notification.objects.filter(pk=self.last_notification.pk).update(is_read=True)
+            invalidate_header_notifications(self.user_id)
 
 
 class MultipleNotificationsMixin:
@@ -219,6 +420,37 @@ class MultipleNotificationsMixin:
         if send_email and self.by_email:
             self.send_email(notification)
 
+    @classmethod
+    def send_notifications(cls, subscriptions, content, sender=None, send_email=True):
+        """
+        Sends the notification about the given content to many subscriptions to the same object at once, as
+        ``send_notification()`` would do for each of them.
+
+        :param subscriptions: the subscriptions, with their ``last_notification`` (use ``select_related``)
+        :param content:  the content the notification is about
+        :param sender: the user whose action triggered the notification
+        :param send_email : whether an email must be sent if the subscription by email is active
+        """
+        to_notify = [
+            subscription
+            for subscription in subscriptions
+            if subscription.last_notification is None or subscription.last_notification.is_read
+        ]
+        if not to_notify:
+            return
+
+        # the subscriptions are about the same object, so the notifications have the same URL and title
+        url = to_notify[0].get_notification_url(content)
+        title = to_notify[0].get_notification_title(content)
+        notifications = [
+            Notification(
+                subscription=subscription, content_object=content, sender=sender, url=url, title=title, is_read=False
+            )
+            for subscription in to_notify
+        ]
+
+        save_notifications(to_notify, notifications, send_email)
+
     def build_notification(self, content, sender):
         notification = Notification(subscription=self, content_object=content, sender=sender)
         notification.content_object = content
@@ -440,6 +672,81 @@ class Notification(models.Model):
         return Notification.has_read_permission(request) and self.subscription.user == request.user
 
 
+class NotificationJob(models.Model):
+    """
+    The notification of the subscribers to an object about a new content (topic, answer or publication), waiting for
+    the ``send_notifications`` command to send it to all of them at once.
+    """
+
+    class Meta:
+        verbose_name = _("Notification en attente")
+        verbose_name_plural = _("Notifications en attente")
+
+    EVENT_CHOICES = (
+        ("new_topic", _("Nouveau sujet")),
+        ("topic_answer", _("Réponse à un sujet")),
+        ("content_reaction", _("Réaction à un contenu")),
+        ("content_published", _("Publication d'un contenu")),
+    )
+
+    event = models.CharField(_("Événement"), max_length=20, choices=EVENT_CHOICES)
+    pubdate = models.DateTimeField(_("Date de création"), auto_now_add=True, db_index=True)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    content_object = GenericForeignKey("content_type", "object_id")
+    sender = models.ForeignKey(User, related_name="+", on_delete=models.CASCADE)
+    attempts = models.PositiveIntegerField(_("Nombre d'essais"), default=0)
+    next_attempt = models.DateTimeField(_("Prochain essai"), default=datetime.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.event} - {self.content_type} #{self.object_id}"
+
+
+class QueuedEmail(models.Model):
+    """
+    An email of notification waiting to be sent by the ``send_queued_mail`` command.
+    """
+
+    class Meta:
+        verbose_name = _("Courriel en attente")
+        verbose_name_plural = _("Courriels en attente")
+
+    subject = models.TextField(_("Sujet"))
+    from_email = models.CharField(_("Expéditeur"), max_length=255)
+    to = models.EmailField(_("Destinataire"), max_length=254)
+    body = models.TextField(_("Texte"))
+    html_body = models.TextField(_("HTML"))
+    pubdate = models.DateTimeField(_("Date de création"), auto_now_add=True)
+    attempts = models.PositiveIntegerField(_("Nombre d'essais"), default=0)
+    next_attempt = models.DateTimeField(_("Prochain essai"), default=datetime.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.to} : {self.subject}"
+
+    @staticmethod
+    def from_message(message):
+        """
+        :param message: an email with a single receiver and an HTML alternative
+        :type message: django.core.mail.EmailMultiAlternatives
+        :rtype: QueuedEmail
+        """
+        return QueuedEmail(
+            subject=message.subject,
+            from_email=message.from_email,
+            to=message.to[0],
+            body=message.body,
+            html_body=message.alternatives[0][0],
+        )
+
+    def to_message(self):
+        """
+        :rtype: django.core.mail.EmailMultiAlternatives
+        """
+        message = EmailMultiAlternatives(self.subject, self.body, self.from_email, [self.to])
+        message.attach_alternative(self.html_body, "text/html")
+        return message
+
+
 class TopicFollowed(models.Model):
     """
     This model tracks which user follows which topic.
@@ -9,7 +9,7 @@ except ImportError:
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.db import DatabaseError
-from django.db.models.signals import post_save, m2m_changed, pre_delete
+from django.db.models.signals import post_delete, post_save, m2m_changed, pre_delete
 from django.dispatch import receiver
 
 from zds.forum.models import Topic, Post, Forum
@@ -27,10 +27,12 @@ from zds.notification.models import (
     PingSubscription,
 )
 import zds.notification.signals as notification_signals
+from zds.notification.utils import notify_subscribers
 from zds.tutorialv2.models.database import PublishableContent, ContentReaction
 import zds.tutorialv2.signals as tuto_signals
 import zds.utils.signals as utils_signals
-from zds.utils.models import Tag
+from zds.utils.header_notifications import invalidate_header_alerts, invalidate_header_notifications
+from zds.utils.models import Alert, Tag
 
 logger = logging.getLogger(__name__)
 
@@ -327,10 +329,7 @@ def new_topic_event(sender, *, instance, created=True, **__):
     if created:
         topic = instance
 
-        subscriptions = NewTopicSubscription.objects.get_subscriptions(topic.forum)
-        for subscription in subscriptions:
-            if subscription.user != topic.author and topic.forum.can_read(subscription.user):
-                subscription.send_notification(content=topic, sender=topic.author)
+        notify_subscribers("new_topic", topic, topic.author)
 
 
 @receiver(post_save, sender=Post)
@@ -346,10 +345,7 @@ def answer_topic_event(sender, *, instance, created=True, **__):
     if created:
         post = instance
 
-        subscription_list = TopicAnswerSubscription.objects.get_subscriptions(post.topic)
-        for subscription in subscription_list:
-            if subscription.user != post.author:
-                subscription.send_notification(content=post, sender=post.author)
+        notify_subscribers("topic_answer", post, post.author)
 
         # Follow topic on answering
         TopicAnswerSubscription.objects.get_or_create_active(post.author, post.topic)
@@ -371,10 +367,7 @@ def answer_content_reaction_event(sender, *, instance, created=True, **__):
         publishable_content = content_reaction.related_content
         author = content_reaction.author
 
-        subscription_list = ContentReactionAnswerSubscription.objects.get_subscriptions(publishable_content)
-        for subscription in subscription_list:
-            if subscription.user != author:
-                subscription.send_notification(content=content_reaction, sender=author)
+        notify_subscribers("content_reaction", content_reaction, author)
 
         # Follow publishable content on answering
         ContentReactionAnswerSubscription.objects.get_or_create_active(author, publishable_content)
@@ -400,11 +393,7 @@ def content_published_event(*__, instance, by_email, **___):
         # this allows to fix the "auto subscribe issue" but can deactivate a manually triggered subscription
         subscription.deactivate()
 
-        for subscription in NewPublicationSubscription.objects.get_subscriptions(user).exclude(user__in=authors):
-            # this condition is here to avoid exponential notifications when a user already follows one of the authors
-            # while they are also among the authors.
-            by_email = subscription.by_email and subscription.user.profile.email_for_answer
-            subscription.send_notification(content=content, sender=user, send_email=by_email)
+        notify_subscribers("content_published", content, user)
 
 
 @receiver(mp_signals.topic_created, sender=PrivateTopic)
@@ -519,3 +508,30 @@ def ping_event(sender, *, instance, user, **__):
 def unping_event(sender, instance, user, **_):
     if user:
         PingSubscription.objects.deactivate_subscriptions(user, instance)
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def update_header_notifications(sender, *, instance, **__):
+    """
+    Outdate the cached notifications of the header of the subscriber when a notification is created, read or deleted.
+    """
+    if Notification.subscription.is_cached(instance):
+        user_pk = instance.subscription.user_id
+    else:
+        # rather than loading the whole subscription
+        user_pk = Subscription.objects.filter(pk=instance.subscription_id).values_list("user_id", flat=True).first()
+    if user_pk is not None:
+        invalidate_header_notifications(user_pk)
+
+
+@receiver(post_save, sender=User)
+def reset_header_notifications(sender, *, instance, created, **__):
+    if created:
+        invalidate_header_notifications(instance.pk)
+
+
+@receiver(post_save, sender=Alert)
+@receiver(post_delete, sender=Alert)
+def update_header_alerts(sender, **__):
+    invalidate_header_alerts()
@@ -1,11 +1,15 @@
 import copy
 from datetime import datetime, timedelta
-from django.contrib.auth.models import Group
+from smtplib import SMTPException
+from unittest.mock import patch
+from django.contrib.auth.models import Group, User
 from django.contrib.contenttypes.models import ContentType
 from django.core import mail
+from django.core.management import call_command
 from django.urls import reverse
 from django.test import TestCase
-from django.db import IntegrityError
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
 
 from django.conf import settings
 from zds.forum.tests.factories import (
@@ -16,11 +20,12 @@ from zds.forum.tests.factories import (
     TagFactory,
     create_category_and_forum,
 )
-from zds.forum.models import Topic
+from zds.forum.models import Topic, mark_read as mark_topic_read
 from zds.gallery.tests.factories import UserGalleryFactory
 from zds.member.tests.factories import ProfileFactory, StaffProfileFactory, UserFactory
 from zds.mp.models import mark_read
 from zds.tutorialv2 import signals
+from zds.notification.management.commands import send_queued_mail
 from zds.notification.models import (
     Notification,
     TopicAnswerSubscription,
@@ -28,6 +33,9 @@ from zds.notification.models import (
     PrivateTopicAnswerSubscription,
     NewTopicSubscription,
     NewPublicationSubscription,
+    NotificationJob,
+    QueuedEmail,
+    defer_notification_emails,
 )
 from zds.tutorialv2.tests.factories import (
     PublishableContentFactory,
@@ -534,6 +542,89 @@ class NotificationForumTest(TestCase):
 
         self.assertEqual(1, len(Notification.objects.filter(object_id=topic.pk, is_read=False, is_dead=True).all()))
 
+    def test_notify_many_subscribers(self):
+        topic = TopicFactory(forum=self.forum11, author=self.user2)
+        PostFactory(topic=topic, author=self.user2, position=1)
+        subscriptions = [
+            TopicAnswerSubscription.objects.get_or_create_active(ProfileFactory().user, topic) for _ in range(3)
+        ]
+        first_post = PostFactory(topic=topic, author=self.user1, position=2)
+        TopicAnswerSubscription.objects.get(pk=subscriptions[0].pk).mark_notification_read()
+
+        post = PostFactory(topic=topic, author=self.user2, position=3)
+        for subscription, content in zip(subscriptions, [post, first_post, first_post]):
+            # the notifications which are not read yet are about the first unread post
+            subscription = TopicAnswerSubscription.objects.get(pk=subscription.pk)
+            self.assertEqual(subscription.last_notification.content_object, content)
+            self.assertFalse(subscription.last_notification.is_read)
+            self.assertEqual(Notification.objects.filter(subscription=subscription).count(), 1)
+        subscription = TopicAnswerSubscription.objects.get_existing(self.user1, topic)
+        self.assertEqual(subscription.last_notification.content_object, post)
+
+        # only the members of the groups of a private forum are notified of its new topics
+        group = Group.objects.create(name="Private")
+        self.forum12.groups.add(group)
+        self.user1.groups.add(group)
+        NewTopicSubscription.objects.toggle_follow(self.forum12, self.user1)
+        NewTopicSubscription.objects.toggle_follow(self.forum12, self.user2)
+        user3 = ProfileFactory().user
+        user3.groups.add(group)
+        topic = TopicFactory(forum=self.forum12, author=user3)
+        self.assertEqual(
+            NewTopicSubscription.objects.get_existing(self.user1, self.forum12).last_notification.title, topic.title
+        )
+        self.assertIsNone(NewTopicSubscription.objects.get_existing(self.user2, self.forum12).last_notification)
+
+    def test_queued_notifications(self):
+        topic = TopicFactory(forum=self.forum11, author=self.user2)
+        PostFactory(topic=topic, author=self.user2, position=1)
+        subscription = TopicAnswerSubscription.objects.get_or_create_active(self.user1, topic)
+
+        with patch.dict(settings.ZDS_APP["notification"], {"fan_out_policy": "QUEUE"}):
+            post = PostFactory(topic=topic, author=self.user2, position=2)
+            deleted_post = PostFactory(topic=topic, author=self.user2, position=3)
+        self.assertEqual(NotificationJob.objects.count(), 2)
+        self.assertFalse(Notification.objects.filter(subscription=subscription).exists())
+        deleted_post.delete()
+
+        call_command("send_notifications", "--once")
+        self.assertEqual(NotificationJob.objects.count(), 0)
+        subscription = TopicAnswerSubscription.objects.get(pk=subscription.pk)
+        self.assertEqual(subscription.last_notification.content_object, post)
+        self.assertFalse(subscription.last_notification.is_read)
+
+    def test_queued_notifications_retried(self):
+        topic = TopicFactory(forum=self.forum11, author=self.user2)
+        PostFactory(topic=topic, author=self.user2, position=1)
+        subscription = TopicAnswerSubscription.objects.get_or_create_active(self.user1, topic)
+        with patch.dict(settings.ZDS_APP["notification"], {"fan_out_policy": "QUEUE"}):
+            post = PostFactory(topic=topic, author=self.user2, position=2)
+
+        # a job which fails is kept for a later attempt
+        with patch("zds.notification.utils.send_job_notifications", side_effect=RuntimeError):
+            call_command("send_notifications", "--once", "--max-attempts", "2")
+        job = NotificationJob.objects.get()
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.next_attempt, datetime.now())
+
+        # and not handled again before its next attempt
+        call_command("send_notifications", "--once")
+        self.assertTrue(NotificationJob.objects.exists())
+
+        NotificationJob.objects.update(next_attempt=datetime.now())
+        call_command("send_notifications", "--once")
+        self.assertFalse(NotificationJob.objects.exists())
+        subscription = TopicAnswerSubscription.objects.get(pk=subscription.pk)
+        self.assertEqual(subscription.last_notification.content_object, post)
+
+        # until it fails too many times
+        with patch.dict(settings.ZDS_APP["notification"], {"fan_out_policy": "QUEUE"}):
+            PostFactory(topic=topic, author=self.user2, position=3)
+        NotificationJob.objects.update(attempts=1)
+        with patch("zds.notification.utils.send_job_notifications", side_effect=RuntimeError):
+            call_command("send_notifications", "--once", "--max-attempts", "2")
+        self.assertFalse(NotificationJob.objects.exists())
+
 
 class NotificationPublishableContentTest(TestCase):
     def setUp(self):
@@ -947,6 +1038,66 @@ class NotificationTest(TestCase):
         with self.assertRaises(IntegrityError):
             subscription.save()
 
+    def test_queued_emails(self):
+        category = ForumCategoryFactory(position=1)
+        forum = ForumFactory(category=category, position_in_category=1)
+        topic = TopicFactory(forum=forum, author=self.user1)
+        PostFactory(topic=topic, author=self.user1, position=1)
+        TopicAnswerSubscription.objects.toggle_follow(topic, self.user1, True)
+        user3 = ProfileFactory().user
+        TopicAnswerSubscription.objects.toggle_follow(topic, user3, True)
+
+        with patch.dict(settings.ZDS_APP["notification"], {"email_policy": "QUEUE"}):
+            PostFactory(topic=topic, author=self.user2, position=2)
+        self.assertEqual(0, len(mail.outbox))
+        self.assertEqual(2, QueuedEmail.objects.count())
+        # the email is rendered once for all the receivers, with their own username
+        for email in QueuedEmail.objects.all():
+            self.assertIn(User.objects.get(email=email.to).username, email.body)
+            self.assertIn(User.objects.get(email=email.to).username, email.html_body)
+
+        # the emails being sent by a command are skipped by the others
+        claimed = send_queued_mail.Command.claim({"batch_size": 1, "rate": 0})
+        self.assertEqual(1, len(claimed))
+        self.assertNotIn(claimed[0], send_queued_mail.Command.claim({"batch_size": 2, "rate": 0}))
+        self.assertEqual([], send_queued_mail.Command.claim({"batch_size": 2, "rate": 0}))
+        QueuedEmail.objects.update(next_attempt=datetime.now())
+
+        # the first email cannot be sent, so it is sent again later
+        with patch("django.core.mail.backends.locmem.EmailBackend.send_messages") as send:
+            send.side_effect = [SMTPException(), 1]
+            call_command("send_queued_mail", "--once", "--rate", "0")
+        email = QueuedEmail.objects.get()
+        self.assertEqual(1, email.attempts)
+        self.assertGreater(email.next_attempt, datetime.now())
+
+        email.next_attempt = datetime.now()
+        email.save()
+        call_command("send_queued_mail", "--once", "--rate", "0")
+        self.assertEqual(0, QueuedEmail.objects.count())
+        self.assertEqual(1, len(mail.outbox))
+        self.assertEqual([email.to], mail.outbox[0].to)
+        self.assertIn(User.objects.get(email=email.to).username, mail.outbox[0].body)
+
+    def test_deferred_emails(self):
+        category = ForumCategoryFactory(position=1)
+        forum = ForumFactory(category=category, position_in_category=1)
+        topic = TopicFactory(forum=forum, author=self.user1)
+        PostFactory(topic=topic, author=self.user1, position=1)
+        TopicAnswerSubscription.objects.toggle_follow(topic, self.user1, True)
+
+        # the emails of notifications which are rolled back are not sent
+        with self.assertRaises(IntegrityError):
+            with defer_notification_emails(), transaction.atomic():
+                PostFactory(topic=topic, author=self.user2, position=2)
+                raise IntegrityError()
+        self.assertEqual(0, len(mail.outbox))
+
+        with defer_notification_emails():
+            PostFactory(topic=topic, author=self.user2, position=2)
+            self.assertEqual(0, len(mail.outbox))
+        self.assertEqual(1, len(mail.outbox))
+
     def test_new_cowritten_content_without_doubly_notif(self):
         author1 = ProfileFactory()
         author2 = ProfileFactory()
@@ -979,3 +1130,31 @@ class NotificationTest(TestCase):
         self.assertEqual(0, len(notifications))
 
         self.assertTrue(Topic.objects.get(pk=topic.pk).is_read)
+
+    def test_mark_many_notifications_as_read(self):
+        category = ForumCategoryFactory(position=1)
+        forum = ForumFactory(category=category, position_in_category=1)
+        self.client.force_login(self.user1)
+
+        def mark_as_read(topic_count):
+            topics = []
+            for _ in range(topic_count):
+                topic = TopicFactory(forum=forum, author=self.user1)
+                PostFactory(topic=topic, author=self.user1, position=1)
+                PostFactory(topic=topic, author=self.user2, position=2)
+                topics.append(topic)
+            # the first topic was already read
+            mark_topic_read(topics[0], self.user1)
+            PostFactory(topic=topics[0], author=self.user2, position=3)
+
+            with CaptureQueriesContext(connection) as queries:
+                result = self.client.post(reverse("notification:mark-as-read"), follow=False)
+            self.assertEqual(result.status_code, 302)
+            self.assertEqual(0, len(Notification.objects.get_unread_notifications_of(self.user1)))
+            for topic in topics:
+                self.assertTrue(Topic.objects.get(pk=topic.pk).is_read)
+            return len(queries)
+
+        # the number of queries does not depend on the number of notifications (once the content types are cached)
+        mark_as_read(2)
+        self.assertEqual(mark_as_read(2), mark_as_read(5))
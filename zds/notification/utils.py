@@ -0,0 +1,152 @@
+import logging
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+
+from zds.notification.models import (
+    ContentReactionAnswerSubscription,
+    NewPublicationSubscription,
+    NewTopicSubscription,
+    NotificationJob,
+    TopicAnswerSubscription,
+    defer_notification_emails,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def notify_subscribers(event, content, sender):
+    """
+    Notifies the subscribers of the object concerned by a new content. The notifications are sent right now, or by the
+    ``send_notifications`` command if ``ZDS_APP['notification']['fan_out_policy']`` is ``'QUEUE'``, so that the request
+    only saves one row whatever the number of subscribers.
+
+    :param event: the kind of the content, see ``NotificationJob.EVENT_CHOICES``
+    :param content: the new topic, answer or published content
+    :param sender: the user whose action triggered the notification
+    """
+    job = NotificationJob(event=event, content_object=content, sender=sender)
+    if settings.ZDS_APP["notification"]["fan_out_policy"] == "QUEUE":
+        job.save()
+    else:
+        send_job_notifications(job)
+
+
+def send_job_notifications(job):
+    """
+    Sends the notifications of a job to all the subscribers, in a few queries.
+
+    :param job: the job
+    :type job: zds.notification.models.NotificationJob
+    """
+    content = job.content_object
+    if content is None:
+        logger.info("The content of %s does not exist any more.", job)
+        return
+
+    with defer_notification_emails(), transaction.atomic():
+        if job.event == "new_topic":
+            forum = content.forum
+            subscriptions = NewTopicSubscription.objects.get_subscriptions(forum).exclude(user=content.author)
+            if forum.has_group:
+                # only the members of one of the groups of the forum can read the topic
+                subscriptions = subscriptions.filter(user__groups__in=forum.groups.all()).distinct()
+            NewTopicSubscription.send_notifications(
+                subscriptions.select_related("last_notification", "user"), content, job.sender
+            )
+        elif job.event == "topic_answer":
+            subscriptions = TopicAnswerSubscription.objects.get_subscriptions(content.topic).exclude(user=job.sender)
+            TopicAnswerSubscription.send_notifications(
+                subscriptions.select_related("last_notification", "user"), content, job.sender
+            )
+        elif job.event == "content_reaction":
+            subscriptions = ContentReactionAnswerSubscription.objects.get_subscriptions(
+                content.related_content
+            ).exclude(user=job.sender)
+            ContentReactionAnswerSubscription.send_notifications(
+                subscriptions.select_related("last_notification", "user"), content, job.sender
+            )
+        elif job.event == "content_published":
+            # this condition is here to avoid exponential notifications when a user already follows one of the
+            # authors while they are also among the authors.
+            subscriptions = (
+                NewPublicationSubscription.objects.get_subscriptions(job.sender)
+                .exclude(user__in=content.authors.all())
+                .select_related("last_notification", "user__profile")
+            )
+            subscriptions = list(subscriptions)
+            NewPublicationSubscription.send_notifications(
+                [s for s in subscriptions if s.user.profile.email_for_answer], content, job.sender
+            )
+            NewPublicationSubscription.send_notifications(
+                [s for s in subscriptions if not s.user.profile.email_for_answer], content, job.sender, False
+            )
+        else:
+            raise ValueError(f"Unknown notification event: {job.event}")
+
+
+def send_queued_notifications(limit=None, max_attempts=5, retry_delay=60):
+    """
+    Sends the notifications of the jobs saved by ``notify_subscribers()``, from the oldest one, and deletes them.
+    The jobs are locked until their notifications are saved, so that several commands may run at the same time
+    without notifying twice. A job which fails is tried again later, and given up after ``max_attempts`` attempts.
+
+    :param limit: maximum number of jobs to handle, ``None`` to handle all of them
+    :param max_attempts: number of attempts before giving up a job
+    :param retry_delay: delay (in seconds) before handling again a job which failed, doubled after each failure
+    :return: the number of jobs handled
+    :rtype: int
+    """
+    with defer_notification_emails(), transaction.atomic():
+        # the jobs locked by another command are skipped where the database allows it, else waited for
+        jobs = (
+            NotificationJob.objects.select_for_update(skip_locked=connection.features.has_select_for_update_skip_locked)
+            .filter(next_attempt__lte=datetime.now())
+            .prefetch_related("sender")
+            .order_by("pk")
+        )
+        if limit is not None:
+            jobs = jobs[:limit]
+        jobs = list(jobs)
+        _fetch_job_contents(jobs)
+
+        for job in jobs:
+            try:
+                send_job_notifications(job)
+            except Exception:
+                _postpone_job(job, max_attempts, retry_delay)
+            else:
+                job.delete()
+    return len(jobs)
+
+
+def _fetch_job_contents(jobs):
+    # fetch the contents of the jobs by type rather than one at a time
+    for content_type in {job.content_type_id for job in jobs}:
+        model = ContentType.objects.get_for_id(content_type).model_class()
+        same_type = [job for job in jobs if job.content_type_id == content_type]
+        contents = model.objects.in_bulk([job.object_id for job in same_type])
+        for job in same_type:
+            if job.object_id in contents:
+                job.content_object = contents[job.object_id]
+
+
+def _postpone_job(job, max_attempts, retry_delay):
+    """
+    Schedules a new attempt of a job which failed, or deletes it after ``max_attempts`` attempts.
+
+    :param job: the job
+    :type job: zds.notification.models.NotificationJob
+    """
+    job.attempts += 1
+    if job.attempts >= max_attempts:
+        logger.error(
+            "Could not send the notifications of %s, giving up after %s attempts.", job, job.attempts, exc_info=True
+        )
+        job.delete()
+    else:
+        logger.warning("Could not send the notifications of %s, attempt %s.", job, job.attempts, exc_info=True)
+        job.next_attempt = datetime.now() + timedelta(seconds=retry_delay * 2 ** (job.attempts - 1))
+        job.save(update_fields=["attempts", "next_attempt"])
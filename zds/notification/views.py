@@ -1,5 +1,8 @@
+from collections import defaultdict
+
 from django.contrib.auth.decorators import login_required
 from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
 from django.utils.decorators import method_decorator
 from django.contrib import messages
 from django.views.decorators.http import require_POST
@@ -10,11 +13,11 @@ from django.urls import reverse
 from django.conf import settings
 from zds.mp.models import PrivateTopic
 from zds.notification.models import Notification
+from zds.utils.header_notifications import invalidate_header_notifications
 from zds.utils.paginator import ZdSPagingListView
-from zds.forum.models import Post
-from zds.tutorialv2.models.database import ContentReaction
-from zds.forum.models import mark_read as mark_topic_read
-from zds.tutorialv2.utils import mark_read as mark_content_read
+from zds.forum.models import Post, Topic, TopicRead
+from zds.tutorialv2.models.database import ContentReaction, PublishableContent
+from zds.tutorialv2.utils import mark_read_in_bulk as mark_contents_read
 
 
 class NotificationList(ZdSPagingListView):
@@ -54,13 +57,25 @@ def mark_notifications_as_read(request):
     notifications = Notification.objects.get_unread_notifications_of(request.user).exclude(
         subscription__content_type=content_type
     )
-    for notification in notifications:
-        if isinstance(notification.content_object, Post):
-            mark_topic_read(notification.content_object.topic, request.user)
-        if isinstance(notification.content_object, ContentReaction):
-            mark_content_read(notification.content_object.related_content, request.user)
+    object_pks = defaultdict(list)
+    for content_type_pk, object_pk in notifications.values_list("content_type", "object_id"):
+        object_pks[content_type_pk].append(object_pk)
+
+    with transaction.atomic():
+        post_pks = object_pks[ContentType.objects.get_for_model(Post).pk]
+        if post_pks:
+            topics = Topic.objects.filter(pk__in=Post.objects.filter(pk__in=post_pks).values("topic"))
+            TopicRead.objects.mark_read_in_bulk(topics, request.user)
+        reaction_pks = object_pks[ContentType.objects.get_for_model(ContentReaction).pk]
+        if reaction_pks:
+            contents = PublishableContent.objects.filter(
+                pk__in=ContentReaction.objects.filter(pk__in=reaction_pks).values("related_content")
+            )
+            mark_contents_read(contents, request.user)
 
-    notifications.update(is_read=True)
+        # the other notifications of these topics and contents are also marked as read by this update
+        notifications.update(is_read=True)
+    invalidate_header_notifications(request.user.pk)
 
     messages.success(request, _("Vos notifications ont bien été marquées comme lues."))
 
@@ -1,7 +1,16 @@
 from django.contrib.auth.models import Group, User
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
 
+from zds.featured.models import FeaturedMessage, FeaturedResource
+from zds.forum.models import Topic
+from zds.forum.signals import topic_moved
+from zds.tutorialv2.models.database import PublishableContent, PublishedContent
+from zds.tutorialv2.signals import content_unpublished
+from zds.utils.cache import HOME_PAGE, mark_outdated
+
 
 class GroupContact(models.Model):
     """
@@ -21,3 +30,38 @@ class GroupContact(models.Model):
 
     def __str__(self):
         return self.name
+
+
+# the fields of a topic shown on the home page, or deciding whether it is listed there
+HOME_PAGE_TOPIC_FIELDS = ("title", "is_locked")
+
+
+@receiver(post_save, sender=PublishedContent)
+@receiver(post_delete, sender=PublishedContent)
+@receiver(content_unpublished, sender=PublishableContent)
+@receiver(post_delete, sender=Topic)
+@receiver(topic_moved, sender=Topic)
+@receiver(post_save, sender=FeaturedMessage)
+@receiver(post_delete, sender=FeaturedMessage)
+@receiver(post_save, sender=FeaturedResource)
+@receiver(post_delete, sender=FeaturedResource)
+def outdate_home_page(sender, **__):
+    """
+    Compute the home page again after a publication, a change of a topic or of the featured resources.
+    """
+    mark_outdated(HOME_PAGE)
+
+
+@receiver(post_save, sender=Topic)
+def outdate_home_page_on_topic_change(sender, instance, created, **__):
+    """
+    Compute the home page again after a new topic or a change of the fields it shows, but not after the other changes
+    of a topic, such as a new answer, which are shown once the cached data is outdated.
+    """
+    loaded_values = getattr(instance, "_loaded_values", None)
+    if (
+        created
+        or loaded_values is None
+        or any(loaded_values.get(field) != getattr(instance, field) for field in HOME_PAGE_TOPIC_FIELDS)
+    ):
+        mark_outdated(HOME_PAGE)
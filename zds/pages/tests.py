@@ -1,11 +1,16 @@
+from copy import deepcopy
+from unittest.mock import patch
+
+from django.conf import settings
 from django.urls import reverse
 from django.test import TestCase
 from django.test.utils import override_settings
 from django.utils.translation import gettext_lazy as _
 
-from zds.forum.models import Post
+from zds.forum.models import Post, Topic
 from zds.forum.tests.factories import create_category_and_forum, create_topic_in_forum
 from zds.member.tests.factories import ProfileFactory, StaffProfileFactory
+from zds.pages.views import get_home_data
 from zds.utils.models import CommentEdit
 from zds.utils.templatetags.emarkdown import render_markdown
 
@@ -196,6 +201,45 @@ class PagesGuestTests(TestCase):
         self.assertTrue("zds_version" in result.context)
 
 
+overridden_zds_app = deepcopy(settings.ZDS_APP)
+overridden_zds_app["home_cache_timeout"] = 5 * 60
+
+
+@override_settings(ZDS_APP=overridden_zds_app)
+class HomeCacheTests(TestCase):
+    def test_home_cached_until_new_topic(self):
+        _, forum = create_category_and_forum()
+        author = ProfileFactory()
+        topic = create_topic_in_forum(forum, author)
+
+        with patch("zds.pages.views.get_home_data", wraps=get_home_data) as home_data:
+            self.assertIn(topic, self.client.get(reverse("homepage")).context["last_topics"])
+            self.assertIn(topic, self.client.get(reverse("homepage")).context["last_topics"])
+            self.assertEqual(home_data.call_count, 1)  # the second request uses the cache
+
+            other_topic = create_topic_in_forum(forum, author)
+            self.assertIn(other_topic, self.client.get(reverse("homepage")).context["last_topics"])
+            self.assertEqual(home_data.call_count, 2)  # the new topic outdated the cached data
+
+    def test_home_outdated_by_shown_topic_fields(self):
+        _, forum = create_category_and_forum()
+        topic = create_topic_in_forum(forum, ProfileFactory())
+
+        with patch("zds.pages.views.get_home_data", wraps=get_home_data) as home_data:
+            self.client.get(reverse("homepage"))
+            topic = Topic.objects.get(pk=topic.pk)
+            topic.is_sticky = True
+            topic.save()
+            self.client.get(reverse("homepage"))
+            self.assertEqual(home_data.call_count, 1)  # the home page does not show this field
+
+            topic = Topic.objects.get(pk=topic.pk)
+            topic.title = "Renamed"
+            topic.save()
+            self.assertContains(self.client.get(reverse("homepage")), "Renamed")
+            self.assertEqual(home_data.call_count, 2)
+
+
 class CommentEditsHistoryTests(TestCase):
     def setUp(self):
         self.user = ProfileFactory().user
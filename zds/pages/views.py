@@ -19,6 +19,7 @@ from zds.member.decorator import can_write_and_read_now
 from zds.pages.models import GroupContact
 from zds.searchv2.forms import SearchForm
 from zds.tutorialv2.models.database import PublishableContent, PublishedContent
+from zds.utils.cache import HOME_PAGE, get_or_refresh
 from zds.utils.context_processor import get_repository_url
 from zds.utils.models import Alert, CommentEdit, Comment
 
@@ -30,25 +31,31 @@ except OSError:
     QUOTES = [settings.ZDS_APP["site"]["slogan"]]
 
 
+def get_home_data():
+    """Get the last publications and topics displayed on the home page, which are the same for every visitor."""
+
+    return {
+        "featured_message": FeaturedMessage.objects.get_last_message(),
+        "last_tutorials": PublishableContent.objects.get_last_tutorials(),
+        "last_articles": PublishableContent.objects.get_last_articles(),
+        "last_opinions": PublishableContent.objects.get_last_opinions(),
+        "last_featured_resources": list(FeaturedResource.objects.get_last_featured()),
+        "last_topics": list(Topic.objects.get_last_topics()),
+        "contents_count": PublishedContent.objects.get_contents_count(),
+    }
+
+
 def home(request):
-    """Display the home page with last topics added."""
+    """Display the home page with last topics added.
+    Its data is cached, and computed again after a publication or a new topic (see ``zds.utils.cache``)."""
 
-    tutos = PublishableContent.objects.get_last_tutorials()
-    articles = PublishableContent.objects.get_last_articles()
-    opinions = PublishableContent.objects.get_last_opinions()
     quote = random.choice(QUOTES)
 
     return render(
         request,
         "home.html",
         {
-            "featured_message": FeaturedMessage.objects.get_last_message(),
-            "last_tutorials": tutos,
-            "last_articles": articles,
-            "last_opinions": opinions,
-            "last_featured_resources": FeaturedResource.objects.get_last_featured(),
-            "last_topics": Topic.objects.get_last_topics(),
-            "contents_count": PublishedContent.objects.get_contents_count(),
+            **get_or_refresh(HOME_PAGE, get_home_data, settings.ZDS_APP["home_cache_timeout"]),
             "quote": quote.replace("\n", ""),
             "search_form": SearchForm(initial={}),
         },
@@ -1,9 +1,24 @@
+import logging
+import time
+from datetime import datetime
+
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
-
-from zds.searchv2.models import ESIndexManager, get_django_indexable_objects
+from django.db import close_old_connections
+from elasticsearch import ConnectionError, NotFoundError
+
+from zds.searchv2.models import (
+    ESIndexManager,
+    NeedIndex,
+    get_django_indexable_objects,
+    pop_flagging_date,
+    remember_flagging_date,
+    set_indexing_lag,
+)
 from zds.tutorialv2.models.database import FakeChapter
 
+logger = logging.getLogger(__name__)
+
 
 class Command(BaseCommand):
     help = "Index data in ES and manage them"
@@ -26,7 +41,28 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument(
-            "action", type=str, help="action to perform", choices=["setup", "clear", "index_all", "index_flagged"]
+            "action",
+            type=str,
+            help="action to perform",
+            choices=["setup", "clear", "index_all", "index_flagged", "watch"],
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="number of threads building the documents while others are fetched and sent (default: 1)",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="with watch, seconds between two checks for flagged objects (default: 5)",
+        )
+        parser.add_argument(
+            "--window",
+            type=float,
+            default=2,
+            help="with watch, seconds to wait for other changes once a flagged object is found (default: 2)",
         )
 
     def handle(self, *args, **options):
@@ -36,16 +72,17 @@ class Command(BaseCommand):
         elif options["action"] == "clear":
             self.clear_es()
         elif options["action"] == "index_all":
-            self.index_documents(force_reindexing=True)
+            self.index_documents(force_reindexing=True, workers=options["workers"])
         elif options["action"] == "index_flagged":
-            self.index_documents(force_reindexing=False)
+            self.index_documents(force_reindexing=False, workers=options["workers"])
+        elif options["action"] == "watch":
+            self.watch(options["interval"], options["window"], workers=options["workers"])
         else:
             raise CommandError("unknown action {}".format(options["action"]))
 
     def setup_es(self):
 
-        self.index_manager.reset_es_index(self.models)
-        self.index_manager.setup_custom_analyzer()
+        self.index_manager.reset_es_index(self.models)  # also setup the custom analyzer
 
         self.index_manager.refresh_index()
 
@@ -55,20 +92,109 @@ class Command(BaseCommand):
         for model in self.models:
             self.index_manager.clear_indexing_of_model(model)
 
-    def index_documents(self, force_reindexing=False):
+    def index_documents(self, force_reindexing=False, workers=1):
+
+        # the flagged objects are indexed now, so the lag of the next indexing is measured from the ones flagged later
+        flagged_at = pop_flagging_date()
+        try:
+            self._index_documents(force_reindexing, workers)
+        except Exception:
+            if flagged_at is not None:
+                remember_flagging_date(flagged_at)
+            raise
 
+    def _index_documents(self, force_reindexing, workers):
+
+        index = None
         if force_reindexing:
-            self.setup_es()  # remove all previous data
+            # index everything in a new index while the current one is still used for searching
+            index = self.index_manager.create_versioned_index(self.models)
 
         for model in self.models:
             if model is FakeChapter:
                 continue
 
+            report = None
             if force_reindexing:
-                print(f"- indexing {model.get_es_document_type()}s")
+                self.stdout.write(f"- indexing {model.get_es_document_type()}s")
+                report = self.report_throughput
 
-            indexed_counter = self.index_manager.es_bulk_indexing_of_model(model, force_reindexing=force_reindexing)
+            indexed_counter = self.index_manager.es_bulk_indexing_of_model(
+                model, force_reindexing=force_reindexing, workers=workers, report=report, index=index
+            )
             if force_reindexing:
-                print(f"  {indexed_counter}\titems indexed")
+                self.stdout.write(f"  {indexed_counter}\titems indexed")
 
-        self.index_manager.refresh_index()
+        self.index_manager.refresh_index(index)
+
+        if force_reindexing:
+            self.index_manager.switch_alias(index)
+
+    def report_throughput(self, indexed_counter, per_second):
+        self.stdout.write(f"    {indexed_counter} so far ({per_second} obj/s)")
+
+    def watch(self, interval, window, workers=1):
+        """Index flagged objects as soon as they appear, until interrupted.
+
+        Errors (ES unreachable, index removed, etc.) do not stop the watch: the state of the index is checked again
+        and the next attempt is delayed, twice as long after each failure in a row (up to 5 minutes).
+        """
+
+        self.stdout.write(f"Watching flagged objects every {interval}s, press Ctrl+C to stop")
+        failures = 0
+        try:
+            while True:
+                start = time.monotonic()
+                try:
+                    self.index_manager.check_state_if_outdated(settings.ES_STATE_CHECK_INTERVAL)
+                    if not self.index_manager.connected_to_es or not self.index_manager.index_exists:
+                        raise NeedIndex()
+                    self.index_flagged_documents(window, workers)
+                except (ConnectionError, NeedIndex, NotFoundError):
+                    logger.warning("Elasticsearch or the index is not available, flagged objects are not indexed")
+                    self.index_manager.invalidate_state()
+                    failures += 1
+                except Exception:
+                    logger.exception("Could not index the flagged objects")
+                    self.index_manager.invalidate_state()
+                    failures += 1
+                else:
+                    failures = 0
+                delay = min(interval * 2**failures, 300) if failures else interval
+                time.sleep(max(0, delay - (time.monotonic() - start)))
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped watching")
+
+    def index_flagged_documents(self, window=0, workers=1):
+        """Index the flagged objects, if any. When some are found, first wait for ``window`` seconds so that
+        changes happening at the same time (a new post and its topic, for instance) are indexed together.
+
+        :return: the number of documents indexed
+        :rtype: int
+        """
+
+        close_old_connections()
+
+        models = [model for model in self.models if model is not FakeChapter]
+        if not any(model.get_es_django_indexable().exists() for model in models):
+            return 0
+
+        time.sleep(window)
+        # the objects flagged from now on are indexed now or measured from their own date by the next indexing
+        flagged_at = pop_flagging_date() or datetime.now()
+
+        try:
+            indexed_counter = 0
+            for model in models:
+                indexed_counter += self.index_manager.es_bulk_indexing_of_model(model, workers=workers)
+            self.index_manager.refresh_index()
+        except Exception:
+            # the objects are still flagged, keep their date for the next attempt
+            remember_flagging_date(flagged_at)
+            raise
+
+        lag = (datetime.now() - flagged_at).total_seconds()
+        set_indexing_lag(lag, indexed_counter)
+        self.stdout.write(f"{datetime.now():%Y-%m-%d %H:%M:%S} {indexed_counter} documents indexed, lag: {lag:.1f}s")
+
+        return indexed_counter
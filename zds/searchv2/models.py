@@ -1,9 +1,15 @@
+from datetime import datetime
 from functools import partial
+from queue import Queue
+import hashlib
+import json
 import logging
+import threading
 import time
 
 from django.apps import apps
-from django.db import models
+from django.core.cache import cache
+from django.db import connection as db_connection, models
 from django.conf import settings
 
 from elasticsearch.helpers import parallel_bulk
@@ -11,15 +17,44 @@ from elasticsearch import ConnectionError
 from elasticsearch_dsl import Mapping
 from elasticsearch_dsl.query import MatchAll
 from elasticsearch_dsl.connections import connections
+from elasticsearch_dsl.response import Response
 
 from django.db import transaction
 
+from zds.utils.cache import SEARCH_RESULTS, bump_cache_version, get_cache_version
+
 
 def es_document_mapper(force_reindexing, index, obj):
     action = "update" if obj.es_already_indexed and not force_reindexing else "index"
     return obj.get_es_document_as_bulk_action(index, action)
 
 
+class IndexingThroughput:
+    """Count the documents indexed so far and compute the indexing throughput.
+
+    :param report: called with the number of documents indexed so far and the number of documents per second
+        each time a batch is indexed
+    :type report: callable
+    """
+
+    def __init__(self, report=None):
+        self.report = report
+        self.indexed = 0
+        self.start = time.monotonic()
+        self.lock = threading.Lock()
+
+    @property
+    def per_second(self):
+        elapsed = time.monotonic() - self.start
+        return round(self.indexed / elapsed, 2) if elapsed else float(self.indexed)
+
+    def add(self, count):
+        with self.lock:
+            self.indexed += count
+            if self.report:
+                self.report(self.indexed, self.per_second)
+
+
 class AbstractESIndexable:
     """Mixin for indexable objects.
 
@@ -85,6 +120,22 @@ class AbstractESIndexable:
 
         return []
 
+    @classmethod
+    def prepare_es_batch(cls, objects, force_reindexing=False):
+        """Prepare a batch of objects returned by ``get_es_indexable()`` before their documents are built.
+        It is called by the threads building the documents, so this is where slow loadings (such as reading files)
+        should be done.
+
+        :param objects: the objects to index
+        :type objects: list
+        :param force_reindexing: whether all the objects are indexed again
+        :type force_reindexing: bool
+        :return: the batches to index, since some documents may be added
+        :rtype: list
+        """
+
+        return [objects]
+
     def get_es_document_source(self, excluded_fields=None):
         """Create a document from the variable of the class, based on the mapping.
 
@@ -215,11 +266,50 @@ class AbstractESDjangoIndexable(AbstractESIndexable, models.Model):
             Flagging can be prevented using ``save(es_flagged=False)``.
         """
 
+        # an object already flagged is not indexed yet, so its flagging date, or an older one, is already stored
+        already_flagged = self.es_flagged and not self._state.adding
         self.es_flagged = kwargs.pop("es_flagged", True)
+        if self.es_flagged and not already_flagged and settings.ES_ENABLED:
+            remember_flagging_date()
 
         return super().save(*args, **kwargs)
 
 
+_index_managers = {}
+_index_managers_lock = threading.Lock()
+
+
+def get_es_index_manager():
+    """Get the manager of the index defined by ``settings.ES_SEARCH_INDEX``, shared by the whole process.
+
+    Creating a manager costs two requests to ES (to check the connection and whether the index exists), so they are
+    only made when the manager is created and then when its state is older than ``settings.ES_STATE_CHECK_INTERVAL``
+    seconds, or has been invalidated by a change of the index.
+
+    :rtype: ESIndexManager
+    """
+
+    key = (settings.ES_ENABLED, tuple(sorted(settings.ES_SEARCH_INDEX.items())))
+    with _index_managers_lock:
+        index_manager = _index_managers.get(key)
+        if index_manager is None:
+            index_manager = ESIndexManager(**settings.ES_SEARCH_INDEX)
+            _index_managers[key] = index_manager
+            return index_manager
+
+    # outside of the lock, so that the other threads do not wait for the requests to ES
+    index_manager.check_state_if_outdated(settings.ES_STATE_CHECK_INTERVAL)
+    return index_manager
+
+
+def invalidate_es_index_managers():
+    """Invalidate the state of the shared managers, see ``get_es_index_manager()``."""
+
+    with _index_managers_lock:
+        for index_manager in _index_managers.values():
+            index_manager.invalidate_state()
+
+
 def delete_document_in_elasticsearch(instance):
     """Delete a ESDjangoIndexable from ES database.
     Must be implemented by all classes that derive from AbstractESDjangoIndexable.
@@ -228,7 +318,7 @@ def delete_document_in_elasticsearch(instance):
     :type instance: AbstractESIndexable
     """
 
-    index_manager = ESIndexManager(**settings.ES_SEARCH_INDEX)
+    index_manager = get_es_index_manager()
 
     if index_manager.index_exists:
         index_manager.delete_document(instance)
@@ -240,6 +330,145 @@ def get_django_indexable_objects():
     return [model for model in apps.get_models() if issubclass(model, AbstractESDjangoIndexable)]
 
 
+INDEXING_LAG_KEY = "es-indexing-lag"
+FLAGGING_DATE_KEY = "es-flagging-date"
+# seconds, the flagging date is forgotten after this delay if no indexing measures the lag from it
+FLAGGING_DATE_TIMEOUT = 24 * 60 * 60
+
+
+def remember_flagging_date(flagging_date=None):
+    """Store the date at which an object is flagged, unless an older flagged object is not indexed yet, so that
+    the lag of the indexing is measured from the oldest flagged object, see ``pop_flagging_date()``.
+
+    :param flagging_date: a date given by ``pop_flagging_date()``, to put back when the indexing failed. It is older
+        than any other, so it replaces the stored one.
+    :type flagging_date: datetime
+    """
+
+    if flagging_date is None:
+        cache.add(FLAGGING_DATE_KEY, datetime.now(), timeout=FLAGGING_DATE_TIMEOUT)
+    else:
+        cache.set(FLAGGING_DATE_KEY, flagging_date, timeout=FLAGGING_DATE_TIMEOUT)
+
+
+def pop_flagging_date():
+    """
+    :return: the date at which the oldest object not indexed yet was flagged, if known, else ``None``. The objects
+        flagged from now on are measured from their own date.
+    :rtype: datetime
+    """
+
+    flagging_date = cache.get(FLAGGING_DATE_KEY)
+    cache.delete(FLAGGING_DATE_KEY)
+    return flagging_date
+
+
+def set_indexing_lag(lag, indexed_counter):
+    """Store the lag of the last indexing of flagged objects, see ``get_indexing_lag()``.
+
+    :param lag: time, in seconds, between the flagging of the oldest object and the end of their indexing
+    :type lag: float
+    :param indexed_counter: number of documents indexed
+    :type indexed_counter: int
+    """
+
+    cache.set(INDEXING_LAG_KEY, {"lag": lag, "indexed": indexed_counter, "date": datetime.now()}, timeout=None)
+
+
+def get_indexing_lag():
+    """
+    :return: the lag (in seconds) and the number of documents of the last indexing of flagged objects,
+        and the date of this indexing, or ``None`` if no indexing happened yet.
+    :rtype: dict
+    """
+
+    return cache.get(INDEXING_LAG_KEY)
+
+
+def normalize_search_query(query):
+    """Normalize a search query, so that queries differing only by the case or the spaces share their cached
+    results. It does not change the hits, since the analyzer of the index is case insensitive.
+
+    :param query: the query typed by the user
+    :type query: str
+    :rtype: str
+    """
+
+    return " ".join(query.lower().split())
+
+
+SEARCH_CACHE_PREFIX = "es-search-"
+
+
+def invalidate_search_cache():
+    """Make all the cached search results outdated, since the content of the index changed."""
+
+    bump_cache_version(SEARCH_RESULTS)
+
+
+class CachedSearchResults:
+    """Wrap a search so that its number of hits and its slices are stored in the cache for a short time.
+
+    The cache key is built from the whole search request (thus from the query, the filters on the
+    models, categories and authorized forums, and the slice) and the version given by
+    ``get_cache_version(SEARCH_RESULTS)``, so the results are outdated as soon as the index is refreshed.
+    It can be given as ``object_list`` to a paginator.
+    """
+
+    def __init__(self, search, timeout=None):
+        """
+        :param search: the search request, already set up with ``ESIndexManager.setup_search()``
+        :type search: elasticsearch_dsl.Search
+        :param timeout: lifetime of the cached results, in seconds, ``settings.ZDS_APP["search"]["cache_timeout"]``
+            by default
+        :type timeout: int
+        """
+
+        self.search = search
+        self.timeout = settings.ZDS_APP["search"]["cache_timeout"] if timeout is None else timeout
+        self.version = get_cache_version(SEARCH_RESULTS)
+        self._count = None
+
+    def get_cache_key(self, search, kind):
+        request = json.dumps([self.version, kind, search.to_dict()], sort_keys=True, default=str)
+        return SEARCH_CACHE_PREFIX + hashlib.sha256(request.encode()).hexdigest()
+
+    def count(self):
+        """
+        :return: the number of hits of the search
+        :rtype: int
+        """
+
+        if self._count is None:
+            key = self.get_cache_key(self.search, "count")
+            self._count = cache.get(key)
+            if self._count is None:
+                self._count = self.search.count()
+                cache.set(key, self._count, timeout=self.timeout)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        """Execute the search for a slice of the hits (or a single hit), or get them from the cache.
+
+        :rtype: list
+        """
+
+        search = self.search[item]
+        key = self.get_cache_key(search, "hits")
+        response = cache.get(key)
+        if response is None:
+            response = search.execute().to_dict()
+            cache.set(key, response, timeout=self.timeout)
+
+        hits = list(Response(search, response).hits)
+        if isinstance(item, slice):
+            return hits
+        return hits[0]
+
+
 class NeedIndex(Exception):
     """Raised when an action requires an index, but it is not created (yet)."""
 
@@ -264,6 +493,10 @@ class ESIndexManager:
 
         self.index = name
         self.index_exists = False
+        # alias of the index being built by ``create_versioned_index()``, which also receives the changes
+        self.next_index = f"{name}-next"
+        # indices behind ``self.next_index``, kept with the state, see ``check_state()``
+        self.next_indices = []
 
         self.number_of_shards = shards
         self.number_of_replicas = replicas
@@ -272,22 +505,87 @@ class ESIndexManager:
 
         self.es = None
         self.connected_to_es = False
+        self.state_checked_at = None
 
         if settings.ES_ENABLED:
             self.es = connections.get_connection(alias=connection_alias)
-            self.connected_to_es = True
+            self.check_state()
 
-            # test connection:
-            try:
-                self.es.info()
-            except ConnectionError:
-                self.connected_to_es = False
-                self.logger.warn("failed to connect to ES cluster")
-            else:
-                self.logger.info("connected to ES cluster")
+    def check_state(self):
+        """Test the connection to the ES cluster and whether the index exists.
+
+        The new state is only assigned once known, since the manager may be used by other threads meanwhile.
+        """
+
+        checked_at = time.monotonic()
+        connected_to_es = True
+        index_exists = False
+        next_indices = []
+
+        try:
+            self.es.info()
+        except ConnectionError:
+            connected_to_es = False
+            self.logger.warn("failed to connect to ES cluster")
+        else:
+            self.logger.info("connected to ES cluster")
+
+        if connected_to_es:
+            index_exists = self.es.indices.exists(self.index)
+            if self.es.indices.exists_alias(name=self.next_index):
+                next_indices = list(self.es.indices.get_alias(name=self.next_index))
+
+        self.connected_to_es = connected_to_es
+        self.index_exists = index_exists
+        self.next_indices = next_indices
+        self.state_checked_at = checked_at
+
+    def check_state_if_outdated(self, max_age):
+        """Call ``check_state()`` if the state was checked more than ``max_age`` seconds ago or was invalidated.
+
+        :param max_age: in seconds
+        :type max_age: float
+        """
+
+        if self.es is None:
+            return
+
+        if self.state_checked_at is None or time.monotonic() - self.state_checked_at > max_age:
+            # meanwhile, the other threads keep using the current state instead of checking it too
+            self.state_checked_at = time.monotonic()
+            self.check_state()
+
+    def invalidate_state(self):
+        """Force the next ``check_state_if_outdated()`` to check the state."""
+
+        self.state_checked_at = None
+
+    def get_indices(self):
+        """Get the indices behind ``self.index``, which is an alias of the index currently in use.
+        Indices created before the use of aliases were directly named ``self.index``.
+
+        :return: the names of the indices
+        :rtype: list
+        """
+
+        if self.es.indices.exists_alias(name=self.index):
+            return list(self.es.indices.get_alias(name=self.index).keys())
+        if self.es.indices.exists(self.index):
+            return [self.index]
+        return []
+
+    def get_write_indices(self):
+        """Get the indices in which changes are written: ``self.index`` and, while a new index is being built by
+        ``index_all``, this new index too.
+
+        The new index is known from the state of the manager, without a request to ES: the managers of the other
+        processes see it once their state is checked again, after ``settings.ES_STATE_CHECK_INTERVAL`` seconds.
+
+        :return: the names of the indices (or aliases)
+        :rtype: list
+        """
 
-            if self.connected_to_es:
-                self.index_exists = self.es.indices.exists(self.index)
+        return [self.index] + [index for index in self.next_indices if index != self.index]
 
     def clear_es_index(self):
         """Clear index"""
@@ -295,28 +593,32 @@ class ESIndexManager:
         if not self.connected_to_es:
             return
 
-        if self.es.indices.exists(self.index):
-            self.es.indices.delete(self.index)
+        indices = self.get_indices()
+        for index in indices:
+            self.es.indices.delete(index)
+
+        if indices:
             self.logger.info("index cleared")
 
             self.index_exists = False
+            invalidate_es_index_managers()
+            invalidate_search_cache()
 
-    def reset_es_index(self, models):
-        """Delete old index and create an new one (with the same name). Setup the number of shards and replicas.
-        Then, set mappings for the different models.
+    def create_versioned_index(self, models):
+        """Create a new index, named after ``self.index`` and the current time, with the number of shards and replicas,
+        the mappings of the different models and our custom analyzer.
+        The index is not used for searching until ``switch_alias()`` is called.
 
         :param models: list of models
         :type models: list
-        :param number_shards: number of shards
-        :type number_shards: int
-        :param number_replicas: number of replicas
-        :type number_replicas: int
+        :return: the name of the new index
+        :rtype: str
         """
 
         if not self.connected_to_es:
             return
 
-        self.clear_es_index()
+        index = "{}-v{}".format(self.index, datetime.now().strftime("%Y%m%d%H%M%S%f"))
 
         mappings_def = {}
 
@@ -325,18 +627,76 @@ class ESIndexManager:
             mappings_def.update(mapping.to_dict())
 
         self.es.indices.create(
-            self.index,
+            index,
             body={
                 "settings": {"number_of_shards": self.number_of_shards, "number_of_replicas": self.number_of_replicas},
                 "mappings": mappings_def,
             },
         )
+        self.setup_custom_analyzer(index)
+
+        # from now on, the changes made while the index is built are also written into it (see ``get_write_indices()``),
+        # otherwise they would be lost when it replaces the current one
+        actions = [{"add": {"index": index, "alias": self.next_index}}]
+        if self.es.indices.exists_alias(name=self.next_index):
+            actions = [{"remove": {"index": "*", "alias": self.next_index}}] + actions
+        self.es.indices.update_aliases(body={"actions": actions})
+        self.next_indices = [index]
+        invalidate_es_index_managers()
+
+        self.logger.info(f"index {index} created")
+
+        return index
+
+    def switch_alias(self, index):
+        """Atomically make ``self.index`` an alias of ``index`` only, then delete the indices previously used and
+        the ones left by interrupted reindexing.
+
+        :param index: the name of the new index
+        :type index: str
+        """
+
+        if not self.connected_to_es:
+            return
+
+        # an index created before the use of aliases has the name of the alias, so it has to go first
+        if self.es.indices.exists(self.index) and not self.es.indices.exists_alias(name=self.index):
+            self.es.indices.delete(self.index)
+
+        actions = [{"add": {"index": index, "alias": self.index}}]
+        if self.es.indices.exists_alias(name=self.index):
+            actions = [{"remove": {"index": "*", "alias": self.index}}] + actions
+        if self.es.indices.exists_alias(name=self.next_index):
+            actions.append({"remove": {"index": "*", "alias": self.next_index}})
+        self.es.indices.update_aliases(body={"actions": actions})
 
         self.index_exists = True
+        self.next_indices = []
+        invalidate_es_index_managers()
+        invalidate_search_cache()
+
+        self.logger.info(f"{self.index} now points to {index}")
 
-        self.logger.info("index created")
+        for old_index in self.es.indices.get(f"{self.index}-v*"):
+            if old_index != index:
+                self.es.indices.delete(old_index)
+                self.logger.info(f"index {old_index} deleted")
 
-    def setup_custom_analyzer(self):
+    def reset_es_index(self, models):
+        """Delete old index and create an new one, with the mappings of the different models and our custom analyzer,
+        which is immediately used for searching.
+
+        :param models: list of models
+        :type models: list
+        """
+
+        if not self.connected_to_es:
+            return
+
+        self.clear_es_index()
+        self.switch_alias(self.create_versioned_index(models))
+
+    def setup_custom_analyzer(self, index=None):
         """Override the default analyzer.
 
         See https://www.elastic.co/guide/en/elasticsearch/reference/current/analysis.html.
@@ -353,15 +713,20 @@ class ESIndexManager:
         .. warning::
 
             You need to run ``manage.py es_manager index_all`` if you modified this !!
+
+        :param index: the index to setup, ``self.index`` by default
+        :type index: str
         """
 
         if not self.connected_to_es:
             return
 
-        if not self.index_exists:
-            raise NeedIndex()
+        if index is None:
+            if not self.index_exists:
+                raise NeedIndex()
+            index = self.index
 
-        self.es.indices.close(self.index)
+        self.es.indices.close(index)
 
         document = {
             "analysis": {
@@ -418,8 +783,8 @@ class ESIndexManager:
             }
         }
 
-        self.es.indices.put_settings(index=self.index, body=document)
-        self.es.indices.open(self.index)
+        self.es.indices.put_settings(index=index, body=document)
+        self.es.indices.open(index)
 
         self.logger.info("setup analyzer")
 
@@ -442,9 +807,12 @@ class ESIndexManager:
 
         self.logger.info(f"unindex {model.get_es_document_type()}")
 
-    def es_bulk_indexing_of_model(self, model, force_reindexing=False):
+    def es_bulk_indexing_of_model(self, model, force_reindexing=False, workers=1, report=None, index=None):
         """Perform a bulk action on documents of a given model. Use the ``objects_per_batch`` property to index.
 
+        With more than one worker, fetching objects, building documents and sending them are done at the same time,
+        see ``_run_indexing_pipeline()``.
+
         See http://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.bulk
         and http://elasticsearch-py.readthedocs.io/en/master/helpers.html#elasticsearch.helpers.parallel_bulk
 
@@ -456,114 +824,172 @@ class ESIndexManager:
         :type model: class
         :param force_reindexing: force all document to be returned
         :type force_reindexing: bool
+        :param workers: number of threads building the documents
+        :type workers: int
+        :param report: called with the number of documents indexed so far and the throughput, see
+            ``IndexingThroughput``
+        :type report: callable
+        :param index: the index in which documents are indexed, ``self.index`` (and the index being built, if any, see
+            ``get_write_indices()``) by default
+        :type index: str
         :return: the number of documents indexed
         :rtype: int
         """
 
         if not self.connected_to_es:
-            return
+            return 0
 
-        if not self.index_exists:
-            raise NeedIndex()
+        other_indices = []
+        if index is None:
+            if not self.index_exists:
+                raise NeedIndex()
+            index, *other_indices = self.get_write_indices()
 
         # better safe than sorry
         if model.__name__ == "FakeChapter":
             self.logger.warn("Cannot index FakeChapter model. Please index its parent model.")
             return 0
 
-        documents_formatter = partial(es_document_mapper, force_reindexing, self.index)
+        documents_formatter = partial(es_document_mapper, force_reindexing, index)
         objects_per_batch = getattr(model, "objects_per_batch", 100)
-        indexed_counter = 0
-        if model.__name__ == "PublishedContent":
-            generate = model.get_es_indexable(force_reindexing)
-            while True:
-                with transaction.atomic():
-                    try:
-                        # fetch a batch
-                        objects = next(generate)
-                    except StopIteration:
-                        break
-                    if not objects:
-                        break
-                    if hasattr(objects[0], "parent_model"):
-                        model_to_update = objects[0].parent_model
-                        pks = [o.parent_id for o in objects]
-                    else:
-                        model_to_update = model
-                        pks = [o.pk for o in objects]
-
-                    formatted_documents = list(map(documents_formatter, objects))
-
-                    for _, hit in parallel_bulk(
-                        self.es, formatted_documents, chunk_size=objects_per_batch, request_timeout=30
-                    ):
-                        action = list(hit.keys())[0]
-                        self.logger.info("{} {} with id {}".format(action, hit[action]["_type"], hit[action]["_id"]))
-
-                    # mark all these objects as indexed at once
-                    model_to_update.objects.filter(pk__in=pks).update(es_already_indexed=True, es_flagged=False)
-                    indexed_counter += len(objects)
-            return indexed_counter
+        batches = self._get_batches_of_model(model, force_reindexing, objects_per_batch)
+        throughput = IndexingThroughput(report)
+
+        if workers <= 1:
+            for fetched_objects in batches:
+                for objects in model.prepare_es_batch(fetched_objects, force_reindexing):
+                    with transaction.atomic():
+                        model_to_update, pks = self._get_model_and_pks_to_update(model, objects)
+                        self._send_documents(list(map(documents_formatter, objects)), objects_per_batch, other_indices)
+                        # mark all these objects as indexed at once
+                        model_to_update.objects.filter(pk__in=pks).update(es_already_indexed=True, es_flagged=False)
+                    throughput.add(len(objects))
         else:
-            then = time.time()
-            prev_obj_per_sec = False
-            last_pk = 0
-            object_source = model.get_es_indexable(force_reindexing)
-
-            while True:
-                with transaction.atomic():
-                    # fetch a batch
-                    objects = list(object_source.filter(pk__gt=last_pk)[:objects_per_batch])
-                    if not objects:
-                        break
+            prepare = partial(model.prepare_es_batch, force_reindexing=force_reindexing)
+            self._run_indexing_pipeline(
+                model, batches, prepare, documents_formatter, objects_per_batch, workers, throughput, other_indices
+            )
+
+        return throughput.indexed
+
+    @staticmethod
+    def _get_batches_of_model(model, force_reindexing, objects_per_batch):
+        """Yield the objects to index, batch by batch.
+
+        :rtype: collections.Iterable[list]
+        """
+
+        last_pk = 0
+        object_source = model.get_es_indexable(force_reindexing)
+        while True:
+            objects = list(object_source.filter(pk__gt=last_pk)[:objects_per_batch])
+            if not objects:
+                return
+            yield objects
+            last_pk = objects[-1].pk
+
+    @staticmethod
+    def _get_model_and_pks_to_update(model, objects):
+        """Chapters are not stored in database, so their content is the object flagged as indexed."""
+
+        if hasattr(objects[0], "parent_model"):
+            return objects[0].parent_model, [o.parent_id for o in objects]
+        return model, [o.pk for o in objects]
+
+    def _send_documents(self, formatted_documents, objects_per_batch, other_indices=()):
+        """Send the documents to ES, and a copy of them to ``other_indices``. The copies are fully indexed rather
+        than updated, since they may not be in these indices yet."""
+
+        copies = []
+        for other_index in other_indices:
+            for document in formatted_documents:
+                # keep the other metadata, such as the parent of the chapters
+                copy = {key: value for key, value in document.items() if key != "doc"}
+                copy.update(_op_type="index", _index=other_index, _source=document.get("_source", document.get("doc")))
+                copies.append(copy)
+
+        for _, hit in parallel_bulk(
+            self.es, formatted_documents + copies, chunk_size=objects_per_batch, request_timeout=30
+        ):
+            if self.logger.getEffectiveLevel() <= logging.INFO:
+                action = list(hit.keys())[0]
+                self.logger.info("{} {} with id {}".format(action, hit[action]["_type"], hit[action]["_id"]))
+
+    def _run_indexing_pipeline(
+        self, model, batches, prepare, documents_formatter, objects_per_batch, workers, throughput, other_indices=()
+    ):
+        """Index the batches with three stages running at the same time: the current thread fetches the batches from
+        the database, ``workers`` threads prepare them (see ``prepare_es_batch()``, which may read contents from disk)
+        and build the documents, and another thread sends them to ES and flags the objects as indexed.
+
+        Stages communicate through bounded queues, so that fetching does not get too far ahead of sending.
+        If a stage fails, the remaining batches are dropped and the first error is raised once all threads stopped.
+        """
+
+        build_queue = Queue(maxsize=2 * workers)
+        send_queue = Queue(maxsize=2 * workers)
+        errors = []
 
-                    formatted_documents = list(map(documents_formatter, objects))
-
-                    for _, hit in parallel_bulk(
-                        self.es, formatted_documents, chunk_size=objects_per_batch, request_timeout=30
-                    ):
-                        if self.logger.getEffectiveLevel() <= logging.INFO:
-                            action = list(hit.keys())[0]
-                            self.logger.info(
-                                "{} {} with id {}".format(action, hit[action]["_type"], hit[action]["_id"])
-                            )
-
-                    # mark all these objects as indexed at once
-                    model.objects.filter(pk__in=[o.pk for o in objects]).update(
-                        es_already_indexed=True, es_flagged=False
-                    )
-                    indexed_counter += len(objects)
-
-                    # basic estimation of indexed objects per second
-                    now = time.time()
-                    last_batch_duration = int(now - then) or 1
-                    then = now
-                    obj_per_sec = round(float(objects_per_batch) / last_batch_duration, 2)
-                    if force_reindexing:
-                        print(
-                            "    {} so far ({} obj/s, batch size: {})".format(
-                                indexed_counter, obj_per_sec, objects_per_batch
-                            )
-                        )
-
-                    if prev_obj_per_sec is False:
-                        prev_obj_per_sec = obj_per_sec
-                    else:
-                        ratio = obj_per_sec / prev_obj_per_sec
-                        # if we processed this batch 10% slower/faster than the previous one,
-                        # shrink/increase batch size
-                        if abs(1 - ratio) > 0.1:
-                            objects_per_batch = int(objects_per_batch * ratio)
-                            if force_reindexing:
-                                print(f"     {round(ratio, 2)}x, new batch size: {objects_per_batch}")
-                        prev_obj_per_sec = obj_per_sec
-
-                    # fetch next batch
-                    last_pk = objects[-1].pk
-
-            return indexed_counter
-
-    def refresh_index(self):
+        def build():
+            try:
+                while True:
+                    objects = build_queue.get()
+                    if objects is None:
+                        break
+                    if errors:
+                        continue
+                    try:
+                        for prepared_objects in prepare(objects):
+                            model_to_update, pks = self._get_model_and_pks_to_update(model, prepared_objects)
+                            send_queue.put((model_to_update, pks, list(map(documents_formatter, prepared_objects))))
+                    except Exception as e:
+                        errors.append(e)
+            finally:
+                db_connection.close()
+                send_queue.put(None)
+
+        def send():
+            running_builders = workers
+            try:
+                while running_builders:
+                    item = send_queue.get()
+                    if item is None:
+                        running_builders -= 1
+                        continue
+                    if errors:
+                        continue
+                    model_to_update, pks, formatted_documents = item
+                    try:
+                        self._send_documents(formatted_documents, objects_per_batch, other_indices)
+                        model_to_update.objects.filter(pk__in=pks).update(es_already_indexed=True, es_flagged=False)
+                        throughput.add(len(formatted_documents))
+                    except Exception as e:
+                        errors.append(e)
+            finally:
+                db_connection.close()
+
+        threads = [threading.Thread(target=build, name=f"es-build-{i}") for i in range(workers)]
+        threads.append(threading.Thread(target=send, name="es-send"))
+        for thread in threads:
+            thread.start()
+
+        try:
+            for objects in batches:
+                if errors:
+                    break
+                build_queue.put(objects)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            for _ in range(workers):
+                build_queue.put(None)
+            for thread in threads:
+                thread.join()
+
+        if errors:
+            raise errors[0]
+
+    def refresh_index(self, index=None):
         """Force the refreshing the index. The task is normally done periodically, but may be forced with this method.
 
         See https://www.elastic.co/guide/en/elasticsearch/reference/current/indices-refresh.html.
@@ -571,15 +997,22 @@ class ESIndexManager:
         .. note::
 
             The use of this function is mandatory if you want to use the search right after an indexing.
+            It also makes the cached search results outdated (see ``CachedSearchResults``).
+
+        :param index: the index to refresh, ``self.index`` by default
+        :type index: str
         """
 
         if not self.connected_to_es:
             return
 
-        if not self.index_exists:
-            raise NeedIndex()
+        if index is None:
+            if not self.index_exists:
+                raise NeedIndex()
+            index = self.index
 
-        self.es.indices.refresh(self.index)
+        self.es.indices.refresh(index)
+        invalidate_search_cache()
 
     def update_single_document(self, document, doc):
         """Update given fields of a single document.
@@ -598,10 +1031,11 @@ class ESIndexManager:
         if not self.index_exists:
             raise NeedIndex()
 
-        arguments = {"index": self.index, "doc_type": document.get_es_document_type(), "id": document.es_id}
-        if self.es.exists(**arguments):
-            self.es.update(body={"doc": doc}, **arguments)
-            self.logger.info(f"partial_update {document.get_es_document_type()} with id {document.es_id}")
+        for index in self.get_write_indices():
+            arguments = {"index": index, "doc_type": document.get_es_document_type(), "id": document.es_id}
+            if self.es.exists(**arguments):
+                self.es.update(body={"doc": doc}, **arguments)
+                self.logger.info(f"partial_update {document.get_es_document_type()} with id {document.es_id}")
 
     def delete_document(self, document):
         """Delete a given document, based on its ``es_id``
@@ -616,10 +1050,11 @@ class ESIndexManager:
         if not self.index_exists:
             raise NeedIndex()
 
-        arguments = {"index": self.index, "doc_type": document.get_es_document_type(), "id": document.es_id}
-        if self.es.exists(**arguments):
-            self.es.delete(**arguments)
-            self.logger.info(f"delete {document.get_es_document_type()} with id {document.es_id}")
+        for index in self.get_write_indices():
+            arguments = {"index": index, "doc_type": document.get_es_document_type(), "id": document.es_id}
+            if self.es.exists(**arguments):
+                self.es.delete(**arguments)
+                self.logger.info(f"delete {document.get_es_document_type()} with id {document.es_id}")
 
     def delete_by_query(self, doc_type="", query=MatchAll()):
         """Perform a deletion trough the ``_delete_by_query`` API.
@@ -641,9 +1076,9 @@ class ESIndexManager:
         if not self.index_exists:
             raise NeedIndex()
 
-        response = self.es.delete_by_query(index=self.index, doc_type=doc_type, body={"query": query})
-
-        self.logger.info("delete_by_query {}s ({})".format(doc_type, response["deleted"]))
+        for index in self.get_write_indices():
+            response = self.es.delete_by_query(index=index, doc_type=doc_type, body={"query": query})
+            self.logger.info("delete_by_query {}s ({})".format(doc_type, response["deleted"]))
 
     def analyze_sentence(self, request):
         """Use the anlyzer on a given sentence. Get back the list of tokens.
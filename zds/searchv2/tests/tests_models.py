@@ -1,13 +1,26 @@
+import threading
+from unittest.mock import MagicMock, patch
+
 from elasticsearch_dsl import Search
 from elasticsearch_dsl.query import MatchAll
+from elasticsearch_dsl.response import Response
 
 from django.conf import settings
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 
 from zds.forum.tests.factories import TopicFactory, PostFactory, Topic, Post
 from zds.forum.tests.factories import create_category_and_forum
 from zds.member.tests.factories import ProfileFactory, StaffProfileFactory
-from zds.searchv2.models import ESIndexManager
+from zds.searchv2.models import (
+    CachedSearchResults,
+    ESIndexManager,
+    IndexingThroughput,
+    _index_managers_lock,
+    get_es_index_manager,
+    invalidate_search_cache,
+    normalize_search_query,
+)
 from zds.tutorialv2.tests.factories import PublishableContentFactory, ContainerFactory, ExtractFactory, publish_content
 from zds.tutorialv2.models.database import PublishedContent, FakeChapter, PublishableContent
 from zds.tutorialv2.tests import TutorialTestMixin, override_for_contents
@@ -52,36 +65,47 @@ class ESIndexManagerTests(TutorialTestMixin, TestCase):
         # 1. Creation:
         models = [Topic, Post]
         manager.reset_es_index([Topic, Post])
-        self.assertTrue(manager.index in manager.es.cat.indices())  # index in !
+        self.assertTrue(manager.index_exists)
+        indices = manager.get_indices()  # the index is an alias of a versioned index
+        self.assertEqual(len(indices), 1)
+        index = indices[0]
+        self.assertTrue(index.startswith(manager.index + "-v"))
+        self.assertTrue(index in manager.es.cat.indices())  # index in !
 
         index_settings = manager.es.indices.get_settings(index=manager.index)
-        self.assertTrue(manager.index in index_settings)
-        index_settings = index_settings[manager.index]["settings"]["index"]
+        self.assertTrue(index in index_settings)
+        index_settings = index_settings[index]["settings"]["index"]
 
-        self.assertEqual(index_settings["provided_name"], manager.index)
+        self.assertEqual(index_settings["provided_name"], index)
         self.assertEqual(index_settings["number_of_shards"], str(manager.number_of_shards))
         self.assertEqual(index_settings["number_of_replicas"], str(manager.number_of_replicas))
 
         # test mappings
         mappings = manager.es.indices.get_mapping(index=manager.index)
-        self.assertTrue(manager.index in mappings)
-        mappings = mappings[manager.index]["mappings"]
+        self.assertTrue(index in mappings)
+        mappings = mappings[index]["mappings"]
 
         for model in models:
             self.assertTrue(model.get_es_document_type() in mappings)
 
         # analyzer
-        self.assertTrue("analysis" not in index_settings)
-        manager.setup_custom_analyzer()
-
-        index_settings = manager.es.indices.get_settings(index=manager.index)
-        self.assertTrue(manager.index in index_settings)
-        index_settings = index_settings[manager.index]["settings"]["index"]
         self.assertTrue("analysis" in index_settings)
 
+        # 2. Switching to a new index
+        new_index = manager.create_versioned_index(models)
+        self.assertEqual(manager.get_indices(), [index])  # still searching in the previous one
+        self.assertEqual(manager.get_write_indices(), [manager.index, new_index])  # but changes go to both
+        manager.check_state()  # as done by the managers of the other processes
+        self.assertEqual(manager.get_write_indices(), [manager.index, new_index])
+        manager.switch_alias(new_index)
+        self.assertEqual(manager.get_indices(), [new_index])
+        self.assertEqual(manager.get_write_indices(), [manager.index])
+        self.assertFalse(manager.es.indices.exists(index))  # previous one was deleted
+
         # 3. Clearing
         manager.clear_es_index()
-        self.assertTrue(manager.index not in self.manager.es.cat.indices())  # back to the void
+        self.assertTrue(new_index not in self.manager.es.cat.indices())  # back to the void
+        self.assertEqual(manager.get_indices(), [])
 
     def test_custom_analyzer(self):
         """Test our custom analyzer"""
@@ -254,7 +278,21 @@ class ESIndexManagerTests(TutorialTestMixin, TestCase):
         for hit in results:
             self.assertTrue(hit.meta.doc_type != Post.get_es_document_type() or hit.meta.id != post.es_id)
 
-        # 6. Test full desindexation:
+        # 6. Test that the changes made while a new index is built are written into it too
+        new_index = self.manager.create_versioned_index(self.indexable)
+        kept_post = PostFactory(topic=new_topic, author=self.user, position=2)
+        deleted_post = PostFactory(topic=new_topic, author=self.user, position=3)
+        self.manager.es_bulk_indexing_of_model(Post, force_reindexing=False)
+        self.manager.delete_document(deleted_post)
+        self.manager.switch_alias(new_index)
+        self.manager.refresh_index()
+
+        s = Search()
+        s.query(MatchAll())
+        results = self.manager.setup_search(s).execute()
+        self.assertEqual([(hit.meta.doc_type, hit.meta.id) for hit in results], [("post", str(kept_post.pk))])
+
+        # 7. Test full desindexation:
         for model in self.indexable:
             if model is FakeChapter:
                 continue
@@ -364,3 +402,146 @@ class ESIndexManagerTests(TutorialTestMixin, TestCase):
 
         # delete index:
         self.manager.clear_es_index()
+
+
+@override_settings(ES_ENABLED=False)
+class IndexingPipelineTests(TestCase):
+    def setUp(self):
+        self.manager = ESIndexManager(name="zds_search_test")
+        self.model = MagicMock()
+        self.batches = [[MagicMock(pk=pk, spec=["pk"]) for pk in range(i * 10, (i + 1) * 10)] for i in range(20)]
+
+    def test_all_batches_are_sent(self):
+        reports = []
+        throughput = IndexingThroughput(lambda indexed, per_second: reports.append(indexed))
+        preparing_threads = set()
+
+        def prepare(objects):
+            # the batches are prepared by the threads building the documents, and may be split
+            preparing_threads.add(threading.current_thread().name)
+            return [objects[:5], objects[5:]]
+
+        with patch.object(ESIndexManager, "_send_documents") as send_documents:
+            self.manager._run_indexing_pipeline(
+                self.model, iter(self.batches), prepare, lambda obj: obj.pk, 10, workers=3, throughput=throughput
+            )
+
+        sent = sorted(pk for call in send_documents.call_args_list for pk in call.args[0])
+        self.assertEqual(sent, list(range(200)))
+        self.assertEqual(self.model.objects.filter.call_count, 40)
+        self.assertTrue(preparing_threads)
+        self.assertTrue(all(name.startswith("es-build-") for name in preparing_threads))
+        self.assertEqual(throughput.indexed, 200)
+        self.assertEqual(reports[-1], 200)
+
+    def test_errors_are_raised(self):
+        def formatter(obj):
+            if obj.pk == 42:
+                raise ValueError()
+            return obj.pk
+
+        with patch.object(ESIndexManager, "_send_documents"):
+            with self.assertRaises(ValueError):
+                self.manager._run_indexing_pipeline(
+                    self.model,
+                    iter(self.batches),
+                    lambda objects: [objects],
+                    formatter,
+                    10,
+                    workers=3,
+                    throughput=IndexingThroughput(),
+                )
+
+
+@override_settings(ES_ENABLED=False)
+class SharedIndexManagerTests(TestCase):
+    def test_manager_is_shared(self):
+        with override_settings(ES_SEARCH_INDEX={"name": "zds_search_test", "shards": 5, "replicas": 0}):
+            manager = get_es_index_manager()
+            self.assertIs(get_es_index_manager(), manager)
+
+        with override_settings(ES_SEARCH_INDEX={"name": "another_index", "shards": 5, "replicas": 0}):
+            self.assertIsNot(get_es_index_manager(), manager)
+            self.assertEqual(get_es_index_manager().index, "another_index")
+
+    @override_settings(
+        ES_STATE_CHECK_INTERVAL=60, ES_SEARCH_INDEX={"name": "zds_search_state_test", "shards": 5, "replicas": 0}
+    )
+    def test_state_is_checked_when_outdated(self):
+        manager = get_es_index_manager()
+        manager.es = MagicMock()  # as if ES was enabled
+        manager.check_state()
+        manager.es.reset_mock()
+
+        get_es_index_manager()
+        self.assertEqual(manager.es.info.call_count, 0)
+
+        manager.invalidate_state()
+        get_es_index_manager()
+        self.assertEqual(manager.es.info.call_count, 1)
+        self.assertTrue(manager.index_exists)
+
+        manager.state_checked_at -= 61
+        get_es_index_manager()
+        self.assertEqual(manager.es.info.call_count, 2)
+
+        # the state is checked outside of the lock, and the current one is kept until the new one is known
+        def info():
+            self.assertFalse(_index_managers_lock.locked())
+            self.assertTrue(manager.index_exists)
+
+        manager.es.info.side_effect = info
+        manager.es.indices.exists.return_value = False
+        manager.invalidate_state()
+        get_es_index_manager()
+        self.assertEqual(manager.es.info.call_count, 3)
+        self.assertFalse(manager.index_exists)
+
+
+@override_settings(ES_ENABLED=False, CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class CachedSearchResultsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.search = Search().query(MatchAll())
+
+    @staticmethod
+    def fake_execute(search):
+        hits = [{"_type": "topic", "_id": str(i), "_source": {"pk": i}} for i in range(search.to_dict()["from"], 3)]
+        return Response(search, {"hits": {"total": 3, "hits": hits[: search.to_dict()["size"]]}})
+
+    def test_results_are_cached(self):
+        with patch.object(Search, "execute", autospec=True, side_effect=self.fake_execute) as execute:
+            with patch.object(Search, "count", return_value=3) as count:
+                results = CachedSearchResults(self.search)
+                self.assertEqual(len(results), 3)
+                self.assertEqual([hit.pk for hit in results[0:2]], [0, 1])
+                self.assertEqual(results[2].pk, 2)
+
+                # same search, from another request:
+                results = CachedSearchResults(Search().query(MatchAll()))
+                self.assertEqual(results.count(), 3)
+                self.assertEqual([hit.pk for hit in results[0:2]], [0, 1])
+                self.assertEqual(results[0:2][0].meta.doc_type, "topic")
+                self.assertEqual(count.call_count, 1)
+                self.assertEqual(execute.call_count, 2)
+
+                # another page:
+                self.assertEqual([hit.pk for hit in results[1:3]], [1, 2])
+                self.assertEqual(execute.call_count, 3)
+
+    def test_refresh_invalidates_results(self):
+        with patch.object(Search, "execute", autospec=True, side_effect=self.fake_execute) as execute:
+            CachedSearchResults(self.search)[0:2]
+            invalidate_search_cache()
+            CachedSearchResults(self.search)[0:2]
+            self.assertEqual(execute.call_count, 2)
+
+            manager = ESIndexManager("zds_search_test", shards=5, replicas=0)
+            manager.es = MagicMock()  # as if ES was enabled
+            manager.connected_to_es = manager.index_exists = True
+            manager.refresh_index()
+            CachedSearchResults(self.search)[0:2]
+            self.assertEqual(execute.call_count, 3)
+
+    def test_normalize_search_query(self):
+        self.assertEqual(normalize_search_query("  Le  Langage\tC "), "le langage c")
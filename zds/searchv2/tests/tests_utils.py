@@ -11,7 +11,8 @@ from zds.tutorialv2.models.database import PublishedContent
 from zds.tutorialv2.publication_utils import publish_content
 from zds.forum.tests.factories import TopicFactory, PostFactory, Topic, Post
 from zds.forum.tests.factories import create_category_and_forum
-from zds.searchv2.models import ESIndexManager
+from zds.searchv2.management.commands import es_manager
+from zds.searchv2.models import ESIndexManager, get_indexing_lag, pop_flagging_date
 from zds.tutorialv2.tests import TutorialTestMixin, override_for_contents
 
 
@@ -148,11 +149,12 @@ class UtilsTests(TutorialTestMixin, TestCase):
         self.assertEqual(len(results), 0)  # ... but with nothing in it
 
         result = self.index_manager.es.indices.get_settings(index=self.index_manager.index)
-        settings_index = result[self.index_manager.index]["settings"]["index"]
+        settings_index = result[self.index_manager.get_indices()[0]]["settings"]["index"]
         self.assertTrue("analysis" in settings_index)  # custom analyzer was setup
 
         # 4. test "index-flagged" once ...
         call_command("es_manager", "index_flagged")
+        self.assertIsNone(pop_flagging_date())  # forgotten once the flagged objects are indexed
 
         topic = Topic.objects.get(pk=topic.pk)
         post = Post.objects.get(pk=post.pk)
@@ -171,6 +173,20 @@ class UtilsTests(TutorialTestMixin, TestCase):
         results = self.index_manager.setup_search(s).execute()
         self.assertEqual(len(results), 4)  # get the 4 results back
 
+        # 5. ... and what "watch" does on each check
+        new_post = PostFactory(topic=topic, author=self.user, position=2)
+        self.assertTrue(Post.objects.get(pk=new_post.pk).es_flagged)
+
+        command = es_manager.Command()
+        self.assertEqual(command.index_flagged_documents(), 2)  # the new post and its topic
+        self.assertFalse(Post.objects.get(pk=new_post.pk).es_flagged)
+        self.assertEqual(get_indexing_lag()["indexed"], 2)
+        # the lag is measured from the flagging of the objects, which is forgotten once they are indexed
+        self.assertGreater(get_indexing_lag()["lag"], 0)
+        self.assertIsNone(pop_flagging_date())
+
+        self.assertEqual(command.index_flagged_documents(), 0)  # nothing left
+
     def tearDown(self):
         super().tearDown()
 
@@ -1,6 +1,9 @@
 from zds import json_handler
 import datetime
+import time
+from unittest.mock import patch
 
+from elasticsearch import ConnectionError, NotFoundError
 from elasticsearch_dsl import Search
 from elasticsearch_dsl.query import MatchAll
 
@@ -13,7 +16,7 @@ from zds.forum.tests.factories import TopicFactory, PostFactory, Topic, Post, Ta
 from zds.forum.tests.factories import create_category_and_forum
 
 from zds.member.tests.factories import ProfileFactory, StaffProfileFactory
-from zds.searchv2.models import ESIndexManager
+from zds.searchv2.models import CachedSearchResults, ESIndexManager, get_es_index_manager
 from zds.tutorialv2.tests.factories import (
     PublishableContentFactory,
     ContainerFactory,
@@ -956,6 +959,30 @@ class ViewsTests(TutorialTestMixin, TestCase):
             [r.meta.id for r in response if r.meta.doc_type == "chapter"][0], tuto_2.slug + "__" + chapter_2.slug
         )
 
+    def test_search_when_es_becomes_unavailable(self):
+        manager = get_es_index_manager()
+        self.addCleanup(manager.check_state)
+
+        def es_was_available():
+            manager.connected_to_es = manager.index_exists = True
+            manager.state_checked_at = time.monotonic()
+
+        # ES went down since its state was checked
+        es_was_available()
+        with patch.object(CachedSearchResults, "count", side_effect=ConnectionError("N/A", "down", None)):
+            result = self.client.get(reverse("search:query") + "?q=test", follow=False)
+        self.assertEqual(result.status_code, 200)
+        self.assertIn("Impossible de se connecter à Elasticsearch", [str(m) for m in result.context["messages"]])
+        self.assertIsNone(manager.state_checked_at)  # the state will be checked again
+
+        # the index was removed by another process
+        es_was_available()
+        with patch.object(Search, "execute", side_effect=NotFoundError(404, "index_not_found_exception", None)):
+            result = self.client.get(reverse("search:suggestion") + "?q=test", follow=False)
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(json_handler.loads(result.content.decode("utf-8"))["results"], [])
+        self.assertIsNone(manager.state_checked_at)
+
     def tearDown(self):
         super().tearDown()
 
@@ -1,6 +1,7 @@
 from zds import json_handler
 import operator
 
+from elasticsearch import ConnectionError, NotFoundError
 from elasticsearch_dsl import Search
 from elasticsearch_dsl.query import Match, MultiMatch, FunctionScore, Term, Terms, Range
 
@@ -15,11 +16,20 @@ from django.views.generic import CreateView
 from django.views.generic.detail import SingleObjectMixin
 
 from zds.searchv2.forms import SearchForm
-from zds.searchv2.models import ESIndexManager
+from zds.searchv2.models import (
+    CachedSearchResults,
+    get_es_index_manager,
+    invalidate_es_index_managers,
+    normalize_search_query,
+)
 from zds.utils.paginator import ZdSPagingListView
 from zds.utils.templatetags.authorized_forums import get_authorized_forums
 from functools import reduce
 
+# raised when ES went down, or when the index was removed (by ``es_manager``, for instance), since the state of the
+# index manager was checked
+ES_UNAVAILABLE_ERRORS = (ConnectionError, NotFoundError)
+
 
 class SimilarTopicsView(CreateView, SingleObjectMixin):
     search_query = None
@@ -30,14 +40,14 @@ class SimilarTopicsView(CreateView, SingleObjectMixin):
         """Overridden because the index manager must NOT be initialized elsewhere."""
 
         super().__init__(**kwargs)
-        self.index_manager = ESIndexManager(**settings.ES_SEARCH_INDEX)
+        self.index_manager = get_es_index_manager()
 
     def get(self, request, *args, **kwargs):
         if "q" in request.GET:
-            self.search_query = "".join(request.GET["q"])
+            self.search_query = normalize_search_query("".join(request.GET["q"]))
 
         results = []
-        if self.index_manager.connected_to_es and self.search_query:
+        if self.index_manager.connected_to_es and self.index_manager.index_exists and self.search_query:
             self.authorized_forums = get_authorized_forums(self.request.user)
 
             search_queryset = Search()
@@ -54,10 +64,16 @@ class SimilarTopicsView(CreateView, SingleObjectMixin):
             ]
 
             scored_query = FunctionScore(query=query, boost_mode="multiply", functions=functions_score)
-            search_queryset = search_queryset.query(scored_query)[:10]
+            search_queryset = self.index_manager.setup_search(search_queryset.query(scored_query))
+
+            try:
+                hits = CachedSearchResults(search_queryset)[:10]
+            except ES_UNAVAILABLE_ERRORS:
+                invalidate_es_index_managers()
+                hits = []
 
             # Build the result
-            for hit in search_queryset.execute():
+            for hit in hits:
                 result = {
                     "id": hit.pk,
                     "url": str(hit.get_absolute_url),
@@ -82,14 +98,14 @@ class SuggestionContentView(CreateView, SingleObjectMixin):
         """Overridden because the index manager must NOT be initialized elsewhere."""
 
         super().__init__(**kwargs)
-        self.index_manager = ESIndexManager(**settings.ES_SEARCH_INDEX)
+        self.index_manager = get_es_index_manager()
 
     def get(self, request, *args, **kwargs):
         if "q" in request.GET:
             self.search_query = "".join(request.GET["q"])
         excluded_content_ids = request.GET.get("excluded", "").split(",")
         results = []
-        if self.index_manager.connected_to_es and self.search_query:
+        if self.index_manager.connected_to_es and self.index_manager.index_exists and self.search_query:
             self.authorized_forums = get_authorized_forums(self.request.user)
 
             search_queryset = Search()
@@ -115,10 +131,16 @@ class SuggestionContentView(CreateView, SingleObjectMixin):
             ]
 
             scored_query = FunctionScore(query=query, boost_mode="multiply", functions=functions_score)
-            search_queryset = search_queryset.query(scored_query)[:10]
+            search_queryset = self.index_manager.setup_search(search_queryset.query(scored_query))[:10]
+
+            try:
+                hits = search_queryset.execute()
+            except ES_UNAVAILABLE_ERRORS:
+                invalidate_es_index_managers()
+                hits = []
 
             # Build the result
-            for hit in search_queryset.execute():
+            for hit in hits:
                 result = {
                     "id": hit.content_pk,
                     "pubdate": hit.publication_date,
@@ -147,28 +169,35 @@ class SearchView(ZdSPagingListView):
     authorized_forums = ""
 
     index_manager = None
+    es_unavailable = False
 
     def __init__(self, **kwargs):
         """Overridden because the index manager must NOT be initialized elsewhere."""
 
         super().__init__(**kwargs)
-        self.index_manager = ESIndexManager(**settings.ES_SEARCH_INDEX)
+        self.index_manager = get_es_index_manager()
 
     def get(self, request, *args, **kwargs):
         """Overridden to catch the request and fill the form."""
 
         if "q" in request.GET:
-            self.search_query = "".join(request.GET["q"])
+            self.search_query = normalize_search_query("".join(request.GET["q"]))
 
         self.search_form = self.search_form_class(data=self.request.GET)
 
         if self.search_query and not self.search_form.is_valid():
             raise PermissionDenied("research form is invalid")
 
-        return super().get(request, *args, **kwargs)
+        try:
+            return super().get(request, *args, **kwargs)
+        except ES_UNAVAILABLE_ERRORS:
+            # the search is only executed by the paginator, so the page is rendered again without results
+            invalidate_es_index_managers()
+            self.es_unavailable = True
+            return super().get(request, *args, **kwargs)
 
     def get_queryset(self):
-        if not self.index_manager.connected_to_es:
+        if not self.index_manager.connected_to_es or self.es_unavailable:
             messages.warning(self.request, _("Impossible de se connecter à Elasticsearch"))
             return []
 
@@ -226,8 +255,8 @@ class SearchView(ZdSPagingListView):
             )
             search_queryset = search_queryset.highlight("text").highlight("text_html")
 
-            # Executing:
-            return self.index_manager.setup_search(search_queryset)
+            # Executing (the count and each page are cached until the next refresh of the index):
+            return CachedSearchResults(self.index_manager.setup_search(search_queryset))
 
         return []
 
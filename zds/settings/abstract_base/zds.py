@@ -26,6 +26,9 @@ ES_SEARCH_INDEX = {
     "replicas": 0,
 }
 
+# Seconds between two checks of the connection to ES and of the existence of the index, for a given process
+ES_STATE_CHECK_INTERVAL = 60
+
 # Anonymous [Dis]Likes. Authors of [dis]likes before those pk will never be shown
 VOTES_ID_LIMIT = zds_config.get("VOTES_ID_LIMIT", 0)
 
@@ -72,6 +75,13 @@ ZDS_APP = {
         "matomo_site_id": zds_config.get("matomo_site_id", 4),
         "matomo_url": zds_config.get("matomo_url", "https://matomo.zestedesavoir.com"),
         "matomo_token_auth": zds_config.get("matomo_token_auth", ""),
+        # the page views are sent by batches of `matomo_batch_size`, or after `matomo_flush_interval` seconds,
+        # and are dropped when more than `matomo_queue_size` of them are waiting to be sent
+        "matomo_queue_size": zds_config.get("matomo_queue_size", 10000),
+        "matomo_batch_size": zds_config.get("matomo_batch_size", 50),
+        "matomo_flush_interval": zds_config.get("matomo_flush_interval", 5),
+        # timeout of a request to Matomo, in seconds
+        "matomo_timeout": zds_config.get("matomo_timeout", 10),
         "association": {
             "name": "Zeste de Savoir",
             "email": "zestedesavoir@gmail.com",
@@ -138,6 +148,10 @@ ZDS_APP = {
         "users_in_hats_list": 5,
         "requested_hats_per_page": 100,
         "update_last_visit_interval": 600,  # seconds
+        # can also be 'QUEUE', the last visits are then stored in the cache and saved by the `flush_last_visits` command
+        "last_visit_policy": "SYNC",
+        # with the 'QUEUE' policy, the last visits which are not saved within this delay are lost
+        "last_visit_buffer_timeout": 24 * 60 * 60,  # seconds
     },
     "hats": {
         "moderation": "Staff",
@@ -167,6 +181,8 @@ ZDS_APP = {
         # or 'extra_content_generation_policy': 'NOTHING'
         "extra_content_generation_policy": "WATCHDOG",
         "extra_content_watchdog_dir": BASE_DIR / "watchdog-build",
+        # number of formats generated at the same time when the policy is 'SYNC'
+        "extra_content_generation_workers": 4,
         "max_tree_depth": 3,
         "default_licence_pk": 7,
         "content_per_page": 42,
@@ -193,6 +209,12 @@ ZDS_APP = {
             "katex": BASE_DIR / "dist" / "css" / "katex.min.css",
         },
         "latex_template_repo": "NOT_EXISTING_DIR",
+        # maximum size (in bytes) of the manifests kept in memory by each process, 0 to disable the cache
+        "manifest_cache_size": 16 * 1024 * 1024,
+        # number of repositories kept opened (with their ``git cat-file`` processes) by each thread of each process
+        "repository_pool_size": 8,
+        # delay (in seconds) after which an unused repository is closed
+        "repository_idle_timeout": 5 * 60,
     },
     "forum": {
         "posts_per_page": 21,
@@ -223,11 +245,19 @@ ZDS_APP = {
     },
     "notification": {
         "per_page": 50,
+        # seconds, the notifications and alerts of the header are also outdated as soon as they change
+        "header_cache_timeout": 60 * 10,
+        # can also be 'QUEUE', the subscribers are then notified by the `send_notifications` command
+        "fan_out_policy": "SYNC",
+        # can also be 'QUEUE', the emails of notification are then sent by the `send_queued_mail` command
+        "email_policy": "SYNC",
     },
     "paginator": {"folding_limit": 4},
     "search": {
         "mark_keywords": ["javafx", "haskell", "groovy", "powershell", "latex", "linux", "windows"],
         "results_per_page": 20,
+        # seconds, results are also outdated as soon as the index is refreshed
+        "cache_timeout": 60,
         "search_groups": {
             "content": (_("Contenus publiés"), ["publishedcontent", "chapter"]),
             "topic": (_("Sujets du forum"), ["topic"]),
@@ -262,6 +292,30 @@ ZDS_APP = {
     },
     "visual_changes": [],
     "display_search_bar": True,
-    "zmd": {"server": "http://127.0.0.1:27272", "disable_pings": False},
+    # seconds, the home page is also computed again after a publication or a new topic
+    "home_cache_timeout": 5 * 60,
+    # seconds, lifetime of the values cached until they are outdated by a change of version (or by a newer value for
+    # the home page), so that the outdated ones do not stay in the cache forever
+    "cache_max_timeout": 24 * 60 * 60,
+    "zmd": {
+        "server": "http://127.0.0.1:27272",
+        "disable_pings": False,
+        # maximum number of connections kept open to the server, and of renderings sent concurrently
+        "pool_size": 10,
+        # seconds, latex may be really long to generate but it is also restrained by server configuration
+        "timeouts": {
+            "html": 10,
+            "epub": 10,
+            "tex": 120,
+            "texfile": 120,
+            "manifest": 120,
+        },
+        "render_cache": {
+            "enabled": True,
+            "timeout": 24 * 60 * 60,  # seconds
+            "max_input_size": 64 * 1024,  # characters, longer texts are never cached
+            "max_entry_size": 256 * 1024,  # characters, bigger renderings are never cached
+        },
+    },
     "very_top_banner": {},
 }
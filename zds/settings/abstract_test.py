@@ -4,3 +4,6 @@ PASSWORD_HASHERS = (
     "django.contrib.auth.hashers.MD5PasswordHasher",
     "django.contrib.auth.hashers.SHA1PasswordHasher",
 )
+
+# each test starts with an empty cache, since its content may come from the changes of the previous tests
+TEST_RUNNER = "zds.utils.tests.runner.ZdSTestRunner"
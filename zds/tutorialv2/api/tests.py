@@ -214,6 +214,8 @@ class ContentExportsAPITest(TutorialTestMixin, APITestCase):
         staff = StaffProfileFactory()
 
         content = PublishedContentFactory(author_list=[author.user]).public_version
+        # forget the formats generated at the publication
+        PublicationEvent.objects.all().delete()
 
         self.assertEqual(0, PublicationEvent.objects.filter(published_object=content).count())
 
@@ -250,6 +252,8 @@ class ContentExportsAPITest(TutorialTestMixin, APITestCase):
     def test_content_exports_list(self):
         author = ProfileFactory()
         content = PublishedContentFactory(author_list=[author.user]).public_version
+        # forget the formats generated at the publication
+        PublicationEvent.objects.all().delete()
 
         # Anonymous usage should be allowed
         # We check that no extraneous SQL query is executed, as this API‌ is used
@@ -294,6 +298,7 @@ class ContentExportsAPITest(TutorialTestMixin, APITestCase):
         # We create another content. Even if there are some records in the database,
         # they should not be returned for this new content.
         other_content = PublishedContentFactory(author_list=[author.user])
+        PublicationEvent.objects.filter(published_object=other_content.public_version).delete()
 
         # One request as there are no export: no prefetch needed.
         with self.assertNumQueries(1):
@@ -76,6 +76,7 @@ def build_html_chapter_file(published_object, versioned_object, working_dir, roo
         template="tutorialv2/export/ebook/chapter.html",
         file_ext="xhtml",
         image_callback=image_handler.handle_images,
+        output_format="epub",
         image_directory=DirTuple(str(img_dir.absolute()), str(img_dir.relative_to(root_dir))),
         relative=".",
         intro_ccl_template="tutorialv2/export/ebook/introduction.html",
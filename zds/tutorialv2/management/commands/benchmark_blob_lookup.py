@@ -0,0 +1,93 @@
+import os
+import tempfile
+import time
+
+from django.core.management import BaseCommand
+from git import Repo
+
+from zds.tutorialv2.utils import get_blob, index_blobs, read_blob, read_blobs
+
+
+def scan_blob(tree, path):
+    """Previous implementation of ``get_blob()``, which walks the whole tree to find a file."""
+    for blob in tree.blobs:
+        if os.path.abspath(blob.path) == os.path.abspath(path):
+            return read_blob(blob)
+    for subtree in tree.trees:
+        result = scan_blob(subtree, path)
+        if result is not None:
+            return result
+    return None
+
+
+class Command(BaseCommand):
+    help = "Measure the time spent to read all the extracts of a synthetic tutorial from its git repository"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--parts", type=int, default=5, help="number of parts of the tutorial")
+        parser.add_argument("--chapters", type=int, default=10, help="number of chapters per part")
+        parser.add_argument("--extracts", type=int, default=10, help="number of extracts per chapter")
+
+    @staticmethod
+    def create_tutorial(path, parts, chapters, extracts):
+        """Commit a tutorial into a new repository, and return the paths of its extracts."""
+        repo = Repo.init(path)
+        files = ["introduction.md", "conclusion.md"]
+        extract_paths = []
+        for part in range(parts):
+            for chapter in range(chapters):
+                directory = os.path.join(f"partie-{part}", f"chapitre-{chapter}")
+                files += [os.path.join(directory, "introduction.md"), os.path.join(directory, "conclusion.md")]
+                extract_paths += [os.path.join(directory, f"extrait-{extract}.md") for extract in range(extracts)]
+        for file in files + extract_paths:
+            os.makedirs(os.path.join(path, os.path.dirname(file)), exist_ok=True)
+            with open(os.path.join(path, file), "w", encoding="utf-8") as f:
+                f.write(f"Texte de {file}\n")
+        repo.index.add(files + extract_paths)
+        repo.index.commit("Tutoriel de test")
+        return repo, extract_paths
+
+    def measure(self, func, extract_paths):
+        """Return the time spent to read all the extracts, in milliseconds."""
+        start = time.perf_counter()
+        func(extract_paths)
+        return (time.perf_counter() - start) * 1000
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as path:
+            repo, extract_paths = self.create_tutorial(path, options["parts"], options["chapters"], options["extracts"])
+            sha = repo.head.commit.hexsha
+
+            def scan(paths):
+                for extract_path in paths:
+                    scan_blob(repo.commit(sha).tree, extract_path)
+
+            def lookup(paths):
+                for extract_path in paths:
+                    get_blob(repo.commit(sha).tree, extract_path)
+
+            def index(paths):
+                blobs = index_blobs(repo.commit(sha).tree)
+                for extract_path in paths:
+                    read_blob(blobs[extract_path])
+
+            def bulk(paths):
+                read_blobs(repo, sha, paths)
+
+            results = [
+                ("tree walk (previous behavior)", self.measure(scan, extract_paths)),
+                ("path lookup", self.measure(lookup, extract_paths)),
+                ("path index", self.measure(index, extract_paths)),
+                ("bulk read", self.measure(bulk, extract_paths)),
+            ]
+            repo.close()
+
+        self.stdout.write(f"{len(extract_paths)} extracts:")
+        for name, duration in results:
+            self.stdout.write(f"{name}: {duration:.1f} ms ({duration / len(extract_paths):.3f} ms per extract)")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{results[0][1] / results[2][1]:.1f} times faster with the index, "
+                f"{results[0][1] / results[3][1]:.1f} times with the bulk read"
+            )
+        )
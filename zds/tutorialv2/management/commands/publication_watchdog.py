@@ -1,5 +1,6 @@
 import logging
 import time
+from datetime import timedelta
 
 from pathlib import Path
 
@@ -48,6 +49,7 @@ class Command(BaseCommand):
         ).filter(state_of_processing="REQUESTED")
 
         for publication_event in requested_events.iterator():
+            start = None
             try:
                 content = publication_event.published_object
                 extra_content_dir = content.get_extra_contents_directory()
@@ -63,6 +65,7 @@ class Command(BaseCommand):
                 publication_event.state_of_processing = "RUNNING"
                 publication_event.save()
 
+                start = time.monotonic()
                 publicator = PublicatorRegistry.get(publication_event.format_requested)
                 publicator.publish(md_file_path, base_name)
             except:
@@ -70,9 +73,17 @@ class Command(BaseCommand):
                 # content.title() would raise an exception (it already used to
                 # happen!).
                 publication_event.state_of_processing = "FAILURE"
+                publication_event.duration = self.get_duration(start)
                 publication_event.save()
                 logger.exception("Failed to export « %s » as %s", content.title(), publication_event.format_requested)
             else:
                 publication_event.state_of_processing = "SUCCESS"
+                publication_event.duration = self.get_duration(start)
                 publication_event.save()
                 logger.info("Succeed to export « %s » as %s", content.title(), publication_event.format_requested)
+
+    @staticmethod
+    def get_duration(start):
+        if start is None:
+            return None
+        return timedelta(seconds=time.monotonic() - start)
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.15 on 2026-10-17 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tutorialv2", "0036_alter_contentsuggestion_options"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="publicationevent",
+            name="duration",
+            field=models.DurationField(blank=True, null=True, verbose_name="durée de l'export"),
+        ),
+    ]
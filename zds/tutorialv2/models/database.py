@@ -18,7 +18,7 @@ from django.utils.http import urlencode
 from django.utils.translation import gettext_lazy as _
 from elasticsearch_dsl import Mapping, Q as ES_Q
 from elasticsearch_dsl.field import Text, Keyword, Date, Boolean
-from git import Repo, BadObject
+from git import BadObject
 from gitdb.exc import BadName
 
 from zds import json_handler
@@ -30,14 +30,15 @@ from zds.searchv2.models import (
     AbstractESDjangoIndexable,
     AbstractESIndexable,
     delete_document_in_elasticsearch,
-    ESIndexManager,
+    get_es_index_manager,
 )
 from zds.tutorialv2.managers import PublishedContentManager, PublishableContentManager, ReactionManager
 from zds.tutorialv2.models import TYPE_CHOICES, STATUS_CHOICES, CONTENT_TYPES_REQUIRING_VALIDATION, PICK_OPERATIONS
 from zds.tutorialv2.models.goals import Goal
 from zds.tutorialv2.models.mixins import TemplatableContentModelMixin, OnlineLinkableContentMixin
 from zds.tutorialv2.models.versioned import NotAPublicVersion
-from zds.tutorialv2.utils import get_content_from_json, BadManifestError, get_blob
+from zds.tutorialv2.utils import get_content_from_json, BadManifestError, get_blob, manifest_cache
+from zds.tutorialv2.utils import get_repository, repository_pool
 from zds.utils import get_current_user
 from zds.utils.models import SubCategory, Licence, Comment, Tag
 from zds.tutorialv2.models.help_requests import HelpWriting
@@ -346,8 +347,15 @@ class PublishableContent(models.Model, TemplatableContentModelMixin):
             if sha != public.sha_public:
                 raise NotAPublicVersion
 
-            with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
-                manifest = json_handler.loads(f.read())
+            # the public manifest is rewritten when the content is published again, even with the same sha
+            manifest_path = os.path.join(path, "manifest.json")
+            key = (self.pk, sha, os.stat(manifest_path).st_mtime_ns)
+            manifest = manifest_cache.get(key)
+            if manifest is None:
+                with open(manifest_path, "rb") as f:
+                    data = f.read()
+                manifest = json_handler.loads(data)
+                manifest_cache.set(key, data)
 
         else:  # draft version, use the repository (slower, but allows manipulation)
             path = self.get_repo_path()
@@ -355,15 +363,21 @@ class PublishableContent(models.Model, TemplatableContentModelMixin):
             if not os.path.isdir(path):
                 raise OSError(path)
 
-            repo = Repo(path)
-            data = get_blob(repo.commit(sha).tree, "manifest.json")
-            try:
-                manifest = json_handler.loads(data)
-                logger.debug("loaded json")
-            except ValueError:
-                raise BadManifestError(
-                    _("Une erreur est survenue lors de la lecture du manifest.json, est-ce du JSON ?")
-                )
+            # a version is immutable, so its manifest can be cached (``None`` stands for the current version)
+            key = (self.pk, sha)
+            manifest = manifest_cache.get(key) if sha is not None else None
+            if manifest is None:
+                repo = get_repository(path)
+                data = get_blob(repo.commit(sha).tree, "manifest.json")
+                try:
+                    manifest = json_handler.loads(data)
+                    logger.debug("loaded json")
+                except ValueError:
+                    raise BadManifestError(
+                        _("Une erreur est survenue lors de la lecture du manifest.json, est-ce du JSON ?")
+                    )
+                if sha is not None:
+                    manifest_cache.set(key, data.encode("utf-8"))
 
         return manifest
 
@@ -572,6 +586,7 @@ class PublishableContent(models.Model, TemplatableContentModelMixin):
         Delete the entities and their filesystem counterparts
         """
         if os.path.exists(self.get_repo_path()):
+            repository_pool.forget_repository(self.get_repo_path())
             shutil.rmtree(self.get_repo_path(), False)
         if self.in_public() and self.public_version:
             if os.path.exists(self.public_version.get_prod_path()):
@@ -653,6 +668,8 @@ class PublishedContent(AbstractESDjangoIndexable, TemplatableContentModelMixin,
 
     objects = PublishedContentManager()
     versioned_model = None
+    # public version loaded by ``prepare_es_batch()`` for the next ``get_es_document_source()``
+    _es_batch_version = None
 
     # sizes contain a python dict (as a string in database) with all information about file sizes
     sizes = models.CharField("Tailles des fichiers téléchargeables", max_length=512, default="{}")
@@ -993,47 +1010,33 @@ class PublishedContent(AbstractESDjangoIndexable, TemplatableContentModelMixin,
         )
 
     @classmethod
-    def get_es_indexable(cls, force_reindexing=False):
-        """Overridden to also include chapters"""
+    def prepare_es_batch(cls, objects, force_reindexing=False):
+        """Overridden to load the public versions from disk and to also include chapters"""
 
-        index_manager = ESIndexManager(**settings.ES_SEARCH_INDEX)
+        index_manager = get_es_index_manager()
+        chapters = []
 
-        # fetch initial batch
-        last_pk = 0
-        objects_source = super().get_es_indexable(force_reindexing)
-        objects = list(objects_source.filter(pk__gt=last_pk)[: PublishedContent.objects_per_batch])
+        for content in objects:
+            versioned = content.load_public_version()
+            content._es_batch_version = versioned
 
-        while objects:
-            chapters = []
+            # chapters are only indexed for middle and big tuto
+            if versioned.has_sub_containers():
 
-            for content in objects:
-                versioned = content.load_public_version()
-
-                # chapters are only indexed for middle and big tuto
-                if versioned.has_sub_containers():
-
-                    # delete possible previous chapters
-                    if content.es_already_indexed:
-                        index_manager.delete_by_query(
-                            FakeChapter.get_es_document_type(), ES_Q("match", _routing=content.es_id)
-                        )
-
-                    # (re)index the new one(s)
-                    for chapter in versioned.get_list_of_chapters():
-                        chapters.append(FakeChapter(chapter, versioned, content.es_id))
+                # delete possible previous chapters (when reindexing everything, the new index is empty)
+                if content.es_already_indexed and not force_reindexing:
+                    index_manager.delete_by_query(
+                        FakeChapter.get_es_document_type(), ES_Q("match", _routing=content.es_id)
+                    )
 
-            if chapters:
-                # since we want to return at most PublishedContent.objects_per_batch items
-                # we have to split further
-                while chapters:
-                    yield chapters[: PublishedContent.objects_per_batch]
-                    chapters = chapters[PublishedContent.objects_per_batch :]
-            if objects:
-                yield objects
+                # (re)index the new one(s)
+                for chapter in versioned.get_list_of_chapters():
+                    chapters.append(FakeChapter(chapter, versioned, content.es_id))
 
-            # fetch next batch
-            last_pk = objects[-1].pk
-            objects = list(objects_source.filter(pk__gt=last_pk)[: PublishedContent.objects_per_batch])
+        # since we want to return at most PublishedContent.objects_per_batch items we have to split further
+        batches = [chapters[i : i + cls.objects_per_batch] for i in range(0, len(chapters), cls.objects_per_batch)]
+        batches.append(objects)
+        return batches
 
     def get_es_document_source(self, excluded_fields=None):
         """Overridden to handle the fact that most information are versioned"""
@@ -1043,8 +1046,10 @@ class PublishedContent(AbstractESDjangoIndexable, TemplatableContentModelMixin,
 
         data = super().get_es_document_source(excluded_fields=excluded_fields)
 
-        # fetch versioned information
-        versioned = self.load_public_version()
+        # fetch versioned information, unless it was loaded for this batch by ``prepare_es_batch()``: a version loaded
+        # before may be older than the current public one
+        versioned = self._es_batch_version or self.load_public_version()
+        self._es_batch_version = None
 
         data["title"] = versioned.title
         data["description"] = versioned.description
@@ -1085,7 +1090,7 @@ def delete_published_content_in_elasticsearch(sender, instance, **kwargs):
     chapters.
     """
 
-    index_manager = ESIndexManager(**settings.ES_SEARCH_INDEX)
+    index_manager = get_es_index_manager()
 
     if index_manager.index_exists:
         index_manager.delete_by_query(FakeChapter.get_es_document_type(), ES_Q("match", _routing=instance.es_id))
@@ -1397,6 +1402,7 @@ class PublicationEvent(models.Model):
     # 25 for formats such as "printable.pdf", if tomorrow we want other "long" formats this will be ready
     format_requested = models.CharField(blank=False, null=False, max_length=25)
     created = models.DateTimeField(verbose_name="date de création", name="date", auto_now_add=True)
+    duration = models.DurationField(verbose_name="durée de l'export", null=True, blank=True)
 
     def __str__(self):
         return f"{self.published_object.title()}: {self.format_requested} - {self.state_of_processing}"
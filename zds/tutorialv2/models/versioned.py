@@ -3,7 +3,6 @@ import copy
 from pathlib import Path
 
 from zds import json_handler
-from git import Repo
 import os
 import shutil
 import codecs
@@ -17,7 +16,7 @@ from django.template.loader import render_to_string
 from zds.tutorialv2.models.mixins import TemplatableContentModelMixin
 from zds.tutorialv2.models import SINGLE_CONTAINER_CONTENT_TYPES, CONTENT_TYPES_BETA, CONTENT_TYPES_REQUIRING_VALIDATION
 from zds.tutorialv2.utils import default_slug_pool, export_content, get_commit_author, InvalidOperationError
-from zds.tutorialv2.utils import get_blob
+from zds.tutorialv2.utils import get_repository, index_blobs, read_blob, read_blobs, repository_pool
 from zds.utils.validators import InvalidSlugError, check_slug
 from zds.utils.misc import compute_hash
 from zds.utils.templatetags.emarkdown import emarkdown
@@ -428,13 +427,7 @@ class Container:
         :rtype: str
         """
         if self.introduction:
-            return (
-                get_blob(
-                    self.top_container().repository.commit(self.top_container().current_version).tree,
-                    self.introduction.replace("\\", "/"),
-                )
-                or ""
-            )
+            return self.top_container().get_blob(self.introduction.replace("\\", "/")) or ""
         return ""
 
     def get_conclusion(self):
@@ -443,13 +436,7 @@ class Container:
         :rtype: str
         """
         if self.conclusion:
-            return (
-                get_blob(
-                    self.top_container().repository.commit(self.top_container().current_version).tree,
-                    self.conclusion.replace("\\", "/"),
-                )
-                or ""
-            )
+            return self.top_container().get_blob(self.conclusion.replace("\\", "/")) or ""
         return ""
 
     def get_introduction_online(self):
@@ -1024,10 +1011,7 @@ class Extract:
         :rtype: str
         """
         if self.text:
-            return get_blob(
-                self.container.top_container().repository.commit(self.container.top_container().current_version).tree,
-                self.text.replace("\\", "/"),
-            )
+            return self.container.top_container().get_blob(self.text.replace("\\", "/"))
         return ""
 
     def compute_hash(self):
@@ -1167,6 +1151,10 @@ class VersionedContent(Container, TemplatableContentModelMixin):
     current_version = None
     slug_repository = ""
     repository = None
+    # files of the current version, by path: see ``get_blob()``
+    _blobs = None
+    # contents of all the files of a version, by path: see ``load_texts()``
+    _texts = None
 
     PUBLIC = False  # this variable is set to true when the VersionedContent is created from the public repository
 
@@ -1235,11 +1223,38 @@ class VersionedContent(Container, TemplatableContentModelMixin):
             self.slug_repository = slug
 
         if self.slug != "" and os.path.exists(self.get_path()):
-            self.repository = Repo(self.get_path())
+            self.repository = get_repository(self.get_path())
 
     def __str__(self):
         return self.title
 
+    def get_blob(self, path):
+        """Read a file of the current version. All the files of this version are indexed on the first call, so that
+        displaying all the extracts of a content does not look for each of them in the git tree.
+
+        :param path: path of the file, relative to the repository
+        :type path: str
+        :return: contains, or ``None`` if there is no such file
+        :rtype: str
+        """
+        path = os.path.normpath(path)
+        if self._texts is not None and self._texts[0] == self.current_version:
+            data = self._texts[1].get(path)
+            return data.decode() if data is not None else None
+        if self._blobs is None or self._blobs[0] != self.current_version:
+            self._blobs = (self.current_version, index_blobs(self.repository.commit(self.current_version).tree))
+        blob = self._blobs[1].get(path)
+        if blob is None:
+            return None
+        return read_blob(blob)
+
+    def load_texts(self):
+        """Read at once all the files of the current version (see ``read_blobs()``), before reading the texts of all
+        the containers and extracts, for example to export the content.
+        """
+        if self._texts is None or self._texts[0] != self.current_version:
+            self._texts = (self.current_version, read_blobs(self.repository, self.current_version))
+
     def get_absolute_url(self, version=None):
         return TemplatableContentModelMixin.get_absolute_url(self, version)
 
@@ -1378,8 +1393,9 @@ class VersionedContent(Container, TemplatableContentModelMixin):
             old_path = self.get_path(use_current_slug=True)
             self.slug = slug
             new_path = self.get_path(use_current_slug=True)
+            repository_pool.forget_repository(old_path)
             shutil.move(old_path, new_path)
-            self.repository = Repo(new_path)
+            self.repository = get_repository(new_path)
             self.slug_repository = slug
 
         return self.repo_update(title, introduction, conclusion, commit_message=commit_message, do_commit=do_commit)
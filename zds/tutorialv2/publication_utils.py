@@ -4,13 +4,16 @@ import logging
 import os
 import shutil
 import subprocess
+import time
 import zipfile
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from os import makedirs, path
 from pathlib import Path
 
 import requests
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection
 from django.template.loader import render_to_string
 from django.utils import translation
 from django.utils.translation import gettext_lazy as _
@@ -127,7 +130,9 @@ def publish_content(db_object, versioned, is_major_update=True):
     public_version.save()
     if settings.ZDS_APP["content"]["extra_content_generation_policy"] == "SYNC":
         # ok, now we can really publish the thing!
-        generate_external_content(base_name, build_extra_contents_path, md_file_path, versioned=versioned)
+        generate_external_content(
+            base_name, build_extra_contents_path, md_file_path, published_content=public_version, versioned=versioned
+        )
     elif settings.ZDS_APP["content"]["extra_content_generation_policy"] == "WATCHDOG":
         PublicatorRegistry.get("watchdog").publish(md_file_path, base_name, silently_pass=False)
 
@@ -169,34 +174,95 @@ def write_md_file(md_file_path, parsed_with_local_images, versioned):
 
 
 def generate_external_content(
-    base_name, extra_contents_path, md_file_path, overload_settings=False, excluded=None, **kwargs
+    base_name,
+    extra_contents_path,
+    md_file_path,
+    overload_settings=False,
+    excluded=None,
+    published_content=None,
+    **kwargs,
 ):
     """
     generate all static file that allow offline access to content
 
+    The markdown file is generated first, then the other formats are generated at the same time, by at most
+    ``ZDS_APP['content']['extra_content_generation_workers']`` threads (most of the work is done by ``lualatex`` or
+    zmarkdown, in other processes).
+
     :param base_name: base nae of file (without extension)
     :param extra_contents_path: internal directory where all files will be pushed
     :param md_file_path: bundled markdown file path
     :param overload_settings: this option force the function to generate all registered formats even when settings \
     ask for PDF not to be published
     :param excluded: list of excluded format, None if no exclusion
+    :param published_content: if given, the result and the duration of the generation of each format are saved as \
+    ``PublicationEvent`` of this published content
     """
     excluded = excluded or ["watchdog"]
     if not settings.ZDS_APP["content"]["build_pdf_when_published"] and not overload_settings:
         excluded.append("pdf")
-    for publicator_name, publicator in PublicatorRegistry.get_all_registered(excluded):
+    publicators = list(PublicatorRegistry.get_all_registered(excluded))
+    kwargs["cur_language"] = translation.get_language()
+
+    # the publicators running in other threads get what they need from the version, not the version itself
+    versioned = kwargs.pop("versioned", None)
+    prepared = {
+        name: publicator.prepare(versioned) if versioned is not None else {} for name, publicator in publicators
+    }
+
+    events = {}
+    if published_content is not None:
+        for publicator_name, publicator in publicators:
+            events[publicator_name] = PublicationEvent.objects.create(
+                state_of_processing="RUNNING", published_object=published_content, format_requested=publicator_name
+            )
+
+    def publish(publicator_name, publicator):
+        start = time.monotonic()
         try:
             publicator.publish(
-                md_file_path,
-                base_name,
-                change_dir=extra_contents_path,
-                cur_language=translation.get_language(),
-                **kwargs,
+                md_file_path, base_name, change_dir=extra_contents_path, **kwargs, **prepared[publicator_name]
             )
-        except (FailureDuringPublication, OSError):
+        except Exception:
+            # whatever the error (zmarkdown or database unreachable, etc.), the other formats are still generated
             logging.getLogger(__name__).exception(
                 "Could not publish %s format from %s base.", publicator_name, md_file_path
             )
+            succeeded = False
+        else:
+            succeeded = True
+        return publicator_name, succeeded, timedelta(seconds=time.monotonic() - start)
+
+    def publish_in_thread(publicator_name, publicator):
+        try:
+            with translation.override(kwargs["cur_language"]):
+                return publish(publicator_name, publicator)
+        finally:
+            connection.close()
+
+    results = []
+    try:
+        # the other formats may be built from the markdown file
+        results += [publish(name, publicator) for name, publicator in publicators if name == "md"]
+        publicators = [(name, publicator) for name, publicator in publicators if name != "md"]
+        workers = settings.ZDS_APP["content"]["extra_content_generation_workers"]
+        if workers > 1 and len(publicators) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results += executor.map(lambda item: publish_in_thread(*item), publicators)
+        else:
+            results += [publish(name, publicator) for name, publicator in publicators]
+    finally:
+        for publicator_name, succeeded, duration in results:
+            logger.info("Generated %s format of %s in %s", publicator_name, base_name, duration)
+            if publicator_name in events:
+                event = events.pop(publicator_name)
+                event.state_of_processing = "SUCCESS" if succeeded else "FAILURE"
+                event.duration = duration
+                event.save()
+        # the formats whose generation did not even end must not stay RUNNING forever
+        for event in events.values():
+            event.state_of_processing = "FAILURE"
+            event.save()
 
 
 class PublicatorRegistry:
@@ -273,6 +339,19 @@ class Publicator:
         """
         raise NotImplementedError()
 
+    def prepare(self, versioned):
+        """
+        Read from the version being published what ``publish()`` needs. Since ``publish()`` may be called in another
+        thread, it is not given the version itself (nor its git repository), except by the ``md`` publicator,
+        which is always called first, in the current thread.
+
+        :param versioned: the version being published
+        :type versioned: zds.tutorialv2.models.versioned.VersionedContent
+        :return: keyword arguments for ``publish()``
+        :rtype: dict
+        """
+        return {}
+
     def get_published_content_entity(self, md_file_path) -> PublishedContent:
         """
         Retrieve the db entity from mdfile path
@@ -289,6 +368,10 @@ class Publicator:
 
 @PublicatorRegistry.register("md")
 class MarkdownPublicator(Publicator):
+    def prepare(self, versioned):
+        load_texts(versioned)
+        return {"versioned": versioned}
+
     def publish(self, md_file_path, base_name, *, cur_language=settings.LANGUAGE_CODE, **kwargs):
         published_content_entity = self.get_published_content_entity(md_file_path)
         versioned = kwargs.pop("versioned", None)
@@ -309,6 +392,12 @@ class MarkdownPublicator(Publicator):
             shutil.copy2(md_file_path, md_file_path.replace("__building", ""))
 
 
+def load_texts(versioned):
+    """Read at once all the texts of a version, unless it is not stored in a repository (in the tests, for example)."""
+    if getattr(versioned, "repository", None) is not None:
+        versioned.load_texts()
+
+
 def _read_flat_markdown(md_file_path):
     with open(md_file_path, encoding="utf-8") as md_file_handler:
         md_flat_content = md_file_handler.read()
@@ -342,6 +431,15 @@ class ZMarkdownRebberLatexPublicator(Publicator):
         self.doc_type = extension[1:]
         self.latex_classes = latex_classes
 
+    def prepare(self, versioned):
+        if versioned.type == "OPINION" and not settings.ZDS_APP["opinions"]["allow_pdf"]:
+            return {}
+        load_texts(versioned)
+        return {
+            "tree_level": versioned.get_tree_level(),
+            "exported": export_content(versioned, with_text=True, ready_to_publish_only=True),
+        }
+
     def publish(self, md_file_path, base_name, **kwargs):
         published_content_entity = self.get_published_content_entity(md_file_path)
         if published_content_entity.content.type == "OPINION" and not settings.ZDS_APP["opinions"]["allow_pdf"]:
@@ -354,9 +452,13 @@ class ZMarkdownRebberLatexPublicator(Publicator):
             3: "middle",
             4: "big",
         }
-        public_versionned_source = published_content_entity.content.load_version(
-            sha=published_content_entity.sha_public
-        )
+        tree_level, exported = kwargs.get("tree_level"), kwargs.get("exported")
+        if exported is None:
+            public_versionned_source = published_content_entity.content.load_version(
+                sha=published_content_entity.sha_public
+            )
+            tree_level = public_versionned_source.get_tree_level()
+            exported = export_content(public_versionned_source, with_text=True, ready_to_publish_only=True)
         base_directory = Path(base_name).parent
         image_dir = base_directory / "images"
         with contextlib.suppress(FileExistsError):
@@ -365,7 +467,7 @@ class ZMarkdownRebberLatexPublicator(Publicator):
             for image in (settings.MEDIA_ROOT / "galleries" / str(gallery_pk)).iterdir():
                 with contextlib.suppress(OSError):
                     shutil.copy2(str(image.absolute()), str(image_dir))
-        content_type = depth_to_size_map[public_versionned_source.get_tree_level()]
+        content_type = depth_to_size_map[tree_level]
         if self.latex_classes:
             content_type += ", " + self.latex_classes
         title = published_content_entity.title()
@@ -390,7 +492,6 @@ class ZMarkdownRebberLatexPublicator(Publicator):
         replaced_media_url = settings.MEDIA_URL
         if replaced_media_url.startswith("/"):
             replaced_media_url = replaced_media_url[1:]
-        exported = export_content(public_versionned_source, with_text=True, ready_to_publish_only=True)
         # no title to avoid zmd to put it on the final latex
         del exported["title"]
         content, metadata, messages = render_markdown(
@@ -578,7 +679,7 @@ def make_zip_file(published_content):
     versioned = publishable.load_version(None, True)
     from zds.tutorialv2.views.archives import DownloadContent
 
-    DownloadContent.insert_into_zip(zip_file, versioned.repository.commit(versioned.current_version).tree)
+    DownloadContent.insert_into_zip(zip_file, versioned.repository, versioned.current_version)
     zip_file.close()
     return file_path
 
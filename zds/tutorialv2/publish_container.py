@@ -11,7 +11,7 @@ from django.utils.translation import gettext_lazy as _
 from zds.tutorialv2.models.database import PublishableContent
 from zds.tutorialv2.models.versioned import Container, VersionedContent
 from zds.tutorialv2.utils import export_content
-from zds.utils.templatetags.emarkdown import emarkdown, render_markdown
+from zds.utils.templatetags.emarkdown import emarkdown, render_markdown, epub_markdown_many
 
 
 def publish_use_manifest(db_object, base_dir, versionable_content: VersionedContent):
@@ -128,6 +128,7 @@ def publish_container(
     template="tutorialv2/export/chapter.html",
     file_ext="html",
     image_callback=None,
+    output_format="html",
     **ctx,
 ):
     """'Publish' a given container, in a recursive way
@@ -143,6 +144,9 @@ def publish_container(
     :param container: a given container
     :type container: Container
     :param file_ext: output file extension
+    :param output_format: ``"epub"`` to render the texts of the extracts beforehand, in one batch, with the images
+        downloaded to the ``image_directory`` given in ``ctx``
+    :type output_format: str
     :raise FailureDuringPublication: if anything goes wrong
     """
 
@@ -170,6 +174,8 @@ def publish_container(
         args = {"container": container, "is_js": is_js}
         args.update(ctx)
         args["relative"] = img_relative_path
+        if output_format == "epub":
+            args.update(render_epub_texts(container, ctx["image_directory"]))
         parsed = render_to_string(template, args)
         write_chapter_file(
             base_dir,
@@ -217,6 +223,7 @@ def publish_container(
                 file_ext=file_ext,
                 image_callback=image_callback,
                 template=template,
+                output_format=output_format,
                 **ctx,
             )
             path_to_title_dict.update(result)
@@ -235,6 +242,29 @@ def publish_container(
     return path_to_title_dict
 
 
+def render_epub_texts(container, image_directory):
+    """
+    Render the introduction, the extracts and the conclusion of a container in one batch of concurrent
+    requests to the markdown server, instead of one request after the other while rendering the template.
+
+    :param container: a container with extracts
+    :type container: zds.tutorialv2.models.versioned.Container
+    :param image_directory: directory where the images are downloaded
+    :return: template context with ``introduction_html``, ``children_html`` (a list of
+        ``(extract, rendered_text)`` tuples) and ``conclusion_html``
+    :rtype: dict
+    """
+    texts = [container.get_introduction() if container.introduction else ""]
+    texts += [extract.get_text() if extract.text else "" for extract in container.children]
+    texts.append(container.get_conclusion() if container.conclusion else "")
+    rendered = epub_markdown_many(texts, image_directory)
+    return {
+        "introduction_html": rendered[0],
+        "children_html": list(zip(container.children, rendered[1:-1])),
+        "conclusion_html": rendered[-1],
+    }
+
+
 def write_chapter_file(base_dir, container, part_path, parsed, path_to_title_dict, image_callback=None):
     """
     Takes a chapter (i.e a set of extract gathers in one html text) and write in into the right file.
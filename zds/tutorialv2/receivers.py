@@ -1,15 +1,17 @@
 import datetime
 import logging
 
-from django.db.models.signals import post_delete
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch.dispatcher import receiver
 from django.utils.translation import gettext_lazy as _
 
-from zds.tutorialv2.models.database import PublishableContent, ContentReaction
+from zds.tutorialv2.models.database import PublishableContent, PublishedContent, ContentReaction
 from zds.tutorialv2.signals import content_unpublished
 from zds.gallery.models import Gallery
 from zds.utils import get_current_user
-from zds.utils.models import Alert
+from zds.utils.cache import TOPBAR_PUBLICATIONS, bump_cache_version
+from zds.utils.header_notifications import invalidate_header_alerts
+from zds.utils.models import Alert, Category, CategorySubCategory, SubCategory, Tag
 
 
 @receiver(content_unpublished, sender=PublishableContent)
@@ -37,6 +39,7 @@ def cleanup_validation_alerts(sender, instance, *, moderator=None, **__):
             solved_date=datetime.datetime.now(),
             solved=True,
         )
+        invalidate_header_alerts()
 
 
 @receiver(post_delete, sender=Gallery)
@@ -66,3 +69,24 @@ def log_content_deletion(sender, instance, **__):
                 "username": current_user.username,
             },
         )
+
+
+@receiver(post_save, sender=PublishedContent)
+@receiver(post_delete, sender=PublishedContent)
+@receiver(content_unpublished, sender=PublishableContent)
+@receiver(post_delete, sender=PublishableContent)
+@receiver(m2m_changed, sender=PublishableContent.subcategory.through)
+@receiver(m2m_changed, sender=PublishableContent.tags.through)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=SubCategory)
+@receiver(post_save, sender=CategorySubCategory)
+@receiver(post_delete, sender=CategorySubCategory)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_topbar_publications(sender, **__):
+    """
+    Outdate the cached publication menus of the topbar when a publication, its categories or its tags change.
+    """
+    bump_cache_version(TOPBAR_PUBLICATIONS)
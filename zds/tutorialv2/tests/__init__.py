@@ -15,6 +15,8 @@ overridden_zds_app["content"]["repo_private_path"] = settings.BASE_DIR / "conten
 overridden_zds_app["content"]["repo_public_path"] = settings.BASE_DIR / "contents-public-test"
 overridden_zds_app["content"]["extra_content_generation_policy"] = "SYNC"
 overridden_zds_app["content"]["build_pdf_when_published"] = False
+# the formats are generated in other threads, which would not see the data of the test transaction
+overridden_zds_app["content"]["extra_content_generation_workers"] = 1
 
 
 class override_for_contents(override_settings):
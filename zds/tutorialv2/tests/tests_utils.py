@@ -2,6 +2,8 @@ import os
 import shutil
 from pathlib import Path
 import datetime
+import threading
+from unittest.mock import patch
 
 from django.conf import settings
 from django.test import TestCase
@@ -24,12 +26,20 @@ from zds.tutorialv2.utils import (
     BadManifestError,
     get_content_from_json,
     get_commit_author,
+    get_blob,
+    export_content,
+    read_blobs,
+    ManifestCache,
+    manifest_cache,
+    RepositoryPool,
 )
 from zds.utils.validators import slugify_raise_on_invalid, InvalidSlugError, check_slug
 from zds.tutorialv2.publication_utils import publish_content, unpublish_content
 from zds.tutorialv2.models.database import PublishableContent, PublishedContent, ContentReaction, ContentRead
+from zds.tutorialv2.models.database import PublicationEvent
 from django.core.management import call_command
 from zds.tutorialv2.publication_utils import Publicator, PublicatorRegistry, ZMarkdownRebberLatexPublicator
+from zds.tutorialv2.publication_utils import FailureDuringPublication, generate_external_content
 from zds.tutorialv2.tests import TutorialTestMixin, override_for_contents
 from zds import json_handler
 from zds.utils.tests.factories import LicenceFactory
@@ -385,6 +395,55 @@ class UtilsTests(TutorialTestMixin, TestCase):
         self.assertFalse(os.path.exists(pdf_path))
         self.assertFalse(os.path.exists(pdf_path2))  # so no PDF is generated !
 
+    def test_generate_external_content(self):
+        published = PublishedContent.objects.create(
+            content=self.tuto, content_pk=self.tuto.pk, content_type=self.tuto.type, content_public_slug=self.tuto.slug
+        )
+        base_name = os.path.join(published.get_extra_contents_directory(), published.content_public_slug)
+        threads = {}
+        received = {}
+
+        class TestPublicator(Publicator):
+            def __init__(self, error=None):
+                self.error = error
+
+            def publish(self, md_file_path, base_name, **kwargs):
+                threads[self] = threading.current_thread()
+                received[self] = kwargs
+                if self.error:
+                    raise self.error
+
+        PublicatorRegistry.registry = {
+            "md": TestPublicator(),
+            "zip": TestPublicator(),
+            "epub": TestPublicator(FailureDuringPublication("fail")),
+            # any error, not only the expected ones
+            "html": TestPublicator(RuntimeError("fail")),
+        }
+        with patch.dict(self.overridden_zds_app["content"], {"extra_content_generation_workers": 2}):
+            generate_external_content(
+                base_name,
+                published.get_extra_contents_directory(),
+                base_name + ".md",
+                published_content=published,
+                versioned=self.tuto.load_version(),
+            )
+
+        # the markdown is generated first, and the other formats in other threads
+        self.assertEqual(threads[PublicatorRegistry.get("md")], threading.current_thread())
+        self.assertNotEqual(threads[PublicatorRegistry.get("zip")], threading.current_thread())
+        # and do not share the version, nor its repository
+        self.assertNotIn("versioned", received[PublicatorRegistry.get("zip")])
+        events = {
+            event.format_requested: event for event in PublicationEvent.objects.filter(published_object=published)
+        }
+        self.assertEqual(sorted(events), ["epub", "html", "md", "zip"])
+        self.assertEqual(events["md"].state_of_processing, "SUCCESS")
+        self.assertEqual(events["zip"].state_of_processing, "SUCCESS")
+        self.assertEqual(events["epub"].state_of_processing, "FAILURE")
+        self.assertIsNotNone(events["epub"].duration)
+        self.assertEqual(events["html"].state_of_processing, "FAILURE")
+
     def test_last_participation_is_old(self):
         article = PublishedContentFactory(author_list=[self.user_author], type="ARTICLE")
         new_user = ProfileFactory().user
@@ -569,6 +628,111 @@ class UtilsTests(TutorialTestMixin, TestCase):
         unpublish_content(published, staff)
         self.assertEqual(0, get_header_notifications(staff)["alerts"]["total"])
 
+    def test_manifest_cache(self):
+        cache = ManifestCache()
+        cache.set((1, "a"), b'{"title": "a"}')
+        cache.set((1, "b"), b'{"title": "b"}')
+
+        # copy on read
+        manifest = cache.get((1, "a"))
+        manifest["title"] = "changed"
+        self.assertEqual(cache.get((1, "a")), {"title": "a"})
+
+        with patch.dict(self.overridden_zds_app["content"], {"manifest_cache_size": 30}):
+            # the least recently used manifest is removed when the cache is full
+            cache.set((1, "c"), b'{"title": "c"}')
+            self.assertIsNone(cache.get((1, "b")))
+            self.assertEqual(cache.get((1, "a")), {"title": "a"})
+            self.assertEqual(cache.get((1, "c")), {"title": "c"})
+
+            # too large to be cached
+            cache.set((1, "d"), b'{"title": "' + b"d" * 30 + b'"}')
+            self.assertIsNone(cache.get((1, "d")))
+
+    def test_load_manifest_cached(self):
+        manifest_cache.clear()
+        manifest = self.tuto.load_manifest()
+        manifest["title"] = "changed"
+
+        with patch("zds.tutorialv2.models.database.get_blob") as get_blob:
+            self.assertEqual(self.tuto.load_manifest()["title"], self.tuto.title)
+            self.assertFalse(get_blob.called)
+
+        # a new version is loaded from the repository
+        versioned = self.tuto.load_version()
+        versioned.repo_update(versioned.title, "new introduction", versioned.get_conclusion())
+        self.tuto.sha_draft = versioned.current_version
+        self.assertIsNone(manifest_cache.get((self.tuto.pk, self.tuto.sha_draft)))
+        self.assertEqual(self.tuto.load_manifest()["title"], self.tuto.title)
+        self.assertIsNotNone(manifest_cache.get((self.tuto.pk, self.tuto.sha_draft)))
+
+    def test_repository_pool(self):
+        pool = RepositoryPool()
+        path = self.tuto.get_repo_path()
+        repository = pool.get_repository(path)
+        self.assertIs(pool.get_repository(path), repository)
+
+        # a repository which was deleted is not reused
+        pool.forget_repository(path)
+        self.assertIsNot(pool.get_repository(path), repository)
+
+        other = PublishableContentFactory(author_list=[self.user_author])
+        with patch.dict(self.overridden_zds_app["content"], {"repository_pool_size": 1}):
+            repository = pool.get_repository(path)
+            pool.get_repository(other.get_repo_path())
+            # the least recently used repository was closed
+            self.assertIsNot(pool.get_repository(path), repository)
+
+        with patch.dict(self.overridden_zds_app["content"], {"repository_idle_timeout": 0}):
+            repository = pool.get_repository(path)
+            self.assertIsNot(pool.get_repository(path), repository)
+
+        # the content is deleted, then created again at the same place
+        repository = pool.get_repository(other.get_repo_path())
+        shutil.copytree(path, other.get_repo_path() + ".new")
+        shutil.rmtree(other.get_repo_path())
+        shutil.move(other.get_repo_path() + ".new", other.get_repo_path())
+        self.assertIsNot(pool.get_repository(other.get_repo_path()), repository)
+        pool.clear()
+
+    def test_get_blob(self):
+        versioned = self.tuto.load_version()
+        tree = versioned.repository.commit(versioned.current_version).tree
+        introduction = get_blob(tree, versioned.introduction)
+        self.assertEqual(introduction, versioned.get_introduction())
+        self.assertEqual(get_blob(tree, "./" + versioned.introduction), introduction)
+        self.assertEqual(get_blob(tree, self.chapter1.introduction), self.chapter1.get_introduction())
+        self.assertIsNone(get_blob(tree, "nowhere.md"))
+        self.assertIsNone(get_blob(tree, self.part1.slug))  # a directory
+
+        # the index is built again for a new version
+        versioned.repo_update(versioned.title, "new introduction", versioned.get_conclusion())
+        self.assertEqual(versioned.get_introduction(), "new introduction")
+
+    def test_read_blobs(self):
+        ExtractFactory(container=self.chapter1, db_object=self.tuto)
+        ExtractFactory(container=self.chapter1, db_object=self.tuto)
+        versioned = PublishableContent.objects.get(pk=self.tuto.pk).load_version()
+        tree = versioned.repository.commit(versioned.current_version).tree
+
+        blobs = read_blobs(versioned.repository, versioned.current_version)
+        self.assertIn("manifest.json", blobs)
+        for path, data in blobs.items():
+            self.assertEqual(data.decode(), get_blob(tree, path))
+
+        extract = versioned.children[0].children[0].children[0]
+        self.assertEqual(
+            read_blobs(versioned.repository, versioned.current_version, ["./" + extract.text, "nowhere.md"]),
+            {extract.text: extract.get_text().encode()},
+        )
+
+        # the texts are read at once when the content is exported
+        expected = export_content(versioned, with_text=True)
+        versioned = PublishableContent.objects.get(pk=self.tuto.pk).load_version()
+        with patch("zds.tutorialv2.models.versioned.read_blob") as read_blob:
+            self.assertEqual(export_content(versioned, with_text=True), expected)
+            self.assertFalse(read_blob.called)
+
     def tearDown(self):
         super().tearDown()
         PublicatorRegistry.registry = self.old_registry
@@ -1,6 +1,9 @@
 from collections import OrderedDict, namedtuple
 import os
 import logging
+import subprocess
+import threading
+import time
 from urllib.parse import urlsplit, urlunsplit, quote
 from django.contrib.auth.models import User
 from django.http import Http404
@@ -8,6 +11,7 @@ from django.utils.translation import gettext_lazy as _
 from git import Repo, Actor
 
 from django.conf import settings
+from zds import json_handler
 from zds.tutorialv2 import signals
 from zds.tutorialv2.models import CONTENT_TYPE_LIST
 from zds.utils import get_current_user
@@ -162,6 +166,24 @@ def mark_read(content, user=None):
             signals.content_read.send(sender=content.__class__, instance=content, user=user, target=ContentReaction)
 
 
+def mark_read_in_bulk(contents, user):
+    """Mark the last note of many contents as read by the user, as ``mark_read()`` does for one content, but in a few
+    queries and without sending the ``content_read`` signal.
+
+    :param contents: the contents
+    :type contents: django.db.models.QuerySet
+    :param user: the user
+    """
+
+    from zds.tutorialv2.models.database import ContentRead
+
+    last_notes = dict(contents.exclude(last_note=None).values_list("pk", "last_note"))
+    ContentRead.objects.filter(content__pk__in=last_notes.keys(), user__pk=user.pk).delete()
+    ContentRead.objects.bulk_create(
+        [ContentRead(note_id=note_pk, content_id=content_pk, user=user) for content_pk, note_pk in last_notes.items()]
+    )
+
+
 class TooDeepContainerError(ValueError):
     """
     Exception used to represent the fact you can't add a container to a level greater than two
@@ -568,7 +590,7 @@ def clone_repo(old_path, new_path):
     """
     if not os.path.isdir(new_path):
         os.makedirs(new_path, mode=0o777)
-    old_repo = Repo(old_path)
+    old_repo = get_repository(old_path)
     new_repo = old_repo.clone(new_path)
     return new_repo
 
@@ -677,6 +699,8 @@ def export_content(content, with_text=False, ready_to_publish_only=False):
     :return: dictionary containing the information
     :rtype: dict
     """
+    if with_text and getattr(content, "repository", None) is not None:
+        content.load_texts()
     dct = export_container(content, with_text, ready_to_publish_only)
 
     # append metadata :
@@ -707,28 +731,229 @@ def get_blob(tree, path):
 
     :param tree: Git Tree object
     :type tree: git.objects.tree.Tree
-    :param path: Path to file
+    :param path: Path to file, relative to the tree
     :type path: str
-    :return: contains
-    :rtype: bytearray
+    :return: contains, or ``None`` if there is no such file
+    :rtype: str
     """
-    # get all extracts
-    for blob in tree.blobs:
-        try:
-            if os.path.abspath(blob.path) == os.path.abspath(path):
-                data = blob.data_stream.read().decode()
-                return data
-        except OSError:  # in case of deleted files, or the system cannot get the lock, juste return ""
-            return ""
-    # traverse directories when we are at root or in a part or chapter
-    if len(tree.trees) > 0:
-        for subtree in tree.trees:
-            result = get_blob(subtree, path)
-            if result is not None:
-                return result
+    try:
+        blob = tree / os.path.normpath(path)
+    except KeyError:
         return None
-    else:
+    if blob.type != "blob":
         return None
+    return read_blob(blob)
+
+
+def read_blob(blob):
+    """Return the data contained into a blob
+
+    :param blob: Git Blob object
+    :type blob: git.objects.blob.Blob
+    :return: contains
+    :rtype: str
+    """
+    try:
+        return blob.data_stream.read().decode()
+    except OSError:  # in case of deleted files, or the system cannot get the lock, juste return ""
+        return ""
+
+
+def index_blobs(tree):
+    """Index all the files of a tree, so that reading many of them does not require to look for each of them.
+
+    :param tree: Git Tree object
+    :type tree: git.objects.tree.Tree
+    :return: the blobs, by path
+    :rtype: dict[str, git.objects.blob.Blob]
+    """
+    return {item.path: item for item in tree.traverse() if item.type == "blob"}
+
+
+def read_blobs(repository, sha, paths=None):
+    """Read at once the files of a version of a repository, with a single ``git cat-file --batch`` process instead of
+    one request per file.
+
+    :param repository: the repository
+    :type repository: git.Repo
+    :param sha: the version
+    :type sha: str
+    :param paths: the paths of the files to read (relative to the repository), all the files if ``None``
+    :type paths: collections.abc.Iterable[str]
+    :return: the contents of the files, by path
+    :rtype: dict[str, bytes]
+    """
+    blobs = index_blobs(repository.commit(sha).tree)
+    if paths is not None:
+        blobs = {path: blobs[path] for path in map(os.path.normpath, paths) if path in blobs}
+    hexshas = list({blob.hexsha for blob in blobs.values()})  # files with the same content are read once
+    if not hexshas:
+        return {}
+
+    output = subprocess.run(
+        [repository.git.GIT_PYTHON_GIT_EXECUTABLE, "cat-file", "--batch"],
+        cwd=repository.git_dir,
+        input="".join(f"{hexsha}\n" for hexsha in hexshas).encode(),
+        capture_output=True,
+        check=True,
+    ).stdout
+
+    # each object is written as "<sha> <type> <size>\n<content>\n"
+    contents = {}
+    position = 0
+    for hexsha in hexshas:
+        end_of_header = output.index(b"\n", position)
+        size = int(output[position:end_of_header].split()[2])
+        contents[hexsha] = output[end_of_header + 1 : end_of_header + 1 + size]
+        position = end_of_header + 1 + size + 1
+    return {path: contents[blob.hexsha] for path, blob in blobs.items()}
+
+
+class ManifestCache:
+    """In-process LRU cache of the ``manifest.json`` of the versions of the contents, bounded by the size of the
+    manifests (``ZDS_APP['content']['manifest_cache_size']`` bytes).
+
+    The manifests are kept as text and decoded on each read, so that every caller gets its own copy (which is
+    cheaper than copying the decoded dictionary).
+    """
+
+    def __init__(self):
+        self._manifests = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        :param key: the key of the manifest
+        :type key: tuple
+        :return: a copy of the manifest, or ``None`` if it is not cached
+        :rtype: dict
+        """
+        with self._lock:
+            data = self._manifests.get(key)
+            if data is None:
+                return None
+            self._manifests.move_to_end(key)
+        return json_handler.loads(data)
+
+    def set(self, key, data):
+        """Cache a manifest, and remove the least recently used ones if the maximum size is exceeded.
+
+        :param key: the key of the manifest
+        :type key: tuple
+        :param data: the content of the ``manifest.json`` file
+        :type data: bytes
+        """
+        max_size = settings.ZDS_APP["content"]["manifest_cache_size"]
+        if len(data) > max_size:
+            return
+        with self._lock:
+            if key in self._manifests:
+                self._size -= len(self._manifests.pop(key))
+            self._manifests[key] = data
+            self._size += len(data)
+            while self._size > max_size:
+                self._size -= len(self._manifests.popitem(last=False)[1])
+
+    def clear(self):
+        with self._lock:
+            self._manifests.clear()
+            self._size = 0
+
+
+manifest_cache = ManifestCache()
+
+
+class RepositoryPool:
+    """Per-process pool of the ``GitPython`` objects of the repositories of the contents.
+
+    Each ``Repo`` keeps its own ``git cat-file`` processes running to read the objects of the repository, so reusing
+    it for the next requests avoids spawning them again. The pool keeps the
+    ``ZDS_APP['content']['repository_pool_size']`` most recently used repositories of each thread (a ``Repo`` cannot
+    be shared between threads), and closes the ones that were not used for
+    ``ZDS_APP['content']['repository_idle_timeout']`` seconds, so that the number of processes and file descriptors
+    stays bounded.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _get_repositories(self):
+        repositories = getattr(self._local, "repositories", None)
+        if repositories is None:
+            repositories = self._local.repositories = OrderedDict()
+        return repositories
+
+    @staticmethod
+    def _get_identity(repository):
+        # the inode alone could be reused by a new repository, and the change time of the directory changes whenever
+        # a file is created or removed in it, which is also the case of a commit
+        try:
+            stat = os.stat(repository.git_dir)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_ctime_ns
+
+    def get_repository(self, path):
+        """
+        :param path: path of the repository
+        :type path: str
+        :return: the repository, which must not be closed by the caller
+        :rtype: Repo
+        :raise git.exc.NoSuchPathError: if there is no repository at this path
+        """
+        path = os.path.abspath(path)
+        repositories = self._get_repositories()
+        now = time.monotonic()
+        self._close_idle(repositories, now)
+
+        entry = repositories.pop(path, None)
+        if entry is not None:
+            repository, identity, _ = entry
+            # the repository may have been deleted, recreated or modified (by another process) since it was opened
+            if identity is None or self._get_identity(repository) != identity:
+                repository.close()
+                entry = None
+        if entry is None:
+            repository = Repo(path)
+            identity = self._get_identity(repository)
+
+        max_size = settings.ZDS_APP["content"]["repository_pool_size"]
+        if max_size > 0:
+            repositories[path] = (repository, identity, now)
+            while len(repositories) > max_size:
+                repositories.popitem(last=False)[1][0].close()
+        return repository
+
+    def forget_repository(self, path):
+        """Close the repository at this path, if it is opened by the current thread. Must be called when the
+        repository is moved or deleted.
+
+        :param path: path of the repository
+        :type path: str
+        """
+        entry = self._get_repositories().pop(os.path.abspath(path), None)
+        if entry is not None:
+            entry[0].close()
+
+    @staticmethod
+    def _close_idle(repositories, now):
+        timeout = settings.ZDS_APP["content"]["repository_idle_timeout"]
+        while repositories:
+            path, (repository, _, last_used) = next(iter(repositories.items()))
+            if now - last_used < timeout:
+                break
+            del repositories[path]
+            repository.close()
+
+    def clear(self):
+        repositories = self._get_repositories()
+        while repositories:
+            repositories.popitem()[1][0].close()
+
+
+repository_pool = RepositoryPool()
+get_repository = repository_pool.get_repository
 
 
 class BadArchiveError(Exception):
@@ -28,6 +28,7 @@ from zds.tutorialv2.utils import (
     BadManifestError,
     default_slug_pool,
     init_new_repo,
+    read_blobs,
 )
 from zds.utils.validators import InvalidSlugError
 from zds.utils.uuslug_wrapper import slugify
@@ -43,17 +44,15 @@ class DownloadContent(LoginRequiredMixin, SingleContentDownloadViewMixin):
     must_be_author = False  # other user can download archive
 
     @staticmethod
-    def insert_into_zip(zip_file, git_tree):
-        """Recursively add file into zip
+    def insert_into_zip(zip_file, repository, sha):
+        """Add all the files of a version into zip
 
         :param zip_file: a ``zipfile`` object (with writing permissions)
-        :param git_tree: Git tree (from ``repository.commit(sha).tree``)
+        :param repository: the repository of the content
+        :param sha: the version
         """
-        for blob in git_tree.blobs:  # first, add files :
-            zip_file.writestr(blob.path, blob.data_stream.read())
-        if git_tree.trees:  # then, recursively add dirs :
-            for subtree in git_tree.trees:
-                DownloadContent.insert_into_zip(zip_file, subtree)
+        for file_path, data in read_blobs(repository, sha).items():
+            zip_file.writestr(file_path, data)
 
     def get_contents(self):
         """get the zip file stream
@@ -67,7 +66,7 @@ class DownloadContent(LoginRequiredMixin, SingleContentDownloadViewMixin):
         path = self.object.get_repo_path()
         zip_path = path + self.get_filename()
         zip_file = zipfile.ZipFile(zip_path, "w")
-        self.insert_into_zip(zip_file, versioned.repository.commit(versioned.current_version).tree)
+        self.insert_into_zip(zip_file, versioned.repository, versioned.current_version)
         zip_file.close()
 
         # return content
@@ -0,0 +1,80 @@
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+# groups of cached values
+TOPBAR_FORUMS = "topbar-forums"
+TOPBAR_PUBLICATIONS = "topbar-publications"
+HOME_PAGE = "home-page"
+SEARCH_RESULTS = "search"
+AUTHORIZED_FORUMS = "authorized-forums"
+
+
+def get_cache_version(name):
+    """
+    Get the current version of a group of cached values, to be put in their keys.
+
+    :param name: the name of the group
+    :type name: str
+    :rtype: str
+    """
+    key = f"cache-version-{name}"
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_cache_version(name):
+    """
+    Outdate all the cached values of a group, by changing its version.
+
+    :param name: the name of the group
+    :type name: str
+    """
+    cache.set(f"cache-version-{name}", uuid4().hex, timeout=None)
+
+
+def get_or_refresh(key, compute, timeout, lock_timeout=60):
+    """
+    Get a value from the cache, with a *stale-while-revalidate* policy: once the value is outdated (after ``timeout``
+    seconds or a call to ``mark_outdated()``), a single caller computes it again while the others still get the
+    outdated value, so that a burst of requests does not trigger as many identical computations.
+
+    :param key: the key of the value
+    :type key: str
+    :param compute: the function computing the value, which must not be ``None``
+    :type compute: callable
+    :param timeout: number of seconds during which the value is up to date
+    :type timeout: int
+    :param lock_timeout: maximum number of seconds of a computation, after which another caller may start one
+    :type lock_timeout: int
+    """
+    values = cache.get_many([key, f"{key}-fresh"])
+    value = values.get(key)
+    if value is not None and values.get(f"{key}-fresh"):
+        return value
+
+    locked = cache.add(f"{key}-lock", True, timeout=lock_timeout)
+    if value is None or locked:
+        try:
+            value = compute()
+            # the outdated value is kept for the other callers until a new one is computed, but not forever
+            cache.set(key, value, timeout=max(timeout, settings.ZDS_APP["cache_max_timeout"]))
+            cache.set(f"{key}-fresh", True, timeout=timeout)
+        finally:
+            if locked:
+                cache.delete(f"{key}-lock")
+    return value
+
+
+def mark_outdated(key):
+    """
+    Outdate a value cached by ``get_or_refresh()``, it is computed again on its next access.
+
+    :param key: the key of the value
+    :type key: str
+    """
+    cache.delete(f"{key}-fresh")
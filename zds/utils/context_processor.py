@@ -1,4 +1,4 @@
-from copy import deepcopy
+from collections.abc import Mapping
 
 from django.conf import settings
 
@@ -43,12 +43,49 @@ def header_notifications(request):
     return {"header_" + k: v for k, v in results.items()}
 
 
+class ReadOnlyView(Mapping):
+    """
+    A read-only view of a dictionary, without copying it: its changes are visible through the view.
+    The nested dictionaries are wrapped when they are accessed, and the lists are seen as tuples.
+    """
+
+    __slots__ = ("_data",)
+
+    def __init__(self, data):
+        self._data = data
+
+    def __getitem__(self, key):
+        return read_only_view(self._data[key])
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return f"ReadOnlyView({self._data!r})"
+
+
+def read_only_view(value):
+    """
+    Get a read-only view of a value: dictionaries are wrapped in a ``ReadOnlyView``, lists become tuples and sets
+    become frozensets.
+    """
+    if isinstance(value, dict):
+        return ReadOnlyView(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(read_only_view(v) for v in value)
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+
 def app_settings(request):
     """
     A context processor with all APP settings.
+    They are read-only, so templates can not alter them for the next requests, but they are not copied.
     """
-    app = deepcopy(settings.ZDS_APP)
-
     return {
-        "app": app,
+        "app": ReadOnlyView(settings.ZDS_APP),
     }
@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.utils.translation import gettext_lazy as _
 
 from zds.forum.models import Post
@@ -44,32 +46,73 @@ def _alerts_to_list(alerts_query):
     return [_alert_to_dict(a) for a in query]
 
 
-def get_header_notifications(user):
-    if not user.is_authenticated:
-        return None
+HEADER_NOTIFICATIONS_KEY = "header-notifications-{}"
+HEADER_ALERTS_KEY = "header-alerts"
 
-    private_topic = ContentType.objects.get_for_model(PrivateTopic)
 
-    notifications = Notification.objects.filter(subscription__user=user, is_read=False)
+def _get_notifications_of(user):
+    key = HEADER_NOTIFICATIONS_KEY.format(user.pk)
+    results = cache.get(key)
+    if results is None:
+        private_topic = ContentType.objects.get_for_model(PrivateTopic)
 
-    general_notifications = notifications.exclude(subscription__content_type=private_topic)
+        notifications = Notification.objects.filter(subscription__user=user, is_read=False)
 
-    private_notifications = notifications.filter(subscription__content_type=private_topic)
+        general_notifications = notifications.exclude(subscription__content_type=private_topic)
 
-    alerts = Alert.objects.filter(solved=False)
+        private_notifications = notifications.filter(subscription__content_type=private_topic)
 
-    return {
-        "general_notifications": {
-            "total": general_notifications.count(),
-            "list": _notifications_to_list(general_notifications),
-        },
-        "private_topic_notifications": {
-            "total": private_notifications.count(),
-            "list": _notifications_to_list(private_notifications),
-        },
-        "alerts": user.has_perm("forum.change_post")
-        and {
+        results = {
+            "general_notifications": {
+                "total": general_notifications.count(),
+                "list": _notifications_to_list(general_notifications),
+            },
+            "private_topic_notifications": {
+                "total": private_notifications.count(),
+                "list": _notifications_to_list(private_notifications),
+            },
+        }
+        cache.set(key, results, timeout=settings.ZDS_APP["notification"]["header_cache_timeout"])
+    return results
+
+
+def _get_alerts():
+    results = cache.get(HEADER_ALERTS_KEY)
+    if results is None:
+        alerts = Alert.objects.filter(solved=False)
+        results = {
             "total": alerts.count(),
             "list": _alerts_to_list(alerts),
-        },
+        }
+        cache.set(HEADER_ALERTS_KEY, results, timeout=settings.ZDS_APP["notification"]["header_cache_timeout"])
+    return results
+
+
+def invalidate_header_notifications(*user_pks):
+    """
+    Outdate the cached notifications of the header of some users, after one of them changed.
+
+    :param user_pks: the pk of the users
+    """
+    cache.delete_many([HEADER_NOTIFICATIONS_KEY.format(user_pk) for user_pk in user_pks])
+
+
+def invalidate_header_alerts():
+    """
+    Outdate the cached alerts of the header, which are shared by all the staff members.
+    """
+    cache.delete(HEADER_ALERTS_KEY)
+
+
+def get_header_notifications(user):
+    """
+    Get the notifications and alerts displayed in the header.
+    They are cached per user (the alerts once for all the staff), until a notification or an alert changes.
+    """
+    if not user.is_authenticated:
+        return None
+
+    return {
+        **_get_notifications_of(user),
+        "alerts": user.has_perm("forum.change_post") and _get_alerts(),
     }
@@ -0,0 +1,43 @@
+import json
+
+from django.core.management import BaseCommand
+
+from zds.utils.models import Comment
+from zds.utils.templatetags.emarkdown import render_markdown_many
+
+
+class Command(BaseCommand):
+    help = "Store the pinged usernames of the comments (forum posts and content reactions) rendered before they were"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100, help="number of comments rendered at once")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        total = 0
+        last_pk = 0
+
+        while True:
+            comments = list(
+                Comment.objects.filter(pinged_usernames__isnull=True, pk__gt=last_pk)
+                .order_by("pk")
+                .only("pk", "text")[:batch_size]
+            )
+            if not comments:
+                break
+
+            results = render_markdown_many([comment.text for comment in comments])
+            rendered_comments = []
+            for comment, (content, metadata, _) in zip(comments, results):
+                if not content and comment.text.strip():
+                    self.stderr.write(f"Could not render comment #{comment.pk}, skipping it")
+                    continue
+                comment.pinged_usernames = json.dumps(metadata.get("ping", []))
+                rendered_comments.append(comment)
+            Comment.objects.bulk_update(rendered_comments, ["pinged_usernames"])
+
+            total += len(rendered_comments)
+            last_pk = comments[-1].pk
+            self.stdout.write(f"{total} comments updated")
+
+        self.stdout.write(self.style.SUCCESS(f"Done, {total} comments updated"))
@@ -0,0 +1,44 @@
+import time
+from copy import deepcopy
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import BaseCommand
+from django.test import RequestFactory
+
+from zds.pages.views import home
+from zds.utils.context_processor import app_settings
+
+
+class Command(BaseCommand):
+    help = "Measure the CPU time spent by the app_settings context processor on each request, and on the home page"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=1000, help="number of calls of the context processor")
+        parser.add_argument("--pages", type=int, default=50, help="number of renderings of the home page")
+
+    @staticmethod
+    def measure(func, iterations):
+        """Return the mean CPU time of a call of ``func``, in milliseconds."""
+        start = time.process_time()
+        for _ in range(iterations):
+            func()
+        return (time.process_time() - start) * 1000 / iterations
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+
+        copy_time = self.measure(lambda: deepcopy(settings.ZDS_APP), options["iterations"])
+        frozen_time = self.measure(lambda: app_settings(request), options["iterations"])
+        home_time = self.measure(lambda: home(request), options["pages"])
+
+        self.stdout.write(f"deep copy of ZDS_APP (previous behavior): {copy_time:.3f} ms per request")
+        self.stdout.write(f"read-only view of ZDS_APP: {frozen_time:.3f} ms per request")
+        self.stdout.write(f"home page: {home_time:.3f} ms per request")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{copy_time - frozen_time:.3f} ms of CPU saved per request, "
+                f"{100 * (copy_time - frozen_time) / (home_time + copy_time):.1f} % of the home page"
+            )
+        )
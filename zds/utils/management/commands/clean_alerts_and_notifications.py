@@ -6,6 +6,7 @@ from django.core.management import BaseCommand
 from django.db import transaction
 from django.conf import settings
 from django.utils.translation import gettext as _
+from zds.utils.header_notifications import invalidate_header_alerts
 from zds.utils.models import Alert
 
 
@@ -40,3 +41,4 @@ class Command(BaseCommand):
             solved_date=datetime.datetime.now(),
             resolve_reason=_("Résolution automatique."),
         )
+        invalidate_header_alerts()
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("utils", "0025_move_helpwriting"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="pinged_usernames",
+            field=models.TextField(blank=True, null=True, verbose_name="Membres mentionnés"),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from datetime import datetime
+import json
 import os
 import string
 import uuid
@@ -396,6 +397,9 @@ class Comment(models.Model):
 
     text = models.TextField("Texte")
     text_html = models.TextField("Texte en Html")
+    # JSON list of the usernames pinged in `text_html`, stored at render time so that editing a comment does not
+    # need to render its previous text again. `None` for comments rendered before this field was added.
+    pinged_usernames = models.TextField("Membres mentionnés", null=True, blank=True)
 
     like = models.IntegerField("Likes", default=0)
     dislike = models.IntegerField("Dislikes", default=0)
@@ -436,17 +440,33 @@ class Comment(models.Model):
         if not hasattr(self, "old_text"):
             self.old_text = self.text
 
-        _, old_metadata, _ = render_markdown(self.text)
-        html, new_metadata, _ = render_markdown(text, on_error=on_error)
-
         # These attributes will be used by `_save_compute_pings` to create notifications if needed.
         # For the same reason as `old_text`, we only update `old_metadata` if not already set.
         if not hasattr(self, "old_metadata"):
-            self.old_metadata = old_metadata
+            self.old_metadata = {"ping": self.get_pinged_usernames()}
+
+        html, new_metadata, _ = render_markdown(text, on_error=on_error)
         self.new_metadata = new_metadata
 
         self.text = text
         self.text_html = html
+        self.set_pinged_usernames(new_metadata.get("ping", []))
+
+    def get_pinged_usernames(self):
+        """
+        :return: the usernames pinged in the current text. The text is only rendered again if they were not
+                 stored when it was rendered (comments older than the `pinged_usernames` field).
+        :rtype: list
+        """
+        if self.pinged_usernames is not None:
+            return json.loads(self.pinged_usernames)
+        if not self.text:
+            return []
+        _, metadata, _ = render_markdown(self.text)
+        return metadata.get("ping", [])
+
+    def set_pinged_usernames(self, usernames):
+        self.pinged_usernames = json.dumps(usernames)
 
     def save(self, *args, **kwargs):
         """
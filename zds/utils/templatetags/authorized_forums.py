@@ -4,15 +4,14 @@ from zds.forum.models import Forum
 def get_authorized_forums(user):
     """
     Find forums the user is allowed to visit.
+    The result is cached for each set of groups, see ``ForumManager.get_authorized_forums_pks()``.
 
     :param user: concerned user.
-    :return: authorized_forums
+    :return: the pks of the authorized forums
     """
-    forums_pub = Forum.objects.filter(groups__isnull=True).all()
     if user and user.is_authenticated:
-        forums_private = Forum.objects.filter(groups__isnull=False, groups__in=user.groups.all()).all()
-        list_forums = list(forums_pub | forums_private)
+        group_pks = user.groups.values_list("pk", flat=True)
     else:
-        list_forums = list(forums_pub)
+        group_pks = []
 
-    return [f.pk for f in list_forums]
+    return Forum.objects.get_authorized_forums_pks(group_pks)
@@ -1,14 +1,18 @@
 import re
 import json
+import hashlib
 import logging
-from requests import post, HTTPError
+from requests import HTTPError
 
 from django import template
 from django.conf import settings
+from django.core.cache import cache
 from django.template.defaultfilters import stringfilter
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy as _
 
+from zds.utils.zmd import get_zmd_client
+
 logger = logging.getLogger(__name__)
 register = template.Library()
 """
@@ -19,12 +23,61 @@ Markdown related filters.
 MAX_ATTEMPTS = 3
 MD_PARSING_ERROR = _("Une erreur est survenue dans la génération de texte Markdown. Veuillez rapporter le bug.")
 
-FORMAT_ENDPOINTS = {
-    "html": "/html",
-    "texfile": "/latex-document",
-    "epub": "/epub",
-    "tex": "/latex",
-}
+RENDER_CACHE_PREFIX = "zmd-render"
+RENDER_CACHE_HITS_KEY = f"{RENDER_CACHE_PREFIX}-hits"
+RENDER_CACHE_MISSES_KEY = f"{RENDER_CACHE_PREFIX}-misses"
+
+
+def _get_render_cache_key(md_input, output_format, opts):
+    """
+    Compute the cache key of a rendering: a hash of the markdown input, the output format and the
+    options sent to the zmd server, so that the same text rendered with the same options always hits
+    the same entry.
+    """
+    payload = json.dumps([str(md_input), output_format, opts], sort_keys=True, default=str)
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return f"{RENDER_CACHE_PREFIX}-{digest}"
+
+
+def _is_render_cacheable(md_input, output_format, full_json):
+    """
+    Only HTML renderings are cached: other formats download images as a side effect, and the
+    manifest renderer (``full_json``) is only used once per publication.
+    """
+    cache_settings = settings.ZDS_APP["zmd"]["render_cache"]
+    if not cache_settings["enabled"] or output_format != "html" or full_json:
+        return False
+    return len(str(md_input)) <= cache_settings["max_input_size"]
+
+
+def _increment_render_cache_counter(key):
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:  # the key was evicted in between
+        cache.set(key, 1, timeout=None)
+
+
+def _store_rendering(cache_key, content, metadata, messages):
+    """
+    Store a rendering in the cache. Renderings bigger than the configured limit are not stored,
+    so that a few huge texts cannot evict all the small ones (signatures, short posts, etc.).
+    """
+    cache_settings = settings.ZDS_APP["zmd"]["render_cache"]
+    if len(content) + len(json.dumps(metadata)) > cache_settings["max_entry_size"]:
+        return
+    cache.set(cache_key, (str(content), metadata, messages), cache_settings["timeout"])
+
+
+def get_render_cache_stats():
+    """
+    :return: number of hits and misses of the markdown rendering cache.
+    :rtype: dict
+    """
+    return {
+        "hits": cache.get(RENDER_CACHE_HITS_KEY, 0),
+        "misses": cache.get(RENDER_CACHE_MISSES_KEY, 0),
+    }
 
 
 def _render_markdown_once(md_input, *, output_format="html", **kwargs):
@@ -42,24 +95,23 @@ def _render_markdown_once(md_input, *, output_format="html", **kwargs):
     if settings.ZDS_APP["zmd"]["disable_pings"] is True:
         kwargs["disable_ping"] = True
 
-    endpoint = FORMAT_ENDPOINTS[output_format]
+    cache_key = None
+    if _is_render_cacheable(md_input, output_format, full_json):
+        opts = {key: value for key, value in kwargs.items() if key != "attempts"}
+        cache_key = _get_render_cache_key(md_input, output_format, opts)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            _increment_render_cache_counter(RENDER_CACHE_HITS_KEY)
+            content, metadata, messages = cached
+            return mark_safe(content), metadata, messages
+        _increment_render_cache_counter(RENDER_CACHE_MISSES_KEY)
 
     try:
-        timeout = 10
         real_input = str(md_input)
         if output_format.startswith("tex") or full_json:
-            # latex may be really long to generate but it is also restrained by server configuration
-            timeout = 120
             # use manifest renderer
             real_input = md_input
-        response = post(
-            "{}{}".format(settings.ZDS_APP["zmd"]["server"], endpoint),
-            json={
-                "opts": kwargs,
-                "md": real_input,
-            },
-            timeout=timeout,
-        )
+        response = get_zmd_client().render(real_input, output_format, kwargs, full_json=full_json)
     except HTTPError:
         logger.exception("An HTTP error happened, markdown rendering failed")
         log_args()
@@ -84,6 +136,8 @@ def _render_markdown_once(md_input, *, output_format="html", **kwargs):
             content = content.replace("</p>\n", "\n\n").replace("\n<p>", "\n")
         if full_json:
             return content, metadata, messages
+        if cache_key is not None and not messages:
+            _store_rendering(cache_key, content, metadata, messages)
         return mark_safe(content), metadata, messages
     except:  # noqa
         logger.exception("Unexpected exception raised")
@@ -132,6 +186,17 @@ def render_markdown(md_input, *, on_error=None, disable_jsfiddle=True, **kwargs)
         return mark_safe(f'<div class="error ico-after"><p>{json.dumps(messages)}</p></div>'), metadata, []
 
 
+def render_markdown_many(md_inputs, **kwargs):
+    """Render several markdown strings concurrently.
+
+    Takes the same keyword arguments as ``render_markdown``, which are used for each string.
+
+    :return: a list of ``(rendered_content, metadata, messages)`` tuples, in the order of ``md_inputs``.
+    :rtype: list
+    """
+    return get_zmd_client().pipeline(lambda md_input: render_markdown(md_input, **kwargs), md_inputs)
+
+
 def render_markdown_stats(md_input, **kwargs):
     """
     Returns contents statistics (words and chars)
@@ -145,8 +210,7 @@ def render_markdown_stats(md_input, **kwargs):
     return None
 
 
-@register.filter(name="epub_markdown", needs_autoescape=False)
-def epub_markdown(md_input, image_directory):
+def _fix_epub_media_paths(content):
     media_root = str(settings.MEDIA_ROOT)
     if not media_root.endswith("/"):
         media_root += "/"
@@ -154,16 +218,40 @@ def epub_markdown(md_input, image_directory):
     if replaced_media_url.startswith("/"):
         replaced_media_url = replaced_media_url[1:]
     return mark_safe(
+        content.replace('src"/', f'src="{media_root}').replace(
+            f'src="{media_root}{replaced_media_url}', f'src="{media_root}'
+        )
+    )
+
+
+@register.filter(name="epub_markdown", needs_autoescape=False)
+def epub_markdown(md_input, image_directory):
+    return _fix_epub_media_paths(
         emarkdown(
             md_input,
             output_format="epub",
             images_download_dir=image_directory.absolute,
         )
-        .replace('src"/', f'src="{media_root}')
-        .replace(f'src="{media_root}{replaced_media_url}', f'src="{media_root}')
     )
 
 
+def epub_markdown_many(md_inputs, image_directory):
+    """
+    Same as the ``epub_markdown`` filter for several markdown strings, which are rendered concurrently.
+    Empty strings are not sent to the markdown server.
+
+    :return: the rendered strings, in the order of ``md_inputs``.
+    :rtype: list
+    """
+
+    def render(md_input):
+        if not md_input:
+            return ""
+        return epub_markdown(md_input, image_directory)
+
+    return get_zmd_client().pipeline(render, md_inputs)
+
+
 @register.filter(needs_autoescape=False)
 @stringfilter
 def emarkdown(md_input, use_jsfiddle="", **kwargs):
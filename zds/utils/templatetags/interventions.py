@@ -5,6 +5,7 @@ from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from django.db.models import F
 
+from zds.forum.models import TopicRead
 from zds.tutorialv2.models.database import Validation
 from zds.notification.models import (
     TopicAnswerSubscription,
@@ -95,7 +96,9 @@ def humane_delta(value):
 
 @register.filter("followed_topics")
 def followed_topics(user):
-    topics_followed = TopicAnswerSubscription.objects.get_objects_followed_by(user)[:10]
+    topics_followed = TopicRead.objects.load_read_states(
+        TopicAnswerSubscription.objects.get_objects_followed_by(user).select_related("last_message__author")[:10], user
+    )
     # periods is a map associating a period (Today, Yesterday, Last n days)
     # with its corresponding number of days: (humane_delta index, number of days).
     # (3, 7) thus means that passing 3 to humane_delta would return "This week", for which
@@ -1,24 +1,39 @@
 from collections import defaultdict, OrderedDict
+from hashlib import sha256
 from django import template
 from django.conf import settings
+from django.core.cache import cache
 
 from zds.forum.models import Forum
 from zds.tutorialv2.models.database import PublishedContent
+from zds.utils.cache import TOPBAR_FORUMS, TOPBAR_PUBLICATIONS, get_cache_version
 from zds.utils.models import CategorySubCategory, Tag
-from django.db.models import Count, Q
+from zds.utils.templatetags.authorized_forums import get_authorized_forums
+from django.db.models import Count
 
 register = template.Library()
 
 
 @register.filter("topbar_forum_categories")
 def topbar_forum_categories(user):
+    """Get the categories and forums the user can read, and the most used tags of their topics.
+    The result is cached for each set of readable forums, until a forum, a topic or its tags change.
+    """
+    forum_pks = get_authorized_forums(user)
+    # the tags settings are part of the key, so that overriding them takes effect immediately
+    forum_settings = settings.ZDS_APP["forum"]
+    request = [forum_pks, forum_settings["top_tag_max"], sorted(forum_settings["top_tag_exclu"])]
+    key = "{}-{}-{}".format(TOPBAR_FORUMS, get_cache_version(TOPBAR_FORUMS), sha256(repr(request).encode()).hexdigest())
+    topbar = cache.get(key)
+    if topbar is None:
+        topbar = _get_forum_categories(forum_pks)
+        cache.set(key, topbar, timeout=settings.ZDS_APP["cache_max_timeout"])
+    return topbar
+
+
+def _get_forum_categories(forum_pks):
     max_tags = settings.ZDS_APP["forum"]["top_tag_max"]
-    forums = (
-        Forum.objects.filter(Q(groups__isnull=True) | Q(groups__isnull=False, groups__in=user.groups.all()))
-        .select_related("category")
-        .distinct()
-        .all()
-    )
+    forums = Forum.objects.filter(pk__in=forum_pks).select_related("category").all()
 
     cats = defaultdict(list)
     for forum in forums:
@@ -29,19 +44,19 @@ def topbar_forum_categories(user):
 
     excluded_tags = settings.ZDS_APP["forum"]["top_tag_exclu"]
     tags_by_popularity = (
-        Tag.objects.filter(topic__forum__in=forums)
+        Tag.objects.filter(topic__forum__in=forum_pks)
         .annotate(count_topic=Count("topic"))
         .exclude(title__in=excluded_tags)
         .order_by("-count_topic")
         .all()[:max_tags]
     )
-    return {"tags": tags_by_popularity, "categories": topbar_cats}
+    return {"tags": list(tags_by_popularity), "categories": topbar_cats}
 
 
 @register.filter("topbar_publication_categories")
 def topbar_publication_categories(_type):
     """Get all the categories and their related subcategories associated with existing publications.
-    The result is sorted by alphabetic order.
+    The result is sorted by alphabetic order, and cached until a publication or a category change.
 
     :param _type: type of the publication
     :type _type: str
@@ -51,6 +66,16 @@ def topbar_publication_categories(_type):
     """
 
     _type = _type if isinstance(_type, list) else [_type]
+    request = ",".join(sorted(_type)) + "-{}".format(settings.ZDS_APP["forum"]["top_tag_max"])
+    key = "{}-{}-{}".format(TOPBAR_PUBLICATIONS, get_cache_version(TOPBAR_PUBLICATIONS), request)
+    topbar = cache.get(key)
+    if topbar is None:
+        topbar = _get_publication_categories(_type)
+        cache.set(key, topbar, timeout=settings.ZDS_APP["cache_max_timeout"])
+    return topbar
+
+
+def _get_publication_categories(_type):
     tags = PublishedContent.objects.get_top_tags(_type, limit=settings.ZDS_APP["forum"]["top_tag_max"])
 
     subcategories_contents = (
@@ -79,4 +104,4 @@ def topbar_publication_categories(_type):
         else:
             cats[key] = [(csc["subcategory__title"], csc["subcategory__slug"], csc["category__slug"])]
 
-    return {"tags": tags, "categories": cats}
+    return {"tags": list(tags), "categories": cats}
@@ -0,0 +1,19 @@
+from unittest import TextTestResult
+
+from django.core.cache import cache
+from django.test.runner import DiscoverRunner
+
+
+class CacheClearingResultMixin:
+    def startTest(self, test):
+        # the changes of the previous tests are rolled back in the database, but may still be cached
+        cache.clear()
+        super().startTest(test)
+
+
+class ZdSTestRunner(DiscoverRunner):
+    """Test runner starting each test with an empty cache, like it starts with the database of the fixtures."""
+
+    def get_resultclass(self):
+        resultclass = super().get_resultclass() or TextTestResult
+        return type(f"CacheClearing{resultclass.__name__}", (CacheClearingResultMixin, resultclass), {})
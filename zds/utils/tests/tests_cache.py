@@ -0,0 +1,41 @@
+from unittest.mock import Mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from zds.utils.cache import bump_cache_version, get_cache_version, get_or_refresh, mark_outdated
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class CacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_cache_version(self):
+        version = get_cache_version("group")
+        self.assertEqual(get_cache_version("group"), version)
+        bump_cache_version("group")
+        self.assertNotEqual(get_cache_version("group"), version)
+
+    def test_get_or_refresh(self):
+        compute = Mock(side_effect=[1, 2, 3])
+        self.assertEqual(get_or_refresh("key", compute, 60), 1)
+        self.assertEqual(get_or_refresh("key", compute, 60), 1)
+        self.assertEqual(compute.call_count, 1)
+
+        mark_outdated("key")
+        self.assertEqual(get_or_refresh("key", compute, 60), 2)
+        self.assertEqual(compute.call_count, 2)
+
+    def test_stale_value_while_refreshing(self):
+        compute = Mock(side_effect=[1, 2])
+        get_or_refresh("key", compute, 60)
+        mark_outdated("key")
+
+        # another caller is already computing the value
+        cache.add("key-lock", True)
+        self.assertEqual(get_or_refresh("key", compute, 60), 1)
+        self.assertEqual(compute.call_count, 1)
+
+        cache.delete("key-lock")
+        self.assertEqual(get_or_refresh("key", compute, 60), 2)
@@ -1,11 +1,14 @@
 from datetime import datetime, timedelta
+from unittest.mock import patch
 
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from zds.forum.tests.factories import ForumCategoryFactory, ForumFactory, PostFactory, TopicFactory
 from zds.member.tests.factories import ProfileFactory, StaffProfileFactory
-from zds.utils.context_processor import header_notifications as notifications_processor
+from zds.notification.models import TopicAnswerSubscription
+from zds.utils.context_processor import app_settings, header_notifications as notifications_processor
 from zds.utils.models import Alert
 
 
@@ -60,3 +63,69 @@ class AlertsTest(TestCase):
         r = Request()
         r.user = user
         return notifications_processor(r)
+
+
+class HeaderNotificationsTest(TestCase):
+    def setUp(self):
+        self.user = ProfileFactory().user
+        self.author = ProfileFactory().user
+
+        self.forum = ForumFactory(category=ForumCategoryFactory(position=1), position_in_category=1)
+        self.topic = TopicFactory(forum=self.forum, author=self.author)
+        self.post = PostFactory(topic=self.topic, author=self.author, position=1)
+        self.subscription = TopicAnswerSubscription.objects.get_or_create_active(self.user, self.topic)
+
+    def test_cached_until_notifications_change(self):
+        notifications = notifications_processor(Request(self.user))
+        self.assertEqual(0, notifications["header_general_notifications"]["total"])
+        with self.assertNumQueries(0):
+            self.assertEqual(notifications, notifications_processor(Request(self.user)))
+
+        self.subscription.send_notification(content=self.post, sender=self.author, send_email=False)
+        notifications = notifications_processor(Request(self.user))["header_general_notifications"]
+        self.assertEqual(1, notifications["total"])
+        self.assertEqual(self.topic.title, notifications["list"][0]["title"])
+
+        self.subscription.mark_notification_read()
+        self.assertEqual(0, notifications_processor(Request(self.user))["header_general_notifications"]["total"])
+
+    def test_alerts_shared_by_staff(self):
+        staff, other_staff = StaffProfileFactory().user, StaffProfileFactory().user
+        Alert.objects.create(author=self.author, comment=self.post, scope="FORUM", text="pouet", pubdate=datetime.now())
+
+        self.assertEqual(1, notifications_processor(Request(staff))["header_alerts"]["total"])
+        with patch("zds.utils.header_notifications._alerts_to_list") as alerts_to_list:
+            self.assertEqual(1, notifications_processor(Request(other_staff))["header_alerts"]["total"])
+            alerts_to_list.assert_not_called()
+
+        Alert.objects.filter(comment=self.post).first().solve(staff)
+        self.assertEqual(0, notifications_processor(Request(other_staff))["header_alerts"]["total"])
+
+
+class Request:
+    def __init__(self, user):
+        self.user = user
+
+
+class AppSettingsTest(TestCase):
+    def test_read_only(self):
+        app = app_settings(None)["app"]
+        self.assertEqual(app["site"]["literal_name"], settings.ZDS_APP["site"]["literal_name"])
+
+        with self.assertRaises(TypeError):
+            app["site"]["literal_name"] = "Pouet"
+        with self.assertRaises(AttributeError):
+            app["visual_changes"].append("pouet")
+
+    def test_settings_changed(self):
+        zds_app = dict(settings.ZDS_APP, display_search_bar=False)
+        with override_settings(ZDS_APP=zds_app):
+            self.assertFalse(app_settings(None)["app"]["display_search_bar"])
+        self.assertEqual(app_settings(None)["app"]["display_search_bar"], settings.ZDS_APP["display_search_bar"])
+
+    def test_settings_changed_in_place(self):
+        app = app_settings(None)["app"]
+        with patch.dict(settings.ZDS_APP["site"], {"literal_name": "Pouet"}):
+            self.assertEqual(app["site"]["literal_name"], "Pouet")
+            self.assertEqual(app_settings(None)["app"]["site"]["literal_name"], "Pouet")
+        self.assertEqual(app["site"]["literal_name"], settings.ZDS_APP["site"]["literal_name"])
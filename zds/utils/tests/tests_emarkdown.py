@@ -1,10 +1,17 @@
 from collections import namedtuple
 from textwrap import dedent
+from unittest.mock import patch, MagicMock
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.template import Context, Template
 
-from zds.utils.templatetags.emarkdown import shift_heading
+from zds.utils.templatetags.emarkdown import (
+    shift_heading,
+    render_markdown,
+    render_markdown_many,
+    get_render_cache_stats,
+)
 
 
 class EMarkdownTest(TestCase):
@@ -108,3 +115,57 @@ class EMarkdownTest(TestCase):
         """
         )
         self.assertEqual(shift_heading(sharp_in_code_with_antiquotes, 1), result_sharp_in_code_with_antiquotes)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class RenderCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.response = MagicMock(status_code=200)
+        self.response.json.return_value = ["<p>text</p>", {"ping": ["admin"]}, []]
+
+    def test_same_text_is_rendered_once(self):
+        with patch("zds.utils.zmd.ZmdClient.render", return_value=self.response) as mocked_post:
+            first = render_markdown("text")
+            second = render_markdown("text")
+
+        self.assertEqual(mocked_post.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertEqual(get_render_cache_stats(), {"hits": 1, "misses": 1})
+
+    def test_options_are_part_of_the_key(self):
+        with patch("zds.utils.zmd.ZmdClient.render", return_value=self.response) as mocked_post:
+            render_markdown("text")
+            render_markdown("text", inline=True)
+            render_markdown("other text")
+
+        self.assertEqual(mocked_post.call_count, 3)
+
+    def test_errors_are_not_cached(self):
+        self.response.json.return_value = ["", {}, [{"message": "error"}]]
+        with patch("zds.utils.zmd.ZmdClient.render", return_value=self.response) as mocked_post:
+            render_markdown("text")
+            render_markdown("text")
+
+        self.assertEqual(mocked_post.call_count, 2)
+
+    def test_other_formats_are_not_cached(self):
+        with patch("zds.utils.zmd.ZmdClient.render", return_value=self.response) as mocked_post:
+            render_markdown("text", output_format="tex")
+            render_markdown("text", output_format="tex")
+
+        self.assertEqual(mocked_post.call_count, 2)
+
+
+class RenderMarkdownManyTest(TestCase):
+    def test_results_are_in_order(self):
+        def render(md_input, output_format, opts, full_json=False):
+            response = MagicMock(status_code=200)
+            response.json.return_value = [f"<p>{md_input}</p>", {}, []]
+            return response
+
+        texts = [f"text {i}" for i in range(25)]
+        with patch("zds.utils.zmd.ZmdClient.render", side_effect=render):
+            results = render_markdown_many(texts, inline=True)
+
+        self.assertEqual([content for content, _, _ in results], [f"<p>{text}</p>" for text in texts])
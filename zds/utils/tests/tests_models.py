@@ -1,7 +1,10 @@
+from unittest.mock import patch
+
 from django.test import TestCase
 from django.db import IntegrityError, transaction
 from django.contrib.auth.models import Group
 
+from zds.forum.tests.factories import create_category_and_forum, create_topic_in_forum, PostFactory
 from zds.member.models import Profile
 from zds.member.tests.factories import ProfileFactory
 from zds.utils.forms import TagValidator
@@ -100,3 +103,32 @@ class TagsTests(TestCase):
         # The user shoudn't have the hat through their profile anymore
         profile = Profile.objects.get(pk=profile.pk)  # reload
         self.assertNotIn(hat, profile.hats.all())
+
+
+class CommentPingsTests(TestCase):
+    def setUp(self):
+        self.profile = ProfileFactory()
+        _, forum = create_category_and_forum()
+        self.topic = create_topic_in_forum(forum, self.profile)
+
+    def test_update_content_renders_once(self):
+        post = PostFactory(topic=self.topic, author=self.profile.user, position=2)
+        post.set_pinged_usernames(["old_user"])
+
+        with patch("zds.utils.models.render_markdown", return_value=("<p>text</p>", {"ping": ["new_user"]}, [])) as m:
+            post.update_content("@new_user")
+
+        self.assertEqual(m.call_count, 1)
+        self.assertEqual(post.old_metadata, {"ping": ["old_user"]})
+        self.assertEqual(post.get_pinged_usernames(), ["new_user"])
+
+    def test_update_content_without_stored_pings(self):
+        post = PostFactory(topic=self.topic, author=self.profile.user, position=2)
+        self.assertIsNone(post.pinged_usernames)
+
+        with patch("zds.utils.models.render_markdown", return_value=("<p>text</p>", {"ping": ["user"]}, [])) as m:
+            post.update_content("@user")
+
+        # the previous text had to be rendered again to know who was pinged
+        self.assertEqual(m.call_count, 2)
+        self.assertEqual(post.get_pinged_usernames(), ["user"])
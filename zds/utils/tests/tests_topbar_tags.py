@@ -1,4 +1,4 @@
-from django.contrib.auth.models import Group
+from django.contrib.auth.models import AnonymousUser, Group
 
 from django.test import TestCase
 
@@ -90,6 +90,21 @@ class TopBarTests(TutorialTestMixin, TestCase):
         self.assertEqual(top_tags[0].title, "tag-3-5")
         self.assertEqual(len(top_tags), 1)
 
+    def test_forum_categories_cached(self):
+        user = ProfileFactory().user
+        topic = TopicFactory(forum=self.forum11, author=user)
+        topic.add_tags({"tag-1"})
+
+        self.assertEqual([tag.title for tag in topbar_forum_categories(AnonymousUser())["tags"]], ["tag-1"])
+        with self.assertNumQueries(0):
+            topbar = topbar_forum_categories(AnonymousUser())
+        self.assertEqual(topbar["categories"], [(self.category1.title, self.category1.slug, [self.forum11])])
+
+        # a new tag outdates the cache
+        topic.add_tags({"tag-2"})
+        top_tags = topbar_forum_categories(AnonymousUser())["tags"]
+        self.assertEqual(sorted(tag.title for tag in top_tags), ["tag-1", "tag-2"])
+
     def test_top_tags_content(self):
         tags_tuto = ["a", "b", "c"]
         tags_article = ["a", "d", "e"]
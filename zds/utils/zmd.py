@@ -0,0 +1,89 @@
+"""
+HTTP client of the zmarkdown server.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+FORMAT_ENDPOINTS = {
+    "html": "/html",
+    "texfile": "/latex-document",
+    "epub": "/epub",
+    "tex": "/latex",
+}
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class ZmdClient:
+    """
+    Sends rendering requests to the zmarkdown server through a pooled keep-alive session,
+    so that consecutive renderings do not pay a new TCP connection each time.
+
+    :param server: base URL of the zmarkdown server
+    :param pool_size: maximum number of connections kept open, and of renderings sent concurrently
+    :param timeouts: timeout (in seconds) for each output format, ``manifest`` being used when a whole
+        content manifest is rendered at once
+    """
+
+    def __init__(self, server, pool_size, timeouts):
+        self.server = server
+        self.pool_size = pool_size
+        self.timeouts = timeouts
+        self.session = Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get_timeout(self, output_format, full_json=False):
+        if full_json:
+            return self.timeouts["manifest"]
+        return self.timeouts[output_format]
+
+    def render(self, md_input, output_format="html", opts=None, full_json=False):
+        """
+        Send one rendering request.
+
+        :param md_input: markdown string, or manifest dictionary when ``full_json`` is set
+        :param output_format: one of the keys of ``FORMAT_ENDPOINTS``
+        :param opts: options forwarded to zmarkdown
+        :return: the response of the zmarkdown server
+        :rtype: requests.Response
+        """
+        return self.session.post(
+            "{}{}".format(self.server, FORMAT_ENDPOINTS[output_format]),
+            json={
+                "opts": opts or {},
+                "md": md_input,
+            },
+            timeout=self.get_timeout(output_format, full_json),
+        )
+
+    def pipeline(self, func, items):
+        """
+        Call ``func`` on each item, at most ``pool_size`` at a time, and return the results in
+        the order of ``items``. Exceptions raised by ``func`` are propagated.
+        """
+        items = list(items)
+        if len(items) <= 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.pool_size, len(items))) as executor:
+            return list(executor.map(func, items))
+
+
+def get_zmd_client():
+    """
+    :return: the zmarkdown client of the current process, created on first use.
+    :rtype: ZmdClient
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                zmd_settings = settings.ZDS_APP["zmd"]
+                _client = ZmdClient(zmd_settings["server"], zmd_settings["pool_size"], zmd_settings["timeouts"])
+    return _client